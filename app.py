@@ -1,9 +1,43 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, g, render_template, request, jsonify
+from werkzeug.routing import BaseConverter
+import base64
+import csv
+import functools
+import heapq
+import hmac
+import io
+import itertools
+import json
+import marshal
+import mmap
+import os
 import random
-from dataclasses import dataclass
-from typing import List, Optional, Dict, Tuple
+import re
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Callable, Iterable, Iterator, List, Optional, Dict, Tuple
 from enum import Enum
 
+from journal import Journal
+from memory import MemoryTracker, shared_ids, structure_sizes
+from metrics import REGISTRY as METRICS, Counter, Gauge, Histogram
+from profiling import Profiler
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the compact store falls back to plain arrays
+    np = None
+
 app = Flask(__name__)
 
 class SeatType(Enum):
@@ -44,6 +78,8 @@ class Passenger:
     is_senior: bool = False
     group_id: Optional[str] = None
     assigned_seat: Optional[Tuple[int, str]] = None
+    # Order of booking on the flight, never reused (IDs can be after a cancellation)
+    booking: int = 0
 
 @dataclass
 class Group:
@@ -56,471 +92,1815 @@ class Group:
     has_senior_members: bool = False
     members: List[Passenger] = None
 
-class AircraftSeatingSystem:
+@dataclass
+class AssignmentSummary:
+    """Outcome of one assign_seats pass"""
+    success: bool = True
+    processed: int = 0
+    assigned: Dict[str, Tuple[int, str]] = field(default_factory=dict)
+    waitlisted: List[str] = field(default_factory=list)
+
+    def __bool__(self):
+        return self.success
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'assigned': self.assigned,
+            'waitlisted': self.waitlisted
+        }
+
+@dataclass(frozen=True)
+class FlightSnapshot:
+    """Immutable view of a flight as of one committed mutation.
+
+    Snapshots share the per-row seat dicts and per-passenger dicts of their
+    predecessor for everything that did not change, so publishing one costs
+    only the changed rows and passengers. The contained dicts are never
+    modified after publication; readers must not modify them either.
+    """
+    version: int
+    seating_layout: Dict[int, Dict[str, Dict]]
+    passengers: Dict[str, Dict]
+    waiting_list: Tuple[str, ...]
+    # Bumped only when a seat changes; the epoch tells flight objects apart
+    # (with a shared store: flights, and each worker's uncommitted changes)
+    layout_version: int = 0
+    layout_epoch: str = ''
+    # Serialized rows, shared with the previous snapshot like the row dicts:
+    # the seat dicts of a row as a JSON object, and its seats' occupancy as
+    # comma-separated items of the compact seat array
+    row_json: Dict[int, bytes] = field(default_factory=dict)
+    row_occupancy: Dict[int, bytes] = field(default_factory=dict)
+    # Booking number of each passenger, the stable order of the 'id' sort
+    bookings: Dict[str, int] = field(default_factory=dict)
+    # Latest passenger index built for an earlier snapshot, updated rather than rebuilt
+    index_base: Optional['PassengerIndex'] = None
+
+    def passenger_list(self) -> List[Dict]:
+        return list(self.passengers.values())
+
+    @property
+    def layout_etag(self) -> str:
+        return f"{self.layout_epoch}-{self.layout_version}"
+
+    @functools.cached_property
+    def passenger_index(self) -> 'PassengerIndex':
+        index = PassengerIndex(self.passengers, self.waiting_list, self.bookings, self.index_base)
+        # Written like the cached property itself: the base is not needed any more
+        self.__dict__['index_base'] = None
+        return index
+
+    @functools.cached_property
+    def seating_layout_json(self) -> bytes:
+        """``seating_layout`` as JSON, assembled from the cached rows"""
+        return b'{' + b','.join(b'"%d":%s' % (row, data) for row, data in self.row_json.items()) + b'}'
+
+    @functools.cached_property
+    def occupancy_json(self) -> bytes:
+        """Compact seat map: one item per seat in layout order, 0 for a free
+        seat, 1 for an unavailable one and [passenger_id, passenger_name] for
+        an occupied one. Static seat attributes come from the aircraft layout."""
+        header = b'{"epoch":"%s","version":%d,"seats":[' % (self.layout_epoch.encode(), self.layout_version)
+        return header + b','.join(self.row_occupancy.values()) + b']}'
+
+def _latest_index(snapshot: FlightSnapshot) -> Optional['PassengerIndex']:
+    """The passenger index of a snapshot if it was built, else the one it would have been built from"""
+    return snapshot.__dict__.get('passenger_index') or snapshot.index_base
+
+class PassengerIndex:
+    """Secondary indexes over the passengers of one snapshot.
+
+    Built on first use and cached on the snapshot, so a version pays for
+    its indexes once however many pages are read from it. Filters are
+    sets of passenger IDs, sort orders are sorted lists of keys that end
+    with the passenger ID; both are kept per filter value as they are
+    asked for. A page starts from the smallest sorted list among the
+    requested filters, found by bisecting the cursor key, and checks the
+    other filters by set membership.
+
+    Given the index of an earlier snapshot (``base``), only the passengers
+    whose dicts changed are re-indexed: they are dropped from the base's
+    sets and sorted lists and merged back in with their new keys. Sorted
+    lists are kept for the most recently used orders only, and only those
+    read from the base are carried over, so filter values sent by clients
+    cannot grow the index.
+    """
+
+    SORTS = ('id', 'name', 'age', 'seat')
+    # Past this share of changed passengers a full rebuild is cheaper
+    REBUILD_SHARE = 0.25
+    # Sorted lists kept per index, least recently used dropped first
+    SORTED_CACHE = 16
+
+    def __init__(self, passengers: Dict[str, Dict], waiting_list: Tuple[str, ...],
+                 bookings: Dict[str, int], base: Optional['PassengerIndex'] = None):
+        self.passengers = passengers
+        self.bookings = bookings
+        # (sort, filter or None) -> sorted keys in LRU order, the lists are never changed
+        self._sorted: 'OrderedDict[Tuple, List[Tuple]]' = OrderedDict()
+        # Cache keys read from this index, the ones a derived index carries over
+        self._used = set()
+        # Guards _sorted and _used, readers fill them concurrently
+        self._cache_lock = threading.Lock()
+        changed = None
+        if base is not None:
+            changed = [pid for pid, info in passengers.items() if base.passengers.get(pid) is not info]
+            removed = [pid for pid in base.passengers if pid not in passengers]
+            if len(changed) + len(removed) > self.REBUILD_SHARE * len(passengers):
+                changed = None
+        
+        if changed is None:
+            sets: Dict[Tuple[str, object], set] = {('status', 'assigned'): set(), ('status', 'unassigned'): set(),
+                                                   ('vip', True): set(), ('vip', False): set()}
+            for pid, info in passengers.items():
+                for condition in self._conditions(info):
+                    sets.setdefault(condition, set()).add(pid)
+            self.sets = {condition: frozenset(members) for condition, members in sets.items()}
+        else:
+            self._update(base, changed, removed)
+        self.sets[('status', 'waitlisted')] = frozenset(pid for pid in waiting_list if pid in passengers)
+
+    @staticmethod
+    def _conditions(info: Dict) -> List[Tuple[str, object]]:
+        """Filters a passenger matches, except the waiting list"""
+        conditions = [('status', 'assigned' if info['assigned_seat'] is not None else 'unassigned'),
+                      ('vip', bool(info['is_vip']))]
+        if info['group_id'] is not None:
+            conditions.append(('group_id', info['group_id']))
+        return conditions
+
+    def _update(self, base: 'PassengerIndex', changed: List[str], removed: List[str]):
+        """Take over the base's sets and sorted lists, re-indexing only the given passengers"""
+        stale = set(changed).union(removed)
+        touched: Dict[Tuple[str, object], set] = {}
+
+        def members(condition):
+            if condition not in touched:
+                touched[condition] = set(base.sets.get(condition, ()))
+            return touched[condition]
+
+        for pid in stale:
+            info = base.passengers.get(pid)
+            for condition in self._conditions(info) if info is not None else ():
+                members(condition).discard(pid)
+        for pid in changed:
+            for condition in self._conditions(self.passengers[pid]):
+                members(condition).add(pid)
+        
+        self.sets = dict(base.sets)
+        for condition, members in touched.items():
+            if members:
+                self.sets[condition] = frozenset(members)
+            else:
+                del self.sets[condition]
+        
+        with base._cache_lock:
+            carried = [(cache_key, keys) for cache_key, keys in base._sorted.items() if cache_key in base._used]
+        for (sort, condition), keys in carried:
+            if condition == ('status', 'waitlisted'):
+                continue  # Changes with the waiting list, not with the passenger dicts
+            matching = self.passengers if condition is None else self.sets.get(condition, ())
+            added = sorted(self.key(sort, pid) for pid in changed if pid in matching)
+            kept = [key for key in keys if key[-1] not in stale]
+            if kept or added:
+                self._sorted[(sort, condition)] = list(heapq.merge(kept, added)) if added else kept
+
+    def key(self, sort: str, pid: str) -> Tuple:
+        """Sort key of a passenger, unique thanks to the trailing ID"""
+        info = self.passengers[pid]
+        if sort == 'name':
+            return (info['name'].lower(), pid)
+        if sort == 'age':
+            return (info['age'], pid)
+        if sort == 'seat':
+            seat = info['assigned_seat']
+            return (0, seat[0], seat[1], pid) if seat is not None else (1, 0, '', pid)
+        return (self.bookings[pid], pid)
+
+    def _sorted_keys(self, sort: str, condition: Optional[Tuple[str, object]] = None) -> List[Tuple]:
+        cache_key = (sort, condition)
+        with self._cache_lock:
+            keys = self._sorted.get(cache_key)
+            if keys is not None:
+                self._sorted.move_to_end(cache_key)
+                self._used.add(cache_key)
+                return keys
+        
+        members = self.passengers if condition is None else self.sets.get(condition, ())
+        if not members:
+            return []  # Not cached: unknown filter values would pile up
+        keys = sorted(self.key(sort, pid) for pid in members)
+        with self._cache_lock:
+            self._sorted[cache_key] = keys
+            self._used.add(cache_key)
+            while len(self._sorted) > self.SORTED_CACHE:
+                evicted, _ = self._sorted.popitem(last=False)
+                self._used.discard(evicted)
+        return keys
+
+    def count(self, filters: List[Tuple[str, object]]) -> int:
+        """Number of passengers matching every filter"""
+        if not filters:
+            return len(self.passengers)
+        sets = sorted((self.sets.get(f, frozenset()) for f in filters), key=len)
+        return sum(1 for pid in sets[0] if all(pid in other for other in sets[1:]))
+
+    def page(self, sort: str, filters: List[Tuple[str, object]], limit: int,
+             after: Optional[Tuple] = None, descending: bool = False) -> Tuple[List[str], bool]:
+        """IDs of up to `limit` passengers matching every filter, following
+        key `after` in sort order; and whether more follow"""
+        keys = min((self._sorted_keys(sort, f) for f in filters), key=len) if filters else self._sorted_keys(sort)
+        others = [self.sets.get(f, frozenset()) for f in filters]
+        if descending:
+            start = bisect_left(keys, after) if after is not None else len(keys)
+            positions = range(start - 1, -1, -1)
+        else:
+            positions = range(bisect_right(keys, after) if after is not None else 0, len(keys))
+        
+        ids = []
+        for i in positions:
+            pid = keys[i][-1]
+            if all(pid in other for other in others):
+                if len(ids) == limit:
+                    return ids, True
+                ids.append(pid)
+        return ids, False
+
+class WaitingList:
+    """Waiting list ordered by priority: VIP, accessibility, senior, then arrival.
+
+    VIP and regular passengers are kept in separate heaps so a freed seat is
+    only offered to passengers allowed to sit in it (VIP zones are VIP-only).
+    Removal marks the heap entry stale and is cleaned up lazily on access.
+    """
+
+    def __init__(self):
+        self._heaps: Dict[bool, list] = {True: [], False: []}
+        self._entries: Dict[str, list] = {}
+        self._arrival = itertools.count()
+
+    def add(self, passenger: Passenger):
+        """Add a passenger, keeping its original position if already waiting"""
+        if passenger.id in self._entries:
+            return
+        priority = (not passenger.is_vip, not passenger.has_accessibility_needs,
+                    not passenger.is_senior, next(self._arrival))
+        entry = [priority, passenger.id, True]
+        self._entries[passenger.id] = entry
+        heapq.heappush(self._heaps[passenger.is_vip], entry)
+
+    def remove(self, passenger_id: str):
+        """Remove a passenger from the waiting list"""
+        entry = self._entries.pop(passenger_id)
+        entry[2] = False
+
+    def discard(self, passenger_id: str):
+        """Remove a passenger if waiting"""
+        if passenger_id in self._entries:
+            self.remove(passenger_id)
+
+    def _head(self, is_vip: bool) -> Optional[list]:
+        heap = self._heaps[is_vip]
+        while heap and not heap[0][2]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def peek(self, vip_only: bool = False) -> Optional[str]:
+        """Return the highest priority passenger, optionally VIPs only"""
+        heads = [self._head(True)] if vip_only else [self._head(True), self._head(False)]
+        heads = [head for head in heads if head is not None]
+        return min(heads)[1] if heads else None
+
+    def __contains__(self, passenger_id) -> bool:
+        return passenger_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return (entry[1] for entry in sorted(self._entries.values()))
+
+SEAT_CLASSES = list(SeatClass)
+SEAT_TYPES = list(SeatType)
+SEAT_BACKENDS = ('dict', 'compact')
+
+# Rough per-flight memory costs, used by FlightRegistry budgets, measured
+# with AircraftSeatingSystem.memory_usage(). Seats cost their live store and
+# indexes, plus their dict and serialized form in the published snapshot;
+# every row adds its snapshot dict and serialized rows. Passengers count
+# their snapshot dict and index entries too, and every seat change kept in
+# the change history its tuple and, once superseded, the old seat dict.
+SEAT_BYTES_ESTIMATE = {'dict': 260, 'compact': 45}
+SNAPSHOT_SEAT_BYTES_ESTIMATE = 490
+SNAPSHOT_ROW_BYTES_ESTIMATE = 250
+PASSENGER_BYTES_ESTIMATE = 1000
+CHANGE_BYTES_ESTIMATE = 300
+FLIGHT_OVERHEAD_ESTIMATE = 18 * 1024
+# Every this many registry accesses, the accessed flight is measured to
+# calibrate the estimates (a measurement takes a few milliseconds)
+SIZE_SAMPLE_ACCESSES = 1000
+
+# Seat optimizer: cost of leaving a passenger unseated and default time budget (seconds),
+# kept well inside gunicorn's 30s worker timeout
+OPTIMIZER_UNSEATED_COST = 1000
+OPTIMIZER_TIME_BUDGET = float(os.environ.get('SEATING_OPTIMIZER_TIME_BUDGET', 5.0))
+
+# Largest number of adjacent rows a group may be split across
+GROUP_SPLIT_MAX_ROWS = 3
+
+# Seat map versions kept for /seating-layout/changes
+LAYOUT_CHANGE_HISTORY = 256
+# With a shared store, layout versions per store version: a worker's
+# uncommitted seat maps count up from the committed one
+LOCAL_LAYOUT_VERSIONS = 1 << 20
+
+# Events kept per flight for subscribers that reconnect or fall behind
+EVENT_HISTORY = 256
+# Event streams are closed after this long; EventSource reconnects and resumes
+SSE_STREAM_SECONDS = float(os.environ.get('SEATING_SSE_STREAM_SECONDS', 300))
+SSE_KEEPALIVE_SECONDS = 15.0
+# Event streams one worker serves at once, each holds one of its threads
+# (see `threads` in gunicorn_config.py); more are turned away for a while
+SSE_MAX_STREAMS = int(os.environ.get('SEATING_SSE_MAX_STREAMS', 16))
+SSE_RETRY_SECONDS = 5
+
+# Records accepted by one bulk import
+IMPORT_MAX_RECORDS = int(os.environ.get('SEATING_IMPORT_MAX_RECORDS', 10000))
+
+# /passenger-list: arguments that switch to the paginated form, fields that can be
+# projected, and page sizes
+PASSENGER_QUERY_ARGS = {'limit', 'cursor', 'fields', 'sort', 'status', 'group_id', 'vip'}
+PASSENGER_FIELDS = ('id', 'name', 'age', 'type', 'group_id', 'assigned_seat',
+                    'is_vip', 'has_accessibility_needs', 'is_senior')
+PASSENGER_PAGE_SIZE = 50
+PASSENGER_PAGE_MAX = 500
+
+# Manifest export columns, in default order, and the size of the chunks streamed out
+EXPORT_FIELDS = ('flight_id',) + PASSENGER_FIELDS
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+DEFAULT_FLIGHT_ID = 'default'
+FLIGHT_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+# Engine and request metrics, served on /metrics
+REQUEST_SECONDS = Histogram('seating_http_request_duration_seconds', 'Time to produce a response',
+                            ('method', 'route', 'status'))
+ASSIGN_PHASE_SECONDS = Histogram('seating_assign_phase_duration_seconds', 'Time spent in each assign_seats phase',
+                                 ('phase',))
+SEATS_ASSIGNED = Counter('seating_seats_assigned_total', 'Seats given to passengers')
+PASSENGERS_WAITLISTED = Counter('seating_passengers_waitlisted_total', 'Passengers put on a waiting list')
+SEATS_SCANNED = Counter('seating_seats_scanned_total', 'Free seats matching a seat search, summed over searches')
+
+# Static zone flags of the compact seat store
+ZONE_VIP = 1
+ZONE_ACCESSIBLE = 2
+ZONE_QUIET = 4
+
+@dataclass(frozen=True)
+class CabinSpec:
+    """One cabin of a layout: its rows, seat letters, aisles and zone rules"""
+    seat_class: SeatClass
+    rows: range
+    letters: str
+    aisles_after: str = ''
+    vip_rows: range = range(0)
+    quiet_rows: range = range(0)
+    accessible_rows: range = range(0)
+    accessible_letters: str = ''
+
+@dataclass(frozen=True)
+class LayoutSpec:
+    """Declarative aircraft layout, compiled once into a LayoutTemplate"""
+    name: str
+    cabins: Tuple[CabinSpec, ...]
+    # Seats either side of an aisle still count as "together" for group runs.
+    # Only for layouts whose groups may be seated across the aisle
+    groups_span_aisle: bool = False
+
+class LayoutTemplate:
+    """Compiled, immutable form of a LayoutSpec, shared by every flight using it.
+
+    Seats are numbered row by row, left to right, so a seat's physical
+    neighbours are always the previous/next ordinal and neighbour occupancy can
+    be read by shifting a bitset. The template carries everything a flight
+    needs that never changes: seat attributes (as Seat constructor arguments
+    and as typed columns for the compact store), attribute bitmasks, neighbour
+    tables, aisle breaks, row blocks and the static plan of every row.
+    """
+
+    def __init__(self, spec: LayoutSpec):
+        self.spec = spec
+        self.name = spec.name
+        seat_args = []
+        left = []
+        right = []
+        row_ordinals: Dict[int, Tuple[int, ...]] = {}
+        row_blocks: Dict[int, Tuple[Tuple[int, ...], ...]] = {}
+        row_cabins: Dict[int, int] = {}
+        aisle_after = set()
+
+        for cabin_index, cabin in enumerate(spec.cabins):
+            last = len(cabin.letters) - 1
+            for row in cabin.rows:
+                first_ordinal = len(seat_args)
+                blocks = [[]]
+                for position, letter in enumerate(cabin.letters):
+                    ordinal = len(seat_args)
+                    aisle_left = position > 0 and cabin.letters[position - 1] in cabin.aisles_after
+                    aisle_right = position < last and letter in cabin.aisles_after
+                    if position in (0, last):
+                        seat_type = SeatType.WINDOW
+                    elif aisle_left or aisle_right:
+                        seat_type = SeatType.AISLE
+                    else:
+                        seat_type = SeatType.MIDDLE
+
+                    seat_args.append((row, letter, cabin.seat_class, seat_type,
+                                      row in cabin.vip_rows,
+                                      row in cabin.accessible_rows and letter in cabin.accessible_letters,
+                                      row in cabin.quiet_rows))
+                    left.append(ordinal - 1 if position > 0 and not aisle_left else -1)
+                    right.append(ordinal + 1 if position < last and not aisle_right else -1)
+                    blocks[-1].append(ordinal)
+                    if aisle_right:
+                        aisle_after.add(ordinal)
+                        blocks.append([])
+                row_ordinals[row] = tuple(range(first_ordinal, len(seat_args)))
+                row_cabins[row] = cabin_index
+                row_blocks[row] = tuple(tuple(block) for block in blocks)
+
+        self.seat_args = tuple(seat_args)
+        self.keys = tuple((row, letter) for row, letter, *_ in seat_args)
+        self.ordinals = {key: i for i, key in enumerate(self.keys)}
+        self.left = tuple(left)
+        self.right = tuple(right)
+        self.aisle_after = frozenset(aisle_after)
+        self.row_ordinals = row_ordinals
+        self.row_blocks = row_blocks
+        self.row_cabins = row_cabins
+        self.row_keys = {row: tuple(self.keys[i] for i in ordinals) for row, ordinals in row_ordinals.items()}
+        self.max_row_length = max((len(ordinals) for ordinals in row_ordinals.values()), default=0)
+
+        # Seats with identical static attributes are interchangeable for the optimizer:
+        # (seat_class, seat_type, is_vip_zone, is_accessible, is_quiet_zone) -> mask
+        self.seat_kinds: Dict[Tuple[SeatClass, SeatType, bool, bool, bool], int] = {}
+        for ordinal, (_, _, *attributes) in enumerate(seat_args):
+            kind = tuple(attributes)
+            self.seat_kinds[kind] = self.seat_kinds.get(kind, 0) | (1 << ordinal)
+
+        # Typed columns for the compact seat store
+        self.rows = array('H', (args[0] for args in seat_args))
+        self.letters = array('B', (ord(args[1]) for args in seat_args))
+        self.seat_classes = array('B', (SEAT_CLASSES.index(args[2]) for args in seat_args))
+        self.seat_types = array('B', (SEAT_TYPES.index(args[3]) for args in seat_args))
+        self.zone_flags = array('B', ((ZONE_VIP if args[4] else 0) |
+                                      (ZONE_ACCESSIBLE if args[5] else 0) |
+                                      (ZONE_QUIET if args[6] else 0)
+                                      for args in seat_args))
+
+        # Attribute bitmasks, one bit per ordinal
+        self.all_seats = (1 << len(seat_args)) - 1
+        self.class_masks = {seat_class: 0 for seat_class in SeatClass}
+        self.type_masks = {seat_type: 0 for seat_type in SeatType}
+        self.vip_zone = self.accessible = self.quiet_zone = 0
+        self.has_left = self.has_right = 0
+        for ordinal, (_, _, seat_class, seat_type, is_vip, is_accessible, is_quiet) in enumerate(seat_args):
+            bit = 1 << ordinal
+            self.class_masks[seat_class] |= bit
+            self.type_masks[seat_type] |= bit
+            self.vip_zone |= bit if is_vip else 0
+            self.accessible |= bit if is_accessible else 0
+            self.quiet_zone |= bit if is_quiet else 0
+            self.has_left |= bit if left[ordinal] >= 0 else 0
+            self.has_right |= bit if right[ordinal] >= 0 else 0
+
+        # Static plan of each row for the run index:
+        # (ordinal, joins previous seat, is_vip_zone, is_quiet_zone)
+        self.row_plan: Dict[int, Tuple[Tuple[int, bool, bool, bool], ...]] = {}
+        for row, ordinals in row_ordinals.items():
+            plan = []
+            for position, ordinal in enumerate(ordinals):
+                joins = position > 0 and (self.left[ordinal] == ordinal - 1 or
+                                          (spec.groups_span_aisle and ordinal - 1 in self.aisle_after))
+                _, _, _, _, is_vip, _, is_quiet = seat_args[ordinal]
+                if joins:
+                    _, _, _, _, previous_vip, _, previous_quiet = seat_args[ordinal - 1]
+                    joins = (is_vip, is_quiet) == (previous_vip, previous_quiet)
+                plan.append((ordinal, joins, is_vip, is_quiet))
+            self.row_plan[row] = tuple(plan)
+
+    def new_seats(self) -> Dict[Tuple[int, str], Seat]:
+        """Instantiate the seats of a new flight"""
+        return {key: Seat(*args) for key, args in zip(self.keys, self.seat_args)}
+
+    def describe(self):
+        """Describe the cabins for rendering"""
+        return {
+            'name': self.name,
+            'cabins': [{
+                'seat_class': cabin.seat_class.value,
+                'rows': [cabin.rows.start, cabin.rows.stop - 1],
+                'letters': list(cabin.letters),
+                'aisles_after': list(cabin.aisles_after)
+            } for cabin in self.spec.cabins],
+            # Static seat attributes in layout order, for the compact seat map:
+            # [row, letter, seat_class, seat_type, is_vip_zone, is_accessible, is_quiet_zone]
+            'seats': [[row, letter, seat_class.value, seat_type.value, is_vip, is_accessible, is_quiet]
+                      for row, letter, seat_class, seat_type, is_vip, is_accessible, is_quiet in self.seat_args]
+        }
+
+# Families sit across the aisle in one row, as they always have on this aircraft
+DEFAULT_LAYOUT = LayoutSpec(name='default', groups_span_aisle=True, cabins=(
+    # First Class: Rows 1-3, 2-2 configuration, all VIP
+    CabinSpec(SeatClass.FIRST, rows=range(1, 4), letters='ABDE', aisles_after='B',
+              vip_rows=range(1, 4)),
+    # Business Class: Rows 4-8, rows 4-6 VIP, accessible aisle seats in row 8
+    CabinSpec(SeatClass.BUSINESS, rows=range(4, 9), letters='ABCDE', aisles_after='AD',
+              vip_rows=range(4, 7), accessible_rows=range(8, 9), accessible_letters='BD'),
+    # Economy Class: Rows 9-30, 3-3 configuration, quiet zone rows 16-18,
+    # accessible aisle seats near the rear exits
+    CabinSpec(SeatClass.ECONOMY, rows=range(9, 31), letters='ABCDEF', aisles_after='C',
+              quiet_rows=range(16, 19), accessible_rows=range(25, 31), accessible_letters='CD'),
+))
+
+REGIONAL_LAYOUT = LayoutSpec(name='regional', cabins=(
+    CabinSpec(SeatClass.BUSINESS, rows=range(1, 4), letters='ACD', aisles_after='A',
+              vip_rows=range(1, 4)),
+    CabinSpec(SeatClass.ECONOMY, rows=range(4, 21), letters='ABCD', aisles_after='B',
+              quiet_rows=range(10, 12), accessible_rows=range(19, 21), accessible_letters='BC'),
+))
+
+FLEET_LAYOUTS = {spec.name: spec for spec in (DEFAULT_LAYOUT, REGIONAL_LAYOUT)}
+
+@functools.lru_cache(maxsize=None)
+def compile_layout(spec: LayoutSpec) -> LayoutTemplate:
+    """Compile a layout spec, once per spec"""
+    return LayoutTemplate(spec)
+
+@functools.lru_cache(maxsize=None)
+def _template_ids(template: LayoutTemplate) -> frozenset:
+    """Objects of a layout template, shared by all its flights"""
+    return frozenset(shared_ids([template]))
+
+def get_layout_template(layout) -> LayoutTemplate:
+    """Resolve a fleet layout name, LayoutSpec or LayoutTemplate to a template"""
+    if isinstance(layout, LayoutTemplate):
+        return layout
+    if isinstance(layout, str):
+        if layout not in FLEET_LAYOUTS:
+            raise ValueError(f"Unknown aircraft layout: {layout}")
+        layout = FLEET_LAYOUTS[layout]
+    return compile_layout(layout)
+
+class CompactSeatView:
+    """Seat-shaped view onto one ordinal of a CompactSeatStore"""
+
+    __slots__ = ('_store', '_ordinal')
+
+    def __init__(self, store: 'CompactSeatStore', ordinal: int):
+        self._store = store
+        self._ordinal = ordinal
+
+    @property
+    def row(self) -> int:
+        return self._store.layout.rows[self._ordinal]
+
+    @property
+    def seat_letter(self) -> str:
+        return chr(self._store.layout.letters[self._ordinal])
+
+    @property
+    def seat_class(self) -> SeatClass:
+        return SEAT_CLASSES[self._store.layout.seat_classes[self._ordinal]]
+
+    @property
+    def seat_type(self) -> SeatType:
+        return SEAT_TYPES[self._store.layout.seat_types[self._ordinal]]
+
+    @property
+    def is_vip_zone(self) -> bool:
+        return bool(self._store.layout.zone_flags[self._ordinal] & ZONE_VIP)
+
+    @property
+    def is_accessible(self) -> bool:
+        return bool(self._store.layout.zone_flags[self._ordinal] & ZONE_ACCESSIBLE)
+
+    @property
+    def is_quiet_zone(self) -> bool:
+        return bool(self._store.layout.zone_flags[self._ordinal] & ZONE_QUIET)
+
+    @property
+    def is_available(self) -> bool:
+        return bool(self._store.available[self._ordinal])
+
+    @is_available.setter
+    def is_available(self, value: bool):
+        self._store.available[self._ordinal] = 1 if value else 0
+
+    @property
+    def passenger_id(self) -> Optional[str]:
+        return self._store.passenger_ids[self._ordinal]
+
+    @passenger_id.setter
+    def passenger_id(self, value: Optional[str]):
+        self._store.passenger_ids[self._ordinal] = value
+
+    @property
+    def passenger_name(self) -> Optional[str]:
+        return self._store.passenger_names[self._ordinal]
+
+    @passenger_name.setter
+    def passenger_name(self, value: Optional[str]):
+        self._store.passenger_names[self._ordinal] = value
+
+    def __repr__(self):
+        return (f"CompactSeatView(row={self.row}, seat_letter={self.seat_letter!r}, "
+                f"is_available={self.is_available}, passenger_id={self.passenger_id!r})")
+
+class CompactSeatStore(Mapping):
+    """Structure-of-arrays seat store with the same mapping API as the seat dict"""
+
+    def __init__(self, layout: LayoutTemplate):
+        self.layout = layout
+        self.available = array('B', bytes([1]) * len(layout.keys))
+        self.passenger_ids: List[Optional[str]] = [None] * len(layout.keys)
+        self.passenger_names: List[Optional[str]] = [None] * len(layout.keys)
+
+    def __getitem__(self, key: Tuple[int, str]) -> CompactSeatView:
+        return CompactSeatView(self, self.layout.ordinals[key])
+
+    def __contains__(self, key) -> bool:
+        return key in self.layout.ordinals
+
+    def __iter__(self):
+        return iter(self.layout.keys)
+
+    def __len__(self) -> int:
+        return len(self.layout.keys)
+
+    def column(self, name: str):
+        """Return a seat column by name, as a zero-copy NumPy view when NumPy is installed"""
+        values = getattr(self, name) if name == 'available' else getattr(self.layout, name)
+        if np is not None:
+            return np.frombuffer(values, dtype=np.uint16 if values.typecode == 'H' else np.uint8)
+        return values
+
+class SeatAvailabilityIndex:
+    """Bitset index over seat attributes, one bit per seat ordinal.
+
+    Ordinals follow the layout template's row-major order, so the lowest set
+    bit of any mask is the same seat a scan of ``seats.items()`` would find first.
+    Occupancy is kept as one pair of masks per cabin, so threads holding
+    different cabin locks never write the same attribute.
+    """
+
+    def __init__(self, layout: LayoutTemplate, seats: Dict[Tuple[int, str], Seat]):
+        self.keys = layout.keys
+        self.ordinals = layout.ordinals
+        self.row_cabins = layout.row_cabins
+        # Static masks are shared with the layout template
+        self.class_masks = layout.class_masks
+        self.type_masks = layout.type_masks
+        self.vip_zone = layout.vip_zone
+        self.accessible = layout.accessible
+        self.quiet_zone = layout.quiet_zone
+        self.has_left = layout.has_left
+        self.has_right = layout.has_right
+        self.cabin_free = [0] * len(layout.spec.cabins)
+        self.cabin_occupied = [0] * len(layout.spec.cabins)
+        for (row, letter), seat in seats.items():
+            self.update(row, letter, seat)
+
+    @property
+    def free(self) -> int:
+        """Free seats of the whole aircraft"""
+        free = 0
+        for mask in self.cabin_free:
+            free |= mask
+        return free
+
+    @property
+    def occupied(self) -> int:
+        """Occupied seats of the whole aircraft"""
+        occupied = 0
+        for mask in self.cabin_occupied:
+            occupied |= mask
+        return occupied
+
+    def update(self, row: int, seat_letter: str, seat: Seat):
+        """Refresh the occupancy bits of a single seat"""
+        bit = 1 << self.ordinals[(row, seat_letter)]
+        cabin = self.row_cabins[row]
+        if seat.is_available and seat.passenger_id is None:
+            self.cabin_free[cabin] |= bit
+        else:
+            self.cabin_free[cabin] &= ~bit
+        if seat.passenger_id is not None:
+            self.cabin_occupied[cabin] |= bit
+        else:
+            self.cabin_occupied[cabin] &= ~bit
+
+    def first(self, mask: int) -> Optional[Tuple[int, str]]:
+        """Return the seat at the lowest set bit of mask"""
+        if not mask:
+            return None
+        SEATS_SCANNED.inc(mask.bit_count())
+        return self.keys[(mask & -mask).bit_length() - 1]
+
+    def splitting_mask(self) -> int:
+        """Seats with occupied neighbours on both sides"""
+        left_occupied = (self.occupied << 1) & self.has_left
+        right_occupied = (self.occupied >> 1) & self.has_right
+        return left_occupied & right_occupied
+
+class ContiguousRunIndex:
+    """Per-row index of maximal runs of free, side-by-side seats.
+
+    Which seats join into a run comes from the layout template's row plan: a run
+    never crosses a change of VIP/quiet zone, and only crosses an aisle when the
+    layout lets groups span it. Runs are bucketed by (length, is_vip_zone,
+    is_quiet_zone) and each bucket keeps its (row, start) entries sorted, which
+    makes a best-fit lookup independent of the number of rows. Every cabin has
+    its own buckets, updated only under that cabin's lock.
+    """
+
+    def __init__(self, layout: LayoutTemplate, index: SeatAvailabilityIndex):
+        self.index = index
+        self.row_keys = layout.row_keys
+        self.row_plan = layout.row_plan
+        self.row_cabins = layout.row_cabins
+        self.max_length = layout.max_row_length
+        self.row_runs: Dict[int, List[Tuple[int, int, bool, bool]]] = {row: [] for row in self.row_keys}
+        self.cabin_buckets: List[Dict[Tuple[int, bool, bool], List[Tuple[int, int]]]] = [
+            {} for _ in layout.spec.cabins]
+        for row in self.row_keys:
+            self.refresh_row(row)
+
+    def _scan_row(self, row: int) -> List[Tuple[int, int, bool, bool]]:
+        """Find the maximal free runs of a row as (start, length, vip, quiet)"""
+        runs = []
+        free = self.index.cabin_free[self.row_cabins[row]]
+        start = None
+        for position, (ordinal, joins, is_vip, is_quiet) in enumerate(self.row_plan[row]):
+            is_free = (free >> ordinal) & 1
+            if start is not None and not (is_free and joins):
+                runs.append((start, position - start, run_vip, run_quiet))
+                start = None
+            if start is None and is_free:
+                start, run_vip, run_quiet = position, is_vip, is_quiet
+        if start is not None:
+            runs.append((start, len(self.row_plan[row]) - start, run_vip, run_quiet))
+        return runs
+
+    def refresh_row(self, row: int):
+        """Recompute the runs of one row and update the buckets"""
+        buckets = self.cabin_buckets[self.row_cabins[row]]
+        for start, length, is_vip, is_quiet in self.row_runs[row]:
+            bucket = buckets[(length, is_vip, is_quiet)]
+            del bucket[bisect_left(bucket, (row, start))]
+
+        runs = self._scan_row(row)
+        for start, length, is_vip, is_quiet in runs:
+            insort(buckets.setdefault((length, is_vip, is_quiet), []), (row, start))
+        self.row_runs[row] = runs
+
+    def best_fit(self, size: int, allow_vip: bool = True,
+                 allow_quiet: bool = True) -> Optional[List[Tuple[int, str]]]:
+        """Return the first `size` seats of the shortest run that fits, lowest row first"""
+        zones = [(is_vip, is_quiet) for is_vip in (False, True) for is_quiet in (False, True)
+                 if (allow_vip or not is_vip) and (allow_quiet or not is_quiet)]
+
+        for length in range(max(size, 1), self.max_length + 1):
+            heads = [bucket[0] for buckets in self.cabin_buckets for bucket in
+                     (buckets.get((length, is_vip, is_quiet)) for is_vip, is_quiet in zones) if bucket]
+            if heads:
+                row, start = min(heads)
+                return list(self.row_keys[row][start:start + size])
+        return None
+
+    def largest_run(self, row: int, allow_vip: bool = True,
+                    allow_quiet: bool = True) -> Optional[Tuple[int, int]]:
+        """Return (start, length) of the longest allowed run in a row"""
+        runs = [(length, -start) for start, length, is_vip, is_quiet in self.row_runs[row]
+                if (allow_vip or not is_vip) and (allow_quiet or not is_quiet)]
+        if not runs:
+            return None
+        length, start = max(runs)
+        return -start, length
+
+    def has_run(self, size: int) -> bool:
+        """Check whether any run of at least `size` seats exists"""
+        return any(bucket for buckets in self.cabin_buckets
+                   for (length, _, _), bucket in buckets.items() if length >= size)
+
+class MinCostFlow:
+    """Successive-shortest-path min-cost flow over a small graph.
+
+    Used by the seat optimizer on the aggregated passenger-kind x seat-kind
+    problem, which has a few dozen nodes regardless of the manifest size.
+    """
+
     def __init__(self):
+        # Per node: list of edges as [to, capacity, cost, index of reverse edge]
+        self.graph: List[List[list]] = []
+
+    def add_node(self) -> int:
+        self.graph.append([])
+        return len(self.graph) - 1
+
+    def add_edge(self, source: int, target: int, capacity: int, cost: int) -> list:
+        """Add an edge and return it so its flow can be read back"""
+        edge = [target, capacity, cost, len(self.graph[target])]
+        self.graph[source].append(edge)
+        self.graph[target].append([source, 0, -cost, len(self.graph[source]) - 1])
+        return edge
+
+    def flow(self, edge: list) -> int:
+        """Flow pushed through an edge returned by add_edge"""
+        target, _, _, reverse = edge
+        return self.graph[target][reverse][1]
+
+    def solve(self, source: int, sink: int, deadline: Optional[float] = None) -> bool:
+        """Push the maximum flow at minimum cost; False if the deadline passed first"""
+        size = len(self.graph)
+        while True:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+
+            # Bellman-Ford (queue based), residual edges may have negative cost
+            distance = [None] * size
+            previous = [None] * size
+            distance[source] = 0
+            queue = deque([source])
+            queued = [False] * size
+            queued[source] = True
+            while queue:
+                node = queue.popleft()
+                queued[node] = False
+                for index, (target, capacity, cost, _) in enumerate(self.graph[node]):
+                    if capacity > 0 and (distance[target] is None or distance[node] + cost < distance[target]):
+                        distance[target] = distance[node] + cost
+                        previous[target] = (node, index)
+                        if not queued[target]:
+                            queued[target] = True
+                            queue.append(target)
+
+            if distance[sink] is None:
+                return True
+
+            # Augment along the shortest path by its bottleneck capacity
+            bottleneck = None
+            node = sink
+            while node != source:
+                parent, index = previous[node]
+                capacity = self.graph[parent][index][1]
+                bottleneck = capacity if bottleneck is None else min(bottleneck, capacity)
+                node = parent
+            node = sink
+            while node != source:
+                parent, index = previous[node]
+                edge = self.graph[parent][index]
+                edge[1] -= bottleneck
+                self.graph[node][edge[3]][1] += bottleneck
+                node = parent
+
+def _optimizer_seat_cost(passenger_kind: Tuple[bool, bool, bool, bool],
+                         seat_kind: Tuple[SeatClass, SeatType, bool, bool, bool, bool]) -> Optional[int]:
+    """Cost of seating a kind of passenger in a kind of seat, None if not allowed"""
+    is_vip, needs_access, is_child, _ = passenger_kind
+    seat_class, seat_type, vip_zone, accessible, quiet, splits = seat_kind
+
+    # CRITICAL: VIP zones stay VIP-only
+    if vip_zone and not is_vip:
+        return None
+
+    cost = 0
+    if seat_type == SeatType.MIDDLE:  # Window and aisle seats are preferred
+        cost += 3
+    if splits:  # Would sit between two occupied seats
+        cost += 2
+    if is_child and quiet:
+        cost += 10
+    if needs_access:
+        cost += 0 if accessible else (2 if seat_type == SeatType.AISLE else 8)
+    elif accessible:  # Keep accessible seats for passengers who need them
+        cost += 2
+    if is_vip:
+        cost += (0 if vip_zone else 6) + SEAT_CLASSES.index(seat_class)
+    return cost
+
+def _optimizer_unseated_cost(passenger_kind: Tuple[bool, bool, bool, bool]) -> int:
+    """Cost of leaving a passenger on the waiting list, higher for priority passengers"""
+    is_vip, needs_access, _, is_senior = passenger_kind
+    return OPTIMIZER_UNSEATED_COST + 300 * is_vip + 200 * needs_access + 100 * is_senior
+
+class EventChannel:
+    """Server-sent event fan-out for one flight.
+
+    Every event is serialized once into a bounded log; subscribers only keep
+    a cursor into it and are woken together, so publishing costs the same
+    for one subscriber or a thousand. A subscriber that falls behind the
+    log is told to resynchronise instead of holding events back.
+    """
+
+    def __init__(self, history: int = EVENT_HISTORY):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        # Event IDs are "<epoch>-<sequence>", the epoch tells channels apart
+        self.epoch = os.urandom(6).hex()
+        self.sequence = 0
+        self.subscribers = 0
+
+    def format(self, event: str, data, sequence: int) -> bytes:
+        """Serialize one event in the text/event-stream format"""
+        payload = json.dumps(data, separators=(',', ':'))
+        return f"id: {self.epoch}-{sequence}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+    def publish(self, event: str, data) -> int:
+        """Append an event and wake the subscribers"""
+        with self._cond:
+            self.sequence += 1
+            self._events.append((self.sequence, self.format(event, data, self.sequence)))
+            self._cond.notify_all()
+            return self.sequence
+
+    def skip(self):
+        """A change nobody listened to: anyone resuming from before it must resynchronise"""
+        with self._cond:
+            self.sequence += 1
+            self._events.clear()
+
+    def subscribe(self, after: int, timeout: float = SSE_KEEPALIVE_SECONDS, duration: float = float('inf')):
+        """Yield the serialized events after sequence `after`.
+
+        Yields None after `timeout` seconds without events (time for a
+        keep-alive) and stops after `duration` seconds. Raises LookupError
+        when events after `after` are no longer in the log.
+        """
+        deadline = time.monotonic() + duration
+        with self._cond:
+            self.subscribers += 1
+        try:
+            while time.monotonic() < deadline:
+                with self._cond:
+                    if self.sequence <= after:
+                        self._cond.wait(min(timeout, max(deadline - time.monotonic(), 0)))
+                    pending = []
+                    if self.sequence > after:
+                        first = self._events[0][0] if self._events else self.sequence + 1
+                        if first > after + 1:
+                            raise LookupError(f"Event {after + 1} is no longer available")
+                        pending = [(sequence, payload) for sequence, payload in self._events if sequence > after]
+                if not pending:
+                    yield None
+                    continue
+                for sequence, payload in pending:
+                    after = sequence
+                    yield payload
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+def _flag(value) -> bool:
+    """Read a yes/no field given as a JSON boolean or a CSV string"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+def _publishes(method):
+    """Publish a new snapshot after a public mutating method returns.
+
+    Only the outermost call publishes, after it has released its locks, so
+    publishing never waits while holding a lock of the flight.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        depth = getattr(self._calls, 'depth', 0)
+        self._calls.depth = depth + 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._calls.depth = depth
+            if depth == 0:
+                self._publish()
+    return wrapper
+
+class AircraftSeatingSystem:
+    def __init__(self, seat_backend: str = 'dict', layout=DEFAULT_LAYOUT,
+                 rng: Optional[random.Random] = None):
+        if seat_backend not in SEAT_BACKENDS:
+            raise ValueError(f"Unknown seat backend: {seat_backend}")
+        
+        self.seat_backend = seat_backend
+        self.layout = get_layout_template(layout)
+        # Source of randomness for unavailable seats, seed it for reproducible flights
+        self.rng = rng if rng is not None else random.Random()
+        # Lock order: flight lock, cabin locks in cabin order, queue lock.
+        # The flight lock serializes whole-flight work (batch assignment, reset,
+        # state loads); a cabin lock guards the seats and indexes of one cabin;
+        # the queue lock guards passengers, groups, pending sets and waiting list.
+        self.lock = threading.RLock()
+        self.cabin_locks = tuple(threading.RLock() for _ in self.layout.spec.cabins)
+        self.queue_lock = threading.RLock()
+        # Snapshots are built one at a time; rows changed since the last one are dirty
+        self.publish_lock = threading.Lock()
+        self._dirty_rows = set()
+        self._calls = threading.local()
+        # Called with the delta of every published commit, e.g. to journal it
+        self.on_commit: Optional[Callable[[Dict], None]] = None
+        self._group_members: Dict[str, Tuple[str, ...]] = {}
+        self.snapshot = FlightSnapshot(version=0, seating_layout={}, passengers={}, waiting_list=(),
+                                       layout_epoch=os.urandom(6).hex())
+        # (from layout_version, to layout_version, ((row, letter, seat info), ...))
+        # for recent seat map versions
+        self.layout_changes = deque(maxlen=LAYOUT_CHANGE_HISTORY)
+        # Last snapshot labelled with a shared version (see label_layout) and
+        # the epoch of seat maps published since, None while never labelled
+        self._labelled: Optional[FlightSnapshot] = None
+        self._local_epoch: Optional[str] = None
+        self.events = EventChannel()
         self.seats = {}
         self.passengers = {}
+        # Booking number of the next passenger, keeps counting across resets
+        self.next_booking = 0
         self.groups = {}
-        self.waiting_list = []
+        self.waiting_list = WaitingList()
+        # Passengers and groups that still need work from assign_seats (insertion-ordered sets)
+        self.pending_passengers: Dict[str, None] = {}
+        self.pending_groups: Dict[str, None] = {}
         self.initialize_aircraft()
         self.mark_unavailable_seats()
 
     def initialize_aircraft(self):
-        """Initialize the aircraft seating layout"""
-        # First Class: Rows 1-3, 2-2 configuration
-        for row in range(1, 4):
-            for seat_letter in ['A', 'B', 'D', 'E']:
-                seat_type = SeatType.WINDOW if seat_letter in ['A', 'E'] else SeatType.AISLE
-                self.seats[(row, seat_letter)] = Seat(
-                    row=row,
-                    seat_letter=seat_letter,
-                    seat_class=SeatClass.FIRST,
-                    seat_type=seat_type,
-                    is_vip_zone=True
-                )
-
-        # Business Class: Rows 4-8, 2-3 configuration
-        for row in range(4, 9):
-            for seat_letter in ['A', 'B', 'C', 'D', 'E']:
-                if seat_letter in ['A', 'E']:
-                    seat_type = SeatType.WINDOW
-                elif seat_letter in ['B', 'D']:
-                    seat_type = SeatType.AISLE
-                else:
-                    seat_type = SeatType.MIDDLE
-                
-                self.seats[(row, seat_letter)] = Seat(
-                    row=row,
-                    seat_letter=seat_letter,
-                    seat_class=SeatClass.BUSINESS,
-                    seat_type=seat_type,
-                    is_vip_zone=(row <= 6),  # Rows 4-6 are VIP in business
-                    is_accessible=(seat_letter in ['B', 'D'] and row == 8)  # Aisle seats in row 8
-                )
-
-        # Economy Class: Rows 9-30, 3-3 configuration
-        for row in range(9, 31):
-            for seat_letter in ['A', 'B', 'C', 'D', 'E', 'F']:
-                if seat_letter in ['A', 'F']:
-                    seat_type = SeatType.WINDOW
-                elif seat_letter in ['C', 'D']:
-                    seat_type = SeatType.AISLE
-                else:
-                    seat_type = SeatType.MIDDLE
-                
-                self.seats[(row, seat_letter)] = Seat(
-                    row=row,
-                    seat_letter=seat_letter,
-                    seat_class=SeatClass.ECONOMY,
-                    seat_type=seat_type,
-                    is_quiet_zone=(16 <= row <= 18),  # Quiet zone rows 16-18
-                    is_accessible=(seat_letter in ['C', 'D'] and row >= 25)  # Accessible seats near exits
-                )
+        """Instantiate empty seats from the compiled layout template"""
+        with self._exclusive():
+            if self.seat_backend == 'compact':
+                self.seats = CompactSeatStore(self.layout)
+            else:
+                self.seats = self.layout.new_seats()
+            # Bumped on every change of a seat, for optimistic checks
+            self.seat_versions = array('L', [0]) * len(self.layout.keys)
+            self._build_indexes()
+            self._dirty_rows.update(self.layout.row_keys)
 
+    @_publishes
     def mark_unavailable_seats(self):
         """Randomly mark 5 seats as unavailable"""
-        available_seats = [(row, letter) for (row, letter), seat in self.seats.items() if seat.is_available]
-        unavailable_count = min(5, len(available_seats))
-        unavailable_seats = random.sample(available_seats, unavailable_count)
-        
-        for row, letter in unavailable_seats:
-            self.seats[(row, letter)].is_available = False
+        with self._exclusive():
+            available_seats = [(row, letter) for (row, letter), seat in self.seats.items() if seat.is_available]
+            unavailable_count = min(5, len(available_seats))
+            unavailable_seats = self.rng.sample(available_seats, unavailable_count)
+            
+            for row, letter in unavailable_seats:
+                self.seats[(row, letter)].is_available = False
+                self._refresh_seat(row, letter)
+
+    @contextmanager
+    def _cabins_held(self, cabins):
+        """Hold the locks of the given cabins, in lock order"""
+        with ExitStack() as stack:
+            for cabin in sorted(cabins):
+                stack.enter_context(self.cabin_locks[cabin])
+            yield
+
+    @contextmanager
+    def _cabins_locked(self, *rows: int):
+        """Hold the cabin locks of the given rows for writing them.
+
+        The rows are marked dirty before anything changes, so a concurrent
+        _publish waits for this writer instead of catching half its change.
+        """
+        with self._cabins_held({self.layout.row_cabins[row] for row in rows}):
+            self._dirty_rows.update(rows)
+            yield
 
+    @contextmanager
+    def _exclusive(self):
+        """Hold every lock of the flight"""
+        with self.lock, self._cabins_held(range(len(self.cabin_locks))), self.queue_lock:
+            yield
+
+    def _build_indexes(self):
+        """Build the seat indexes from the current seat state"""
+        self.index = SeatAvailabilityIndex(self.layout, self.seats)
+        self.run_index = ContiguousRunIndex(self.layout, self.index)
+
+    def _refresh_seat(self, row: int, seat_letter: str):
+        """Propagate a seat state change to the seat indexes (cabin lock held)"""
+        self.seat_versions[self.layout.ordinals[(row, seat_letter)]] += 1
+        self._dirty_rows.add(row)
+        self.index.update(row, seat_letter, self.seats[(row, seat_letter)])
+        self.run_index.refresh_row(row)
+
+    @_publishes
     def add_solo_passenger(self, name: str, age: int, has_accessibility_needs: bool = False, 
                           is_vip: bool = False, is_senior: bool = False) -> bool:
         """Add a solo passenger"""
-        # Input validation
-        if not name or not isinstance(name, str) or len(name.strip()) == 0:
+        if self.solo_passenger_error(name, age) is not None:
             return False
-        
+        self._add_solo_passenger(name, int(age), has_accessibility_needs, is_vip, is_senior)
+        return True
+
+    @staticmethod
+    def solo_passenger_error(name, age) -> Optional[str]:
+        """Why a solo passenger would be rejected, None if it is valid"""
+        if not name or not isinstance(name, str) or len(name.strip()) == 0:
+            return 'Name is required'
         try:
             age = int(age)
-            if age <= 0 or age > 120:
-                return False
         except (ValueError, TypeError):
-            return False
-            
-        passenger_id = f"solo_{len(self.passengers) + 1}"
-        passenger = Passenger(
-            id=passenger_id,
-            name=name,
-            age=age,
-            passenger_type=PassengerType.SOLO,
-            has_accessibility_needs=has_accessibility_needs,
-            is_vip=is_vip,
-            is_senior=is_senior
-        )
-        self.passengers[passenger_id] = passenger
-        return True
+            return 'Age must be a whole number'
+        if age <= 0 or age > 120:
+            return 'Age must be between 1 and 120'
+        return None
+
+    def _add_solo_passenger(self, name: str, age: int, has_accessibility_needs: bool,
+                            is_vip: bool, is_senior: bool) -> str:
+        with self.queue_lock:
+            passenger_id = f"solo_{self.next_booking + 1}"
+            passenger = Passenger(
+                id=passenger_id,
+                name=name,
+                age=age,
+                passenger_type=PassengerType.SOLO,
+                has_accessibility_needs=has_accessibility_needs,
+                is_vip=is_vip,
+                is_senior=is_senior,
+                booking=self.next_booking
+            )
+            self.next_booking += 1
+            self.passengers[passenger_id] = passenger
+            self.pending_passengers[passenger_id] = None
+        return passenger_id
 
+    @_publishes
     def add_group(self, name: str, size: int, has_children: bool = False,
                   has_accessibility_needs: bool = False, is_vip: bool = False,
                   has_senior_members: bool = False) -> bool:
         """Add a group"""
-        # Input validation
-        if not name or not isinstance(name, str) or len(name.strip()) == 0:
+        if self.group_error(name, size) is not None:
             return False
-            
+        self._add_group(name, int(size), has_children, has_accessibility_needs, is_vip, has_senior_members)
+        return True
+
+    @staticmethod
+    def group_error(name, size) -> Optional[str]:
+        """Why a group would be rejected, None if it is valid"""
+        if not name or not isinstance(name, str) or len(name.strip()) == 0:
+            return 'Name is required'
         try:
             size = int(size)
-            if not (2 <= size <= 7):
-                return False
         except (ValueError, TypeError):
-            return False
-        
-        group_id = f"group_{len(self.groups) + 1}"
-        group = Group(
-            id=group_id,
-            name=name,
-            size=size,
-            has_children=has_children,
-            has_accessibility_needs=has_accessibility_needs,
-            is_vip=is_vip,
-            has_senior_members=has_senior_members,
-            members=[]
-        )
-        
-        # Create group members
-        for i in range(size):
-            passenger_id = f"{group_id}_member_{i + 1}"
-            passenger = Passenger(
-                id=passenger_id,
-                name=f"{name} Member {i + 1}",
-                age=30,  # Default age
-                passenger_type=PassengerType.GROUP,
+            return 'Group size must be a whole number'
+        if not (2 <= size <= 7):
+            return 'Group size must be between 2 and 7'
+        return None
+
+    def _add_group(self, name: str, size: int, has_children: bool, has_accessibility_needs: bool,
+                   is_vip: bool, has_senior_members: bool) -> str:
+        with self.queue_lock:
+            group_id = f"group_{self.next_booking + 1}"
+            group = Group(
+                id=group_id,
+                name=name,
+                size=size,
+                has_children=has_children,
                 has_accessibility_needs=has_accessibility_needs,
                 is_vip=is_vip,
-                is_senior=has_senior_members,
-                group_id=group_id
+                has_senior_members=has_senior_members,
+                members=[]
             )
-            group.members.append(passenger)
-            self.passengers[passenger_id] = passenger
         
-        self.groups[group_id] = group
-        return True
+            # Create group members
+            for i in range(size):
+                passenger_id = f"{group_id}_member_{i + 1}"
+                passenger = Passenger(
+                    id=passenger_id,
+                    name=f"{name} Member {i + 1}",
+                    age=30,  # Default age
+                    passenger_type=PassengerType.GROUP,
+                    has_accessibility_needs=has_accessibility_needs,
+                    is_vip=is_vip,
+                    is_senior=has_senior_members,
+                    group_id=group_id,
+                    booking=self.next_booking
+                )
+                self.next_booking += 1
+                group.members.append(passenger)
+                self.passengers[passenger_id] = passenger
+                self.pending_passengers[passenger_id] = None
+        
+            self.groups[group_id] = group
+            self.pending_groups[group_id] = None
+        return group_id
+
+    @_publishes
+    def import_passengers(self, records: Iterable, assign: bool = False,
+                          max_records: int = IMPORT_MAX_RECORDS) -> Dict:
+        """Add many solo passengers and groups as one commit.
+
+        ``records`` is consumed one at a time, so it can stream from a file
+        or request body. Each record is a dict with the fields of the add
+        routes: ``type`` ('solo' or 'group', default 'group' when a ``size``
+        is given), ``name``, ``age``, ``size``, and the ``accessibility``,
+        ``vip``, ``senior`` and ``children`` flags. Invalid records are
+        skipped and reported, the others are added. Records are validated
+        first and the valid ones added under one hold of the queue lock, so
+        no snapshot published meanwhile (by this or any other writer) shows
+        part of the import; with ``assign`` one assign_seats pass runs after.
+        """
+        results = []
+        # (result, (add function, *arguments)) of every valid record, in order
+        batch = []
+        for number, record in enumerate(records, 1):
+            if number > max_records:
+                results.append({'record': number, 'success': False,
+                                'error': f'Too many records, at most {max_records} are imported'})
+                break
+            if not isinstance(record, dict):
+                results.append({'record': number, 'success': False, 'error': 'Record is not an object'})
+                continue
+            
+            flags = {key: _flag(record.get(key)) for key in ('accessibility', 'vip', 'senior', 'children')}
+            kind = str(record.get('type') or ('group' if record.get('size') not in (None, '') else 'solo')).lower()
+            name, error = record.get('name'), None
+            if kind == 'solo':
+                age = record.get('age')
+                error = self.solo_passenger_error(name, age)
+                if error is None:
+                    add = (self._add_solo_passenger, name, int(age), flags['accessibility'],
+                           flags['vip'], flags['senior'])
+            elif kind == 'group':
+                size = record.get('size')
+                error = self.group_error(name, size)
+                if error is None:
+                    add = (self._add_group, name, int(size), flags['children'], flags['accessibility'],
+                           flags['vip'], flags['senior'])
+            else:
+                error = f"Unknown record type: {kind}"
+            
+            if error is None:
+                result = {'record': number, 'success': True}
+                batch.append((result, add))
+            else:
+                result = {'record': number, 'success': False, 'error': error}
+            results.append(result)
+        
+        with self.queue_lock:
+            for result, (function, *args) in batch:
+                result['id'] = function(*args)
+        imported = len(batch)
+        report = {'imported': imported, 'rejected': len(results) - imported, 'results': results}
+        if assign:
+            report['summary'] = self.assign_seats().to_dict()
+        return report
+
+    @_publishes
+    def assign_seats(self, full: bool = False, optimize: bool = False,
+                     time_budget: Optional[float] = None) -> AssignmentSummary:
+        """Main seating algorithm.
 
-    def assign_seats(self) -> bool:
-        """Main seating algorithm"""
-        unassigned_passengers = [p for p in self.passengers.values() if p.assigned_seat is None]
+        Only passengers and groups marked pending since the last pass are
+        processed: new bookings, passengers displaced by an override and
+        waitlisted passengers re-queued after a seat was freed. Pass
+        ``full=True`` to reconsider every unassigned passenger instead.
+
+        With ``optimize=True`` solo placement (steps 1, 2 and 5) is solved as
+        a min-cost assignment over the whole batch instead of first-fit, within
+        ``time_budget`` seconds; anyone left when the budget runs out is placed
+        first-fit.
+
+        A pass holds every lock of the flight; overrides and cancellations
+        wait for it to finish.
+        """
+        start = time.perf_counter()
+        with self._exclusive():
+            ASSIGN_PHASE_SECONDS.observe(time.perf_counter() - start, ('lock_wait',))
+            return self._assign_pending(full, optimize, time_budget)
+
+    def _assign_pending(self, full: bool, optimize: bool, time_budget: Optional[float]) -> AssignmentSummary:
+        """Run one assignment pass, all flight locks held"""
+        with ASSIGN_PHASE_SECONDS.time(('total',)):
+            return self._assign_phases(full, optimize, time_budget)
+
+    def _assign_phases(self, full: bool, optimize: bool, time_budget: Optional[float]) -> AssignmentSummary:
+        if full:
+            unassigned_passengers = [p for p in self.passengers.values() if p.assigned_seat is None]
+            pending_groups = [g for g in self.groups.values()
+                              if any(m.assigned_seat is None for m in g.members)]
+        else:
+            unassigned_passengers = [self.passengers[pid] for pid in self.pending_passengers
+                                     if pid in self.passengers and self.passengers[pid].assigned_seat is None]
+            pending_groups = [self.groups[gid] for gid in self.pending_groups if gid in self.groups]
+        self.pending_passengers = {}
+        self.pending_groups = {}
+        deadline = time.perf_counter() + (OPTIMIZER_TIME_BUDGET if time_budget is None else time_budget)
         
         # Step 1: Process VIP passengers first
         vip_passengers = [p for p in unassigned_passengers if p.is_vip and p.passenger_type == PassengerType.SOLO]
-        for passenger in vip_passengers:
-            self._assign_vip_passenger(passenger)
-        
         # Step 2: Handle passengers with accessibility needs
         accessibility_passengers = [p for p in unassigned_passengers 
                                   if p.has_accessibility_needs and p.assigned_seat is None]
-        for passenger in accessibility_passengers:
-            self._assign_accessibility_passenger(passenger)
+        if optimize:
+            priority_passengers = {p.id: p for p in vip_passengers + accessibility_passengers}
+            with ASSIGN_PHASE_SECONDS.time(('priority_optimizer',)):
+                self._optimize_solo_passengers(list(priority_passengers.values()), deadline)
+        else:
+            with ASSIGN_PHASE_SECONDS.time(('vip',)):
+                for passenger in vip_passengers:
+                    self._assign_vip_passenger(passenger)
+            with ASSIGN_PHASE_SECONDS.time(('accessibility',)):
+                for passenger in accessibility_passengers:
+                    if passenger.assigned_seat is None:
+                        self._assign_accessibility_passenger(passenger)
         
         # Step 3: Assign VIP groups
-        vip_groups = [g for g in self.groups.values() if g.is_vip]
-        for group in vip_groups:
-            self._assign_group(group)
+        vip_groups = [g for g in pending_groups if g.is_vip]
+        with ASSIGN_PHASE_SECONDS.time(('vip_groups',)):
+            self._pack_groups(vip_groups)
         
         # Step 4: Assign regular groups
-        regular_groups = [g for g in self.groups.values() if not g.is_vip]
-        for group in regular_groups:
-            self._assign_group(group)
+        regular_groups = [g for g in pending_groups if not g.is_vip]
+        with ASSIGN_PHASE_SECONDS.time(('groups',)):
+            self._pack_groups(regular_groups)
         
         # Step 5: Place remaining solo travelers
         remaining_solo = [p for p in unassigned_passengers 
                          if p.passenger_type == PassengerType.SOLO and p.assigned_seat is None]
-        for passenger in remaining_solo:
-            self._assign_solo_passenger(passenger)
+        with ASSIGN_PHASE_SECONDS.time(('solo_optimizer' if optimize else 'solo',)):
+            if optimize:
+                self._optimize_solo_passengers(remaining_solo, deadline)
+            else:
+                for passenger in remaining_solo:
+                    self._assign_solo_passenger(passenger)
         
-        return True
+        processed = {p.id: p for p in unassigned_passengers}
+        for group in pending_groups:
+            processed.update((m.id, m) for m in group.members)
+        
+        summary = AssignmentSummary(processed=len(processed))
+        for passenger in processed.values():
+            if passenger.assigned_seat is not None:
+                summary.assigned[passenger.id] = passenger.assigned_seat
+            elif passenger.id in self.waiting_list:
+                summary.waitlisted.append(passenger.id)
+        return summary
+
+    def _optimize_solo_passengers(self, passengers: List[Passenger], deadline: float):
+        """Seat a batch of passengers with one min-cost assignment.
+
+        Passengers with the same (VIP, accessibility, child, senior) profile
+        and free seats with the same attributes are interchangeable, so the
+        passenger x seat cost matrix collapses to a kind x kind transportation
+        problem whose size does not depend on the manifest or the aircraft.
+        """
+        passengers = [p for p in passengers if p.assigned_seat is None]
+        if not passengers:
+            return
+        
+        passengers_by_kind: Dict[tuple, List[Passenger]] = {}
+        for passenger in passengers:
+            kind = (passenger.is_vip, passenger.has_accessibility_needs, passenger.age < 12, passenger.is_senior)
+            passengers_by_kind.setdefault(kind, []).append(passenger)
+        
+        # Seat kinds split further on whether the seat sits between two occupied seats
+        index = self.index
+        splitting = index.splitting_mask()
+        seats_by_kind: Dict[tuple, int] = {}
+        for kind, mask in self.layout.seat_kinds.items():
+            free = index.free & mask
+            for splits, seats in ((False, free & ~splitting), (True, free & splitting)):
+                if seats:
+                    seats_by_kind[kind + (splits,)] = seats
+        
+        flow = MinCostFlow()
+        source, sink = flow.add_node(), flow.add_node()
+        seat_nodes = {}
+        for seat_kind, seats in seats_by_kind.items():
+            seat_nodes[seat_kind] = flow.add_node()
+            flow.add_edge(seat_nodes[seat_kind], sink, seats.bit_count(), 0)
+        
+        placements = []
+        for passenger_kind, members in passengers_by_kind.items():
+            node = flow.add_node()
+            flow.add_edge(source, node, len(members), 0)
+            flow.add_edge(node, sink, len(members), _optimizer_unseated_cost(passenger_kind))
+            for seat_kind, seat_node in seat_nodes.items():
+                cost = _optimizer_seat_cost(passenger_kind, seat_kind)
+                if cost is not None:
+                    placements.append((passenger_kind, seat_kind, flow.add_edge(node, seat_node, len(members), cost)))
+        
+        if not flow.solve(source, sink, deadline):
+            # Out of time: fall back to first-fit for the whole batch
+            for passenger in passengers:
+                self._assign_solo_passenger(passenger)
+            return
+        
+        queues = {kind: deque(members) for kind, members in passengers_by_kind.items()}
+        for passenger_kind, seat_kind, edge in placements:
+            seats = seats_by_kind[seat_kind]
+            for _ in range(flow.flow(edge)):
+                row, letter = index.first(seats)
+                seats &= seats - 1
+                self._assign_seat_to_passenger(queues[passenger_kind].popleft(), row, letter)
+            seats_by_kind[seat_kind] = seats
+        
+        for members in queues.values():
+            for passenger in members:
+                self._add_to_waiting_list(passenger)
+
+    def _mark_pending(self, passenger: Passenger):
+        """Queue a passenger (and its group) for the next assign_seats pass"""
+        with self.queue_lock:
+            self.pending_passengers[passenger.id] = None
+            if passenger.group_id in self.groups:
+                self.pending_groups[passenger.group_id] = None
+
+    def _add_to_waiting_list(self, passenger: Passenger):
+        """Put a passenger on the waiting list once"""
+        with self.queue_lock:
+            if passenger.id not in self.waiting_list:
+                PASSENGERS_WAITLISTED.inc()
+            self.waiting_list.add(passenger)
+
+    def _next_waiting_for_seat(self, row: int, seat_letter: str) -> Optional[Passenger]:
+        """Highest priority waitlisted passenger allowed to take a seat"""
+        # CRITICAL: VIP zone seats are only offered to VIP passengers
+        with self.queue_lock:
+            passenger_id = self.waiting_list.peek(vip_only=self.seats[(row, seat_letter)].is_vip_zone)
+            return self.passengers.get(passenger_id) if passenger_id else None
+
+    def _requeue_waiting_list(self, row: int, seat_letter: str):
+        """A seat was freed: queue the best eligible waitlisted passenger for the next pass"""
+        with self.queue_lock:
+            passenger = self._next_waiting_for_seat(row, seat_letter)
+            if passenger:
+                self._mark_pending(passenger)
 
     def _assign_vip_passenger(self, passenger: Passenger) -> bool:
         """Assign VIP passenger to VIP zone"""
-        vip_seats = [(row, letter) for (row, letter), seat in self.seats.items()
-                     if seat.is_vip_zone and seat.is_available and seat.passenger_id is None]
+        index = self.index
+        vip_seats = index.free & index.vip_zone
         
         # Prefer window and aisle seats
-        preferred_seats = [(row, letter) for row, letter in vip_seats
-                          if self.seats[(row, letter)].seat_type in [SeatType.WINDOW, SeatType.AISLE]]
+        preferred_seats = vip_seats & (index.type_masks[SeatType.WINDOW] | index.type_masks[SeatType.AISLE])
         
         target_seats = preferred_seats if preferred_seats else vip_seats
         
         if target_seats:
-            row, letter = target_seats[0]
+            row, letter = index.first(target_seats)
             return self._assign_seat_to_passenger(passenger, row, letter)
         
         return False
 
     def _assign_accessibility_passenger(self, passenger: Passenger) -> bool:
         """Assign passenger with accessibility needs"""
-        accessible_seats = [(row, letter) for (row, letter), seat in self.seats.items()
-                           if seat.is_accessible and seat.is_available and seat.passenger_id is None]
+        index = self.index
+        candidate_seats = index.free
         
         # CRITICAL: Exclude VIP zones for non-VIP passengers even for accessibility
         if not passenger.is_vip:
-            accessible_seats = [(row, letter) for row, letter in accessible_seats
-                               if not self.seats[(row, letter)].is_vip_zone]
+            candidate_seats &= ~index.vip_zone
         
+        accessible_seats = candidate_seats & index.accessible
         if accessible_seats:
-            row, letter = accessible_seats[0]
+            row, letter = index.first(accessible_seats)
             return self._assign_seat_to_passenger(passenger, row, letter)
         
-        # Fallback to aisle seats
-        aisle_seats = [(row, letter) for (row, letter), seat in self.seats.items()
-                      if seat.seat_type == SeatType.AISLE and seat.is_available and seat.passenger_id is None]
-        
-        # CRITICAL: Exclude VIP zones for non-VIP passengers in fallback too
-        if not passenger.is_vip:
-            aisle_seats = [(row, letter) for row, letter in aisle_seats
-                          if not self.seats[(row, letter)].is_vip_zone]
-        
+        # Fallback to aisle seats (VIP zones stay excluded for non-VIP passengers)
+        aisle_seats = candidate_seats & index.type_masks[SeatType.AISLE]
         if aisle_seats:
-            row, letter = aisle_seats[0]
+            row, letter = index.first(aisle_seats)
             return self._assign_seat_to_passenger(passenger, row, letter)
         
         return False
 
+    def _pack_groups(self, groups: List[Group]):
+        """Pack a batch of groups, largest first.
+
+        A greedy adaptation of batch packing, not a joint optimisation:
+        groups are placed one at a time, best-fit decreasing. Placing big
+        groups while long runs are still intact and giving every group the
+        shortest run that fits keeps the cabin from fragmenting into runs too
+        short for anyone, and stays well inside the request path for hundreds
+        of groups. No DP runs over the row capacities of the whole batch, so
+        an earlier group can take a run a later combination would have
+        filled better.
+        """
+        def unassigned(group):
+            return sum(1 for m in group.members if m.assigned_seat is None)
+        
+        for group in sorted(groups, key=unassigned, reverse=True):
+            self._assign_group(group)
+
     def _assign_group(self, group: Group) -> bool:
         """Assign seats to a group"""
-        available_rows = self._find_available_rows_for_group(group)
+        unassigned_members = [m for m in group.members if m.assigned_seat is None]
+        if not unassigned_members:
+            return True
         
-        if not available_rows:
+        if not self.run_index.has_run(2):
             # Add to waiting list
-            self.waiting_list.extend([p.id for p in group.members if p.assigned_seat is None])
+            for member in unassigned_members:
+                self._add_to_waiting_list(member)
             return False
         
-        # Find best row that can accommodate the group
-        for row_num, available_seats in available_rows:
-            if len(available_seats) >= group.size:
-                # CRITICAL: Check VIP zone restriction for non-VIP groups
-                if not group.is_vip and any(self.seats[(row_num, letter)].is_vip_zone 
-                                          for row_num, letter in available_seats[:group.size]):
-                    continue
-                
-                # Check quiet zone restriction
-                if group.has_children and any(self.seats[(row_num, letter)].is_quiet_zone 
-                                            for row_num, letter in available_seats[:group.size]):
-                    continue
-                
-                # Assign seats to group members
-                seats_to_assign = available_seats[:group.size]
-                for i, member in enumerate(group.members):
-                    if member.assigned_seat is None and i < len(seats_to_assign):
-                        row, letter = seats_to_assign[i]
-                        self._assign_seat_to_passenger(member, row, letter)
-                
-                return True
+        # CRITICAL: Non-VIP groups stay out of VIP zones, groups with children out of quiet zones
+        available_rows = self._find_available_rows_for_group(group, len(unassigned_members))
+        for row_num, seats_to_assign in available_rows:
+            for member, (row, letter) in zip(unassigned_members, seats_to_assign):
+                self._assign_seat_to_passenger(member, row, letter)
+            return True
         
         # If can't fit in one row, try to split across adjacent rows
         return self._assign_split_group(group)
 
-    def _find_available_rows_for_group(self, group: Group) -> List[Tuple[int, List[Tuple[int, str]]]]:
-        """Find rows with enough consecutive seats for a group"""
-        available_rows = []
-        
-        for row_num in range(1, 31):
-            row_seats = [(row_num, letter) for letter in ['A', 'B', 'C', 'D', 'E', 'F']
-                        if (row_num, letter) in self.seats]
-            
-            available_in_row = [(row_num, letter) for row_num, letter in row_seats
-                               if self.seats[(row_num, letter)].is_available and 
-                               self.seats[(row_num, letter)].passenger_id is None]
-            
-            if len(available_in_row) >= 2:  # At least 2 seats available
-                available_rows.append((row_num, available_in_row))
-        
-        return available_rows
+    def _find_available_rows_for_group(self, group: Group,
+                                       size: Optional[int] = None) -> List[Tuple[int, List[Tuple[int, str]]]]:
+        """Find the best-fitting row with enough contiguous seats for a group"""
+        run = self.run_index.best_fit(size or group.size,
+                                      allow_vip=group.is_vip,
+                                      allow_quiet=not group.has_children)
+        if run is None:
+            return []
+        return [(run[0][0], run)]
 
     def _assign_split_group(self, group: Group) -> bool:
         """Split group across adjacent rows if necessary"""
-        # This is a simplified implementation
         unassigned_members = [m for m in group.members if m.assigned_seat is None]
         
+        placement = self._find_split_placement(len(unassigned_members),
+                                               allow_vip=group.is_vip,
+                                               allow_quiet=not group.has_children)
+        if placement:
+            for member, (row, letter) in zip(unassigned_members, placement):
+                self._assign_seat_to_passenger(member, row, letter)
+            return True
+        
+        # No block of adjacent rows fits: seat members individually
         for member in unassigned_members:
             if not self._assign_solo_passenger(member):
-                self.waiting_list.append(member.id)
+                self._add_to_waiting_list(member)
         
         return True
 
-    def _assign_solo_passenger(self, passenger: Passenger) -> bool:
-        """Assign seat to solo passenger"""
-        # Prefer window and aisle seats, but EXCLUDE VIP zones for non-VIP passengers
-        preferred_seats = [(row, letter) for (row, letter), seat in self.seats.items()
-                          if seat.is_available and seat.passenger_id is None and
-                          seat.seat_type in [SeatType.WINDOW, SeatType.AISLE]]
-        
-        # CRITICAL: Exclude VIP zones for non-VIP passengers
-        if not passenger.is_vip:
-            preferred_seats = [(row, letter) for row, letter in preferred_seats
-                              if not self.seats[(row, letter)].is_vip_zone]
+    def _find_split_placement(self, size: int, allow_vip: bool = True,
+                              allow_quiet: bool = True) -> Optional[List[Tuple[int, str]]]:
+        """Find seats for a group across vertically adjacent rows of one cabin.
+
+        Each window of up to GROUP_SPLIT_MAX_ROWS consecutive rows offers the
+        longest allowed run of every row. A small DP chooses how many members
+        sit in each row, minimising rows used and orphaned single seats left
+        behind in the runs; the cheapest window wins, front rows first. Only
+        this one group is split: groups placed earlier keep their seats.
+        """
+        layout = self.layout
+        rows = sorted(layout.row_keys)
+        runs = {row: self.run_index.largest_run(row, allow_vip, allow_quiet) for row in rows}
+        best = None
         
-        # Avoid quiet zone for children and seniors have flexible seating
+        for first in range(len(rows)):
+            window = []
+            for row in rows[first:first + GROUP_SPLIT_MAX_ROWS]:
+                if (runs[row] is None or (window and (row != window[-1] + 1 or
+                                                      layout.row_cabins[row] != layout.row_cabins[window[0]]))):
+                    break
+                window.append(row)
+                if len(window) < 2 or sum(runs[r][1] for r in window) < size:
+                    continue
+                
+                # dp[seated] = (cost, pieces) after filling the rows seen so far, one member or more per row
+                dp = {0: (0, [])}
+                for r in window:
+                    start, length = runs[r]
+                    step = {}
+                    for seated, (cost, pieces) in dp.items():
+                        for take in range(1, min(length, size - seated) + 1):
+                            orphans = 1 if length - take == 1 else 0
+                            candidate = (cost + orphans, pieces + [(r, start, take)])
+                            if seated + take not in step or candidate[0] < step[seated + take][0]:
+                                step[seated + take] = candidate
+                    dp = step
+                if size not in dp:
+                    continue
+                
+                orphans, pieces = dp[size]
+                cost = (len(window), orphans, window[0])
+                if best is None or cost < best[0]:
+                    best = (cost, pieces)
+                break  # A longer window from the same first row only costs more
+        
+        if best is None:
+            return None
+        return [key for row, start, take in best[1] for key in self.run_index.row_keys[row][start:start + take]]
+
+    def _assign_solo_passenger(self, passenger: Passenger) -> bool:
+        """Assign seat to solo passenger"""
+        index = self.index
+        candidate_seats = index.free
+        
+        # CRITICAL: Exclude VIP zones for non-VIP passengers
+        if not passenger.is_vip:
+            candidate_seats &= ~index.vip_zone
+        
+        # Prefer window and aisle seats
+        preferred_seats = candidate_seats & (index.type_masks[SeatType.WINDOW] | index.type_masks[SeatType.AISLE])
+        
+        # Avoid quiet zone for children and seniors have flexible seating
         if passenger.age < 12:  # Child
-            preferred_seats = [(row, letter) for row, letter in preferred_seats
-                              if not self.seats[(row, letter)].is_quiet_zone]
+            preferred_seats &= ~index.quiet_zone
         
         # Check if seat would split a potential group (avoid middle seats between occupied seats)
-        suitable_seats = []
-        for row, letter in preferred_seats:
-            if not self._would_split_group(row, letter):
-                suitable_seats.append((row, letter))
+        suitable_seats = preferred_seats & ~index.splitting_mask()
         
         target_seats = suitable_seats if suitable_seats else preferred_seats
         
         if target_seats:
-            row, letter = target_seats[0]
+            row, letter = index.first(target_seats)
             return self._assign_seat_to_passenger(passenger, row, letter)
         
         # Fallback to any available seat (but still exclude VIP zones for non-VIP)
-        any_available = [(row, letter) for (row, letter), seat in self.seats.items()
-                        if seat.is_available and seat.passenger_id is None]
-        
-        # CRITICAL: Still exclude VIP zones in fallback for non-VIP passengers
-        if not passenger.is_vip:
-            any_available = [(row, letter) for row, letter in any_available
-                            if not self.seats[(row, letter)].is_vip_zone]
-        
-        if any_available:
-            row, letter = any_available[0]
+        if candidate_seats:
+            row, letter = index.first(candidate_seats)
             return self._assign_seat_to_passenger(passenger, row, letter)
         
-        self.waiting_list.append(passenger.id)
+        self._add_to_waiting_list(passenger)
         return False
 
     def _would_split_group(self, row: int, seat_letter: str) -> bool:
         """Check if assigning this seat would split a potential group"""
-        # Get adjacent seats in the same row
-        seat_letters = ['A', 'B', 'C', 'D', 'E', 'F']
-        if seat_letter not in seat_letters:
+        ordinal = self.layout.ordinals.get((row, seat_letter))
+        if ordinal is None:
             return False
         
-        seat_index = seat_letters.index(seat_letter)
-        
-        # Check if there are occupied seats on both sides
-        left_occupied = False
-        right_occupied = False
-        
-        if seat_index > 0:
-            left_seat = (row, seat_letters[seat_index - 1])
-            if left_seat in self.seats and self.seats[left_seat].passenger_id is not None:
-                left_occupied = True
-        
-        if seat_index < len(seat_letters) - 1:
-            right_seat = (row, seat_letters[seat_index + 1])
-            if right_seat in self.seats and self.seats[right_seat].passenger_id is not None:
-                right_occupied = True
+        # Neighbours come from the layout template, so seats across an aisle never count
+        left, right = self.layout.left[ordinal], self.layout.right[ordinal]
+        if left < 0 or right < 0:
+            return False
         
+        left_occupied = self.seats[self.layout.keys[left]].passenger_id is not None
+        right_occupied = self.seats[self.layout.keys[right]].passenger_id is not None
         return left_occupied and right_occupied
 
-    def _assign_seat_to_passenger(self, passenger: Passenger, row: int, seat_letter: str) -> bool:
-        """Assign a specific seat to a passenger"""
+    def _assign_seat_to_passenger(self, passenger: Passenger, row: int, seat_letter: str,
+                                  expected_version: Optional[int] = None) -> bool:
+        """Assign a specific seat to a passenger.
+
+        Fails if the seat is taken, if the passenger was seated by another
+        thread meanwhile, or if the seat changed since ``expected_version``
+        was read from ``seat_versions``.
+        """
         if (row, seat_letter) not in self.seats:
             return False
         
-        seat = self.seats[(row, seat_letter)]
-        if not seat.is_available or seat.passenger_id is not None:
-            return False
-        
-        seat.passenger_id = passenger.id
-        seat.passenger_name = passenger.name
-        passenger.assigned_seat = (row, seat_letter)
-        
-        # Remove from waiting list if present
-        if passenger.id in self.waiting_list:
-            self.waiting_list.remove(passenger.id)
+        ordinal = self.layout.ordinals[(row, seat_letter)]
+        with self._cabins_locked(row):
+            seat = self.seats[(row, seat_letter)]
+            if not seat.is_available or seat.passenger_id is not None:
+                return False
+            if expected_version is not None and self.seat_versions[ordinal] != expected_version:
+                return False
+            
+            with self.queue_lock:
+                if passenger.assigned_seat is not None or self.passengers.get(passenger.id) is not passenger:
+                    return False
+                passenger.assigned_seat = (row, seat_letter)
+                self.pending_passengers.pop(passenger.id, None)
+                # Remove from waiting list if present
+                self.waiting_list.discard(passenger.id)
+            
+            seat.passenger_id = passenger.id
+            seat.passenger_name = passenger.name
+            self._refresh_seat(row, seat_letter)
             
+        SEATS_ASSIGNED.inc()
         return True
 
+    @_publishes
     def admin_override(self, passenger_id: str, row: int, seat_letter: str) -> bool:
-        """Admin override to manually assign seat"""
-        if passenger_id not in self.passengers:
-            return False
-        
+        """Admin override to manually assign seat.
+
+        Only the cabins of the passenger's old and new seat are locked, so
+        overrides and cancellations in different cabins run concurrently. The
+        target seat's version and the passenger's seat are read before locking
+        and checked after; if another thread changed either, the override
+        starts over.
+        """
         if (row, seat_letter) not in self.seats:
             return False
         
-        passenger = self.passengers[passenger_id]
-        target_seat = self.seats[(row, seat_letter)]
-        
-        # Remove passenger from current seat if assigned
-        if passenger.assigned_seat:
-            old_row, old_letter = passenger.assigned_seat
-            self.seats[(old_row, old_letter)].passenger_id = None
-            self.seats[(old_row, old_letter)].passenger_name = None
-        
-        # If target seat is occupied, move that passenger to waiting list
-        if target_seat.passenger_id:
-            displaced_passenger = self.passengers[target_seat.passenger_id]
-            displaced_passenger.assigned_seat = None
-            if displaced_passenger.id not in self.waiting_list:
-                self.waiting_list.append(displaced_passenger.id)
-        
-        # Assign new seat
-        target_seat.passenger_id = passenger_id
-        target_seat.passenger_name = passenger.name
-        passenger.assigned_seat = (row, seat_letter)
-        
-        # Remove from waiting list if present
-        if passenger_id in self.waiting_list:
-            self.waiting_list.remove(passenger_id)
-        
-        return True
+        ordinal = self.layout.ordinals[(row, seat_letter)]
+        while True:
+            passenger = self.passengers.get(passenger_id)
+            if passenger is None:
+                return False
+            old_seat = passenger.assigned_seat
+            version = self.seat_versions[ordinal]
+            
+            rows = (row,) if old_seat is None else (row, old_seat[0])
+            with self._cabins_locked(*rows):
+                if self.seat_versions[ordinal] != version:
+                    continue
+                target_seat = self.seats[(row, seat_letter)]
+                
+                with self.queue_lock:
+                    if self.passengers.get(passenger_id) is not passenger or passenger.assigned_seat != old_seat:
+                        continue
+                    
+                    # If target seat is occupied, move that passenger to waiting list
+                    if target_seat.passenger_id and target_seat.passenger_id != passenger_id:
+                        displaced_passenger = self.passengers[target_seat.passenger_id]
+                        displaced_passenger.assigned_seat = None
+                        self._add_to_waiting_list(displaced_passenger)
+                        self._mark_pending(displaced_passenger)
+                    
+                    passenger.assigned_seat = (row, seat_letter)
+                    self.pending_passengers.pop(passenger_id, None)
+                    # Remove from waiting list if present
+                    self.waiting_list.discard(passenger_id)
+                
+                # Remove passenger from current seat if assigned
+                if old_seat:
+                    old_row, old_letter = old_seat
+                    self.seats[old_seat].passenger_id = None
+                    self.seats[old_seat].passenger_name = None
+                    self._refresh_seat(old_row, old_letter)
+                
+                # Assign new seat
+                target_seat.passenger_id = passenger_id
+                target_seat.passenger_name = passenger.name
+                self._refresh_seat(row, seat_letter)
+                
+                if old_seat and old_seat != (row, seat_letter):
+                    self._requeue_waiting_list(old_row, old_letter)
+                return True
 
+    @_publishes
     def cancel_booking(self, passenger_id: str) -> bool:
         """Cancel a passenger's booking"""
-        if passenger_id not in self.passengers:
-            return False
-        
-        passenger = self.passengers[passenger_id]
-        
-        # Free up the seat
-        if passenger.assigned_seat:
-            row, letter = passenger.assigned_seat
-            self.seats[(row, letter)].passenger_id = None
-            self.seats[(row, letter)].passenger_name = None
-            passenger.assigned_seat = None
-        
-        # Remove from waiting list if present
-        if passenger_id in self.waiting_list:
-            self.waiting_list.remove(passenger_id)
-        
-        # If part of a group, handle group cancellation
-        if passenger.group_id:
-            group = self.groups.get(passenger.group_id)
-            if group:
-                group.members = [m for m in group.members if m.id != passenger_id]
-                if not group.members:
-                    del self.groups[passenger.group_id]
-        
-        # Remove passenger
-        del self.passengers[passenger_id]
-        
-        # Try to assign someone from waiting list to the freed seat
-        self._process_waiting_list()
-        
-        return True
+        while True:
+            passenger = self.passengers.get(passenger_id)
+            if passenger is None:
+                return False
+            freed_seat = passenger.assigned_seat
+            
+            rows = () if freed_seat is None else (freed_seat[0],)
+            with self._cabins_locked(*rows):
+                with self.queue_lock:
+                    if self.passengers.get(passenger_id) is not passenger or passenger.assigned_seat != freed_seat:
+                        continue
+                    passenger.assigned_seat = None
+                    
+                    # Remove from waiting list if present
+                    self.waiting_list.discard(passenger_id)
+                    
+                    # If part of a group, handle group cancellation
+                    if passenger.group_id:
+                        group = self.groups.get(passenger.group_id)
+                        if group:
+                            group.members = [m for m in group.members if m.id != passenger_id]
+                            if not group.members:
+                                del self.groups[passenger.group_id]
+                    
+                    # Remove passenger
+                    del self.passengers[passenger_id]
+                    self.pending_passengers.pop(passenger_id, None)
+                
+                # Free up the seat and offer it to the waiting list
+                if freed_seat:
+                    row, letter = freed_seat
+                    self.seats[freed_seat].passenger_id = None
+                    self.seats[freed_seat].passenger_name = None
+                    self._refresh_seat(row, letter)
+                    self._process_waiting_list(row, letter)
+                
+                return True
 
-    def _process_waiting_list(self):
-        """Try to assign seats to passengers on waiting list"""
-        # Create a copy of the waiting list to avoid modification during iteration
-        waiting_passengers_ids = self.waiting_list.copy()
-        
-        for pid in waiting_passengers_ids:
-            if pid in self.passengers:
-                passenger = self.passengers[pid]
-                if self._assign_solo_passenger(passenger):
-                    # _assign_solo_passenger already removes from waiting list if successful
-                    pass
+    def _process_waiting_list(self, row: int, seat_letter: str) -> bool:
+        """Give a freed seat to the highest priority eligible waitlisted passenger"""
+        passenger = self._next_waiting_for_seat(row, seat_letter)
+        if passenger is None:
+            return False
+        # _assign_seat_to_passenger removes the passenger from the waiting list
+        return self._assign_seat_to_passenger(passenger, row, seat_letter)
 
+    @_publishes
     def reset_system(self):
         """Reset the entire system"""
+        with self._exclusive():
+            self._reset()
+
+    def _reset(self):
+        """Reset the entire system, all flight locks held"""
         self.passengers = {}
         self.groups = {}
-        self.waiting_list = []
+        self.waiting_list = WaitingList()
+        self.pending_passengers = {}
+        self.pending_groups = {}
         
-        # Reset all seats
-        for seat in self.seats.values():
-            seat.passenger_id = None
-            seat.passenger_name = None
-            seat.is_available = True
+        # Reset all seats from the layout template
+        self.initialize_aircraft()
         
         # Re-mark unavailable seats
         self.mark_unavailable_seats()
@@ -531,145 +1911,1657 @@ class AircraftSeatingSystem:
         for (row, letter), seat in self.seats.items():
             if row not in layout:
                 layout[row] = {}
-            layout[row][letter] = {
-                'seat_class': seat.seat_class.value,
-                'seat_type': seat.seat_type.value,
-                'is_vip_zone': seat.is_vip_zone,
-                'is_accessible': seat.is_accessible,
-                'is_quiet_zone': seat.is_quiet_zone,
-                'is_available': seat.is_available,
-                'passenger_id': seat.passenger_id,
-                'passenger_name': seat.passenger_name
-            }
+            layout[row][letter] = self._seat_info(seat)
         return layout
 
+    @staticmethod
+    def _seat_info(seat: Seat) -> Dict:
+        return {
+            'seat_class': seat.seat_class.value,
+            'seat_type': seat.seat_type.value,
+            'is_vip_zone': seat.is_vip_zone,
+            'is_accessible': seat.is_accessible,
+            'is_quiet_zone': seat.is_quiet_zone,
+            'is_available': seat.is_available,
+            'passenger_id': seat.passenger_id,
+            'passenger_name': seat.passenger_name
+        }
+
+    @staticmethod
+    def _seat_occupancy(info: Dict):
+        """A seat's item in the compact seat map"""
+        if info['passenger_id'] is not None:
+            return [info['passenger_id'], info['passenger_name']]
+        return 0 if info['is_available'] else 1
+
     def get_passenger_list(self):
         """Get list of all passengers with their details"""
-        passenger_list = []
+        # Copy the values first, other threads may add passengers meanwhile
+        return [self._passenger_info(passenger) for passenger in list(self.passengers.values())]
+
+    @staticmethod
+    def _passenger_info(passenger: Passenger) -> Dict:
+        return {
+            'id': passenger.id,
+            'name': passenger.name,
+            'age': passenger.age,
+            'type': passenger.passenger_type.value,
+            'group_id': passenger.group_id,
+            'assigned_seat': passenger.assigned_seat,
+            'is_vip': passenger.is_vip,
+            'has_accessibility_needs': passenger.has_accessibility_needs,
+            'is_senior': passenger.is_senior
+        }
+
+    def _publish(self):
+        """Publish a snapshot of the committed state for lock-free readers.
+
+        Only rows whose seats changed and passengers whose seat changed get
+        new dicts, everything else is shared with the previous snapshot.
+        Readers pick up ``self.snapshot`` with a single attribute read.
+
+        Only the cabins with dirty rows are locked, plus the queue lock, so
+        publishing after a first class booking does not wait for economy.
+        If a writer dirties another cabin meanwhile, the locks are retaken.
+        """
+        row_cabins = self.layout.row_cabins
+        with self.publish_lock:
+            while True:
+                cabins = {row_cabins[row] for row in set(self._dirty_rows)}
+                with self._cabins_held(cabins), self.queue_lock:
+                    dirty = set(self._dirty_rows)
+                    if not {row_cabins[row] for row in dirty} <= cabins:
+                        continue
+                    self._dirty_rows -= dirty
+                    previous = self.snapshot
+                    snapshot, changes = self._build_snapshot(dirty)
+                    if changes and previous.seating_layout:
+                        # Recorded before the snapshot is visible, readers of a version always find its changes.
+                        # The first seat map is not a change: readers from version 0 get it in full
+                        self.layout_changes.append((previous.layout_version, snapshot.layout_version, changes))
+                    self.snapshot = snapshot
+                    groups = {gid: tuple(m.id for m in g.members) for gid, g in self.groups.items()}
+                    if self.on_commit is not None:
+                        self.on_commit(self._delta(previous, dirty, groups))
+                    self._group_members = groups
+                    break
+            
+            # Outside the flight locks, but in publication order
+            self._emit_events(previous, snapshot, changes)
+
+    def _emit_events(self, previous: FlightSnapshot, snapshot: FlightSnapshot, changes: Tuple):
+        """Push a commit's seat and passenger changes to event subscribers"""
+        if not self.events.subscribers:
+            if changes or snapshot.passengers is not previous.passengers:
+                self.events.skip()
+            return
+        if changes:
+            seats = {}
+            for row, letter, info in changes:
+                seats.setdefault(row, {})[letter] = info
+            self.events.publish('seats', {'epoch': snapshot.layout_epoch, 'version': snapshot.layout_version,
+                                          'changes': seats})
+        
+        updated = [info for pid, info in snapshot.passengers.items() if previous.passengers.get(pid) is not info]
+        removed = [pid for pid in previous.passengers if pid not in snapshot.passengers]
+        if updated or removed or snapshot.waiting_list != previous.waiting_list:
+            self.events.publish('passengers', {'updated': updated, 'removed': removed,
+                                               'waiting_list': snapshot.waiting_list})
+
+    def _build_snapshot(self, dirty) -> Tuple[FlightSnapshot, Tuple]:
+        """Next snapshot and its seat changes, re-rendering the dirty rows
+        (their cabin locks and the queue lock held)"""
+        previous = self.snapshot
+        layout = dict(previous.seating_layout)
+        row_json = dict(previous.row_json)
+        row_occupancy = dict(previous.row_occupancy)
+        row_keys = self.layout.row_keys
+        changes = []
+        for row in sorted(dirty):
+            old_row = previous.seating_layout.get(row, {})
+            new_row = {letter: self._seat_info(self.seats[(row, letter)]) for _, letter in row_keys[row]}
+            if new_row != old_row:
+                # Rows marked dirty by a writer that changed nothing keep their dict
+                changes.extend((row, letter, info) for letter, info in new_row.items() if old_row.get(letter) != info)
+                layout[row] = new_row
+                # Serialized once here, responses only concatenate rows
+                row_json[row] = json.dumps(new_row, separators=(',', ':')).encode()
+                row_occupancy[row] = json.dumps([self._seat_occupancy(info) for info in new_row.values()],
+                                                separators=(',', ':'))[1:-1].encode()
+        if changes:
+            # Keep row order
+            layout = {row: layout[row] for row in row_keys}
+            row_json = {row: row_json[row] for row in row_keys}
+            row_occupancy = {row: row_occupancy[row] for row in row_keys}
+        
+        passengers = {}
+        bookings = {}
         for passenger in self.passengers.values():
-            passenger_info = {
-                'id': passenger.id,
-                'name': passenger.name,
-                'age': passenger.age,
-                'type': passenger.passenger_type.value,
-                'group_id': passenger.group_id,
-                'assigned_seat': passenger.assigned_seat,
-                'is_vip': passenger.is_vip,
-                'has_accessibility_needs': passenger.has_accessibility_needs,
-                'is_senior': passenger.is_senior
-            }
-            passenger_list.append(passenger_info)
-        return passenger_list
-
-# Global system instance
-seating_system = AircraftSeatingSystem()
-
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/api/seating-layout')
-def get_seating_layout():
+            info = previous.passengers.get(passenger.id)
+            if info is None or info['assigned_seat'] != passenger.assigned_seat:
+                info = self._passenger_info(passenger)
+            passengers[passenger.id] = info
+            bookings[passenger.id] = passenger.booking
+        
+        snapshot = FlightSnapshot(version=previous.version + 1, seating_layout=layout,
+                                  passengers=passengers, waiting_list=tuple(self.waiting_list),
+                                  layout_version=previous.layout_version + bool(changes),
+                                  layout_epoch=self._local_epoch if changes and self._local_epoch
+                                  else previous.layout_epoch,
+                                  row_json=row_json if changes else previous.row_json,
+                                  row_occupancy=row_occupancy if changes else previous.row_occupancy,
+                                  bookings=bookings, index_base=_latest_index(previous))
+        return snapshot, tuple(changes)
+
+    def layout_changes_since(self, since: int, epoch: Optional[str] = None) -> Dict:
+        """Seats changed after layout version `since`, merged per seat.
+
+        Falls back to the full seat map (``full`` set) when the version is
+        no longer in the change history, is from the future or belongs to
+        another epoch (a different flight object, e.g. after a restart, or
+        another worker's uncommitted seat map).
+        """
+        snapshot = self.snapshot
+        history = list(self.layout_changes)
+        current = snapshot.layout_version
+        response = {'epoch': snapshot.layout_epoch, 'version': current, 'full': False, 'changes': {}}
+        
+        oldest = history[0][0] if history else current
+        if (epoch not in (None, snapshot.layout_epoch) or since > current
+                or (since < current and oldest > since)):
+            response.update(full=True, changes=snapshot.seating_layout)
+            return response
+        
+        for _, version, changes in history:
+            if since < version <= current:
+                for row, letter, info in changes:
+                    response['changes'].setdefault(row, {})[letter] = info
+        return response
+
+    def label_layout(self, epoch: str, version: int):
+        """Give the current seat map a version shared by every worker.
+
+        Used with a shared store, while no writer is changing the flight:
+        `version` is the store version the flight is at, so workers holding
+        the same state serve the same ETags and change versions. Seat maps
+        published until the next call are this worker's own and get a
+        local epoch.
+        """
+        layout_version = version * LOCAL_LAYOUT_VERSIONS
+        with self.publish_lock:
+            snapshot = self.snapshot
+            base = self._labelled
+            if base is None or base.layout_epoch != epoch or base.layout_version > layout_version:
+                self.layout_changes.clear()  # Versions of another numbering
+            elif base.layout_version < layout_version:
+                # One entry from the last shared version, for readers of other workers
+                changes = []
+                for row, seats in snapshot.seating_layout.items():
+                    old_row = base.seating_layout.get(row, {})
+                    if seats is not old_row:
+                        changes.extend((row, letter, info) for letter, info in seats.items()
+                                       if old_row.get(letter) != info)
+                self.layout_changes.append((base.layout_version, layout_version, tuple(changes)))
+            self.snapshot = self._labelled = replace(snapshot, layout_epoch=epoch, layout_version=layout_version,
+                                                     index_base=_latest_index(snapshot))
+            self._local_epoch = f"{epoch}.{os.urandom(4).hex()}"
+
+    def _delta(self, previous: FlightSnapshot, dirty, groups: Dict[str, Tuple[str, ...]]) -> Dict:
+        """Changes since the previous snapshot, in to_state record formats.
+
+        Everything is recorded as absolute values (seats of the dirty rows,
+        whole passenger and group records, the full waiting list), so
+        applying a delta twice or to a newer state is harmless.
+        """
+        ordinals = self.layout.ordinals
+        current = self.snapshot.passengers
+        return {
+            'seats': [[ordinals[key], self.seats[key].is_available, self.seats[key].passenger_id]
+                      for row in sorted(dirty) for key in self.layout.row_keys[row]],
+            'passengers': [self._passenger_record(self.passengers[pid])
+                           for pid, info in current.items() if previous.passengers.get(pid) is not info],
+            'removed': [pid for pid in previous.passengers if pid not in current],
+            'groups': [self._group_record(self.groups[gid])
+                       for gid, members in groups.items() if self._group_members.get(gid) != members],
+            'removed_groups': [gid for gid in self._group_members if gid not in groups],
+            'waiting_list': list(self.snapshot.waiting_list),
+            'pending_passengers': list(self.pending_passengers),
+            'pending_groups': list(self.pending_groups),
+            'next_booking': self.next_booking
+        }
+
+    @_publishes
+    def apply_delta(self, delta: Dict):
+        """Apply a delta produced for on_commit, e.g. when replaying a journal"""
+        with self._exclusive():
+            keys = self.layout.keys
+            for pid in delta['removed']:
+                self.passengers.pop(pid, None)
+            for record in delta['passengers']:
+                known = self.passengers.get(record[0])
+                passenger = self._restore_passenger(record, known.booking if known else self.next_booking)
+                self.next_booking = max(self.next_booking, passenger.booking + 1)
+                self.passengers[passenger.id] = passenger
+            
+            for gid in delta['removed_groups']:
+                self.groups.pop(gid, None)
+            for record in delta['groups']:
+                group = self._restore_group(record)
+                self.groups[group.id] = group
+            # Unchanged groups must see replaced passenger objects too
+            for group in self.groups.values():
+                group.members = [self.passengers[m.id] for m in group.members if m.id in self.passengers]
+            
+            for ordinal, available, pid in delta['seats']:
+                row, letter = keys[ordinal]
+                seat = self.seats[(row, letter)]
+                passenger = self.passengers.get(pid) if pid else None
+                seat.is_available = available
+                seat.passenger_id = pid
+                seat.passenger_name = passenger.name if passenger else None
+                self._refresh_seat(row, letter)
+            
+            self.waiting_list = WaitingList()
+            for pid in delta['waiting_list']:
+                if pid in self.passengers:
+                    self.waiting_list.add(self.passengers[pid])
+            self.pending_passengers = dict.fromkeys(delta['pending_passengers'])
+            self.pending_groups = dict.fromkeys(delta['pending_groups'])
+            self.next_booking = max(self.next_booking, delta.get('next_booking', 0))
+
+    def _passenger_record(self, p: Passenger) -> List:
+        return [p.id, p.name, p.age, p.passenger_type.value, p.has_accessibility_needs,
+                p.is_vip, p.is_senior, p.group_id,
+                self.layout.ordinals[p.assigned_seat] if p.assigned_seat else None, p.booking]
+
+    def _restore_passenger(self, record: List, booking: int = 0) -> Passenger:
+        """Passenger of a record; `booking` is used for records written before
+        booking numbers were recorded"""
+        pid, name, age, passenger_type, accessibility, vip, senior, group_id, ordinal, *rest = record
+        return Passenger(id=pid, name=name, age=age, passenger_type=PassengerType(passenger_type),
+                         has_accessibility_needs=accessibility, is_vip=vip, is_senior=senior,
+                         group_id=group_id,
+                         assigned_seat=self.layout.keys[ordinal] if ordinal is not None else None,
+                         booking=rest[0] if rest else booking)
+
+    @staticmethod
+    def _group_record(g: Group) -> List:
+        return [g.id, g.name, g.size, g.has_children, g.has_accessibility_needs,
+                g.is_vip, g.has_senior_members, [m.id for m in g.members]]
+
+    def _restore_group(self, record: List) -> Group:
+        gid, name, size, children, accessibility, vip, senior, member_ids = record
+        return Group(id=gid, name=name, size=size, has_children=children,
+                     has_accessibility_needs=accessibility, is_vip=vip, has_senior_members=senior,
+                     members=[self.passengers[pid] for pid in member_ids if pid in self.passengers])
+
+    def to_state(self) -> Dict:
+        """Serializable state of the flight (plain lists and dicts)"""
+        with self._exclusive():
+            return self._state()
+
+    def _state(self) -> Dict:
+        """to_state with all flight locks held"""
+        ordinals = self.layout.ordinals
+        return {
+            'layout': self.layout.name,
+            'seat_backend': self.seat_backend,
+            'unavailable': [ordinals[key] for key, seat in self.seats.items() if not seat.is_available],
+            'passengers': [self._passenger_record(p) for p in self.passengers.values()],
+            'groups': [self._group_record(g) for g in self.groups.values()],
+            'waiting_list': list(self.waiting_list),
+            'pending_passengers': list(self.pending_passengers),
+            'pending_groups': list(self.pending_groups),
+            'next_booking': self.next_booking
+        }
+
+    @_publishes
+    def load_state(self, state: Dict):
+        """Replace the flight's bookings with a state produced by to_state"""
+        if state['layout'] != self.layout.name:
+            raise ValueError(f"State is for layout {state['layout']}, not {self.layout.name}")
+        
+        with self._exclusive():
+            self._load(state)
+
+    def _load(self, state: Dict):
+        """load_state with all flight locks held"""
+        self.initialize_aircraft()
+        keys = self.layout.keys
+        for ordinal in state['unavailable']:
+            self.seats[keys[ordinal]].is_available = False
+        
+        self.passengers = {}
+        for number, record in enumerate(state['passengers']):
+            passenger = self._restore_passenger(record, number)
+            if passenger.assigned_seat is not None:
+                seat = self.seats[passenger.assigned_seat]
+                seat.passenger_id = passenger.id
+                seat.passenger_name = passenger.name
+            self.passengers[passenger.id] = passenger
+        
+        self.groups = {}
+        for record in state['groups']:
+            group = self._restore_group(record)
+            self.groups[group.id] = group
+        
+        self.waiting_list = WaitingList()
+        for pid in state['waiting_list']:
+            self.waiting_list.add(self.passengers[pid])
+        self.pending_passengers = dict.fromkeys(state['pending_passengers'])
+        self.pending_groups = dict.fromkeys(state['pending_groups'])
+        self.next_booking = state.get('next_booking', len(state['passengers']))
+        self._build_indexes()
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'AircraftSeatingSystem':
+        """Rebuild a flight from to_state output"""
+        system = cls(seat_backend=state['seat_backend'], layout=state['layout'])
+        system.load_state(state)
+        return system
+
+    def memory_structures(self) -> Dict[str, object]:
+        """The flight's structures by name, for memory accounting. Objects
+        shared by several of them count towards the first."""
+        return {
+            'seats': self.seats,
+            'passengers': self.passengers,
+            'groups': self.groups,
+            'waiting_list': self.waiting_list,
+            'pending': (self.pending_passengers, self.pending_groups),
+            'indexes': (self.index, self.run_index, self.seat_versions),
+            # Published snapshot with its serialized rows and passenger index
+            'snapshot': self.snapshot,
+            'layout_changes': self.layout_changes,
+            'events': self.events,
+        }
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes used by each structure of this flight, excluding the shared layout template"""
+        return structure_sizes(self.memory_structures(), _template_ids(self.layout))
+
+    def estimated_size(self) -> int:
+        """Rough resident size of the flight in bytes, used for memory budgets"""
+        seat_bytes = (SEAT_BYTES_ESTIMATE[self.seat_backend] + SNAPSHOT_SEAT_BYTES_ESTIMATE) * len(self.layout.keys)
+        row_bytes = SNAPSHOT_ROW_BYTES_ESTIMATE * len(self.layout.row_keys)
+        change_bytes = CHANGE_BYTES_ESTIMATE * sum(len(changes) for _, _, changes in list(self.layout_changes))
+        return (FLIGHT_OVERHEAD_ESTIMATE + seat_bytes + row_bytes + change_bytes
+                + PASSENGER_BYTES_ESTIMATE * len(self.passengers))
+
+class SharedFlightStore:
+    """Authoritative flight state shared by every worker process.
+
+    Each flight is one row of a SQLite database in WAL mode holding the
+    ``to_state`` JSON and a version number bumped on every write. Readers
+    compare versions to detect that another worker changed a flight; writers
+    change their cached copy without any database lock and commit with
+    ``compare_and_save``, which only succeeds if nobody wrote the flight
+    since the version they started from. The database write lock is held
+    for that single statement.
+    Connections are opened lazily per process and thread, a connection
+    inherited across ``fork`` is never reused.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS flights '
+                         '(flight_id TEXT PRIMARY KEY, version INTEGER NOT NULL, state TEXT NOT NULL)')
+            # Tells this database apart from one recreated at the same path
+            conn.execute('CREATE TABLE IF NOT EXISTS store (id TEXT NOT NULL)')
+            conn.execute('INSERT INTO store (id) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM store)',
+                         (os.urandom(6).hex(),))
+            local.conn, local.pid, local.depth = conn, os.getpid(), 0
+        return local.conn
+
+    @functools.cached_property
+    def id(self) -> str:
+        """Random ID given to the database when it was created"""
+        return self._connection().execute('SELECT id FROM store').fetchone()[0]
+
+    @contextmanager
+    def transaction(self):
+        """Hold the database write lock; nested calls join the outer transaction"""
+        conn = self._connection()
+        local = self._local
+        if local.depth == 0:
+            conn.execute('BEGIN IMMEDIATE')
+        local.depth += 1
+        try:
+            yield
+        except BaseException:
+            local.depth -= 1
+            if local.depth == 0:
+                conn.execute('ROLLBACK')
+            raise
+        local.depth -= 1
+        if local.depth == 0:
+            conn.execute('COMMIT')
+
+    def version(self, flight_id: str) -> Optional[int]:
+        """Current version of a flight, None if it was never saved"""
+        row = self._connection().execute('SELECT version FROM flights WHERE flight_id = ?',
+                                         (flight_id,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, flight_id: str) -> Optional[Tuple[int, Dict]]:
+        """Return (version, state) of a flight, None if it was never saved"""
+        row = self._connection().execute('SELECT version, state FROM flights WHERE flight_id = ?',
+                                         (flight_id,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def save(self, flight_id: str, state: Dict) -> int:
+        """Store a new state for a flight and return its new version"""
+        with self.transaction():
+            version = (self.version(flight_id) or 0) + 1
+            self._connection().execute('INSERT OR REPLACE INTO flights (flight_id, version, state) '
+                                       'VALUES (?, ?, ?)', (flight_id, version, json.dumps(state)))
+        return version
+
+    def compare_and_save(self, flight_id: str, expected: Optional[int], state: Dict) -> Optional[int]:
+        """Store a new state if the flight is still at version `expected`.
+
+        Returns the new version once it is committed, or None when another
+        writer changed the flight first.
+        """
+        if expected is None:
+            return None
+        data = json.dumps(state)
+        cursor = self._connection().execute('UPDATE flights SET version = ?, state = ? '
+                                            'WHERE flight_id = ? AND version = ?',
+                                            (expected + 1, data, flight_id, expected))
+        return expected + 1 if cursor.rowcount == 1 else None
+
+class FlightStateFile:
+    """Binary file of flight states, memory-mapped and decoded one flight at a time.
+
+    Layout: magic, flight count, then an index of (flight ID, offset, length,
+    shared store version or -1) entries and the states themselves, each
+    encoded with ``marshal``. Opening
+    the file only parses the index, so a process can start serving before
+    any flight is decoded. marshal output is only guaranteed to be readable
+    by the same Python version, which holds for a hand-off between workers
+    of one deployment.
+    """
+
+    MAGIC = b'SEATSTA2'
+    HEADER = struct.Struct('<8sI')
+    ENTRY = struct.Struct('<HQIq')
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"Not a flight state file: {path}")
+        
+        self.index: Dict[str, Tuple[int, int]] = {}
+        # Shared store version each state was taken at, for the flights that had one
+        self.versions: Dict[str, int] = {}
+        position = self.HEADER.size
+        for _ in range(count):
+            id_length, offset, length, version = self.ENTRY.unpack_from(self._map, position)
+            position += self.ENTRY.size
+            flight_id = self._map[position:position + id_length].decode()
+            position += id_length
+            self.index[flight_id] = (offset, length)
+            if version >= 0:
+                self.versions[flight_id] = version
+
+    @classmethod
+    def write(cls, path: str, states: Dict[str, Dict], versions: Optional[Dict[str, int]] = None):
+        """Write states atomically (temporary file, fsync, rename)"""
+        versions = versions or {}
+        payloads = {flight_id: marshal.dumps(state) for flight_id, state in states.items()}
+        ids = {flight_id: flight_id.encode() for flight_id in payloads}
+        offset = cls.HEADER.size + sum(cls.ENTRY.size + len(encoded) for encoded in ids.values())
+        
+        with open(path + '.tmp', 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(payloads)))
+            for flight_id, payload in payloads.items():
+                f.write(cls.ENTRY.pack(len(ids[flight_id]), offset, len(payload), versions.get(flight_id, -1)))
+                f.write(ids[flight_id])
+                offset += len(payload)
+            for payload in payloads.values():
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def __contains__(self, flight_id) -> bool:
+        return flight_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def load(self, flight_id: str) -> Dict:
+        """Decode the state of one flight"""
+        offset, length = self.index[flight_id]
+        return marshal.loads(self._map[offset:offset + length])
+
+    def close(self):
+        self._map.close()
+
+class CommitGate:
+    """One worker's writers of one cached flight, committed to the shared store in groups.
+
+    Writers change the cached flight concurrently, under the flight's own
+    locks. A finished writer waits in ``waiting`` for a commit that covers
+    it. One of the waiting writers closes the gate to new writers, waits
+    for the running ones and saves the flight's state in a single
+    compare-and-swap, which covers every writer that finished before it.
+    If another worker wrote the flight first, or a writer failed halfway
+    (``dirty``), the cache is reloaded instead and the covered writers run
+    again. The cache is only reloaded while the gate is not busy.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.running = 0
+        # Set while a writer reloads, saves or commits: other writers wait
+        self.closed = False
+        # One [outcome] cell per finished writer, outcome None until a commit decides it
+        self.waiting: List[list] = []
+        self.dirty = False
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.running or self.closed or self.waiting or self.dirty)
+
+class FlightRegistry:
+    """Flights keyed by flight ID, created on first access.
+
+    Resident flights are kept in least-recently-used order. When their
+    estimated size (calibrated against measured sizes by ``memory_usage``
+    and every ``SIZE_SAMPLE_ACCESSES`` accesses) exceeds the memory budget,
+    the coldest flights are written to ``spill_dir`` as JSON and dropped
+    from memory; the next access reloads them transparently. Pinned flights, flights held by ``mutate``
+    and flights with event subscribers are never evicted. Spill files are
+    written after the registry lock is released, so a flight busy with a
+    long batch does not hold up access to the others.
+
+    With a ``store`` the resident flights are caches of the shared state:
+    every access reloads a flight another worker has changed (unless
+    writers of this worker are using the cached copy), mutations go through
+    ``mutate`` and are committed optimistically (see ``CommitGate``), and
+    eviction simply drops the cached copy.
+
+    With a ``journal`` (single process deployments) every committed change of
+    a flight is journaled; ``mutate`` waits for the group commit and
+    compacts the journal into a snapshot when it has grown. On startup the
+    snapshot and journal tail are read into memory but flights are only
+    rebuilt on their first access, so recovery time does not grow with the
+    number of flights.
+    """
+
+    def __init__(self, factory=AircraftSeatingSystem, memory_budget: int = 256 * 1024 * 1024,
+                 spill_dir: Optional[str] = None, pinned: Tuple[str, ...] = (),
+                 store: Optional[SharedFlightStore] = None, journal: Optional[Journal] = None):
+        self.factory = factory
+        self.store = store
+        self.journal = journal
+        # Recovered flights not rebuilt yet: flight_id -> (state, deltas to replay)
+        self.recovered: Dict[str, Tuple[Dict, List[Dict]]] = {}
+        # Flights handed over by a retiring worker, decoded on first access
+        self.handoff: Optional[FlightStateFile] = None
+        self._checkpoint_lock = threading.Lock()
+        # Guards the resident set, flights themselves have their own locks
+        self.lock = threading.RLock()
+        self.versions: Dict[str, Optional[int]] = {}
+        # Kept when a flight is evicted: a writer may be about to use its gate
+        self.gates: Dict[str, CommitGate] = {}
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), 'seating-flights')
+        self.pinned = set(pinned)
+        # Flights held by mutate calls: flight_id -> number of calls
+        self.in_use: Dict[str, int] = {}
+        # Evicted flights whose spill file is not written yet: flight_id -> (flight_id, system).
+        # An access meanwhile takes the flight back; the tuple identifies one eviction
+        self.spilling: Dict[str, Tuple[str, AircraftSeatingSystem]] = {}
+        # Serializes spill file writes, taken before (never while holding) the registry lock
+        self._spill_lock = threading.Lock()
+        self.flights: 'OrderedDict[str, AircraftSeatingSystem]' = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.resident_bytes = 0
+        # Measured over estimated size of the last flights measured, applied to every estimate
+        self.size_scale = 1.0
+        self.accesses = 0
+        if journal is not None:
+            self._recover()
+
+    def _recover(self):
+        """Read the journal's snapshot and tail, superseding any spilled flights"""
+        states, records = self.journal.recover()
+        self.recovered = {flight_id: (state, []) for flight_id, state in (states or {}).items()}
+        for record in records:
+            if 'state' in record:
+                self.recovered[record['flight']] = (record['state'], [])
+            elif record['flight'] in self.recovered:
+                self.recovered[record['flight']][1].append(record['delta'])
+        
+        # Spill files of the previous run may be older than the journal
+        if os.path.isdir(self.spill_dir):
+            for name in os.listdir(self.spill_dir):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.spill_dir, name))
+
+    def _spill_path(self, flight_id: str) -> str:
+        if not FLIGHT_ID_PATTERN.fullmatch(flight_id):
+            raise ValueError(f"Invalid flight ID: {flight_id}")
+        return os.path.join(self.spill_dir, f"{flight_id}.json")
+
+    def get(self, flight_id: str) -> AircraftSeatingSystem:
+        """Return a flight, reloading or creating it if it is not resident"""
+        return self._get(flight_id)
+
+    def _get(self, flight_id: str, hold: bool = False, sync: Optional[bool] = None) -> AircraftSeatingSystem:
+        """get, also counting the flight as in use when `hold` is set. `sync`
+        is passed on to _sync"""
+        if self.store is not None:
+            # Publish outside the registry lock, the store's write lock is always taken first
+            self._spill_path(flight_id)  # Validate the ID
+            self._publish_new(flight_id)
+        
+        with self.lock:
+            system = self.flights.get(flight_id)
+            if self.store is not None:
+                system = self._sync(flight_id, system, sync)
+                self.flights[flight_id] = system
+                self.flights.move_to_end(flight_id)
+            elif system is not None:
+                self.flights.move_to_end(flight_id)
+            else:
+                path = self._spill_path(flight_id)
+                if flight_id in self.spilling:
+                    # Evicted, but its spill file is not written yet
+                    system = self.spilling.pop(flight_id)[1]
+                elif self.handoff is not None and flight_id in self.handoff:
+                    state = self.handoff.load(flight_id)
+                    del self.handoff.index[flight_id]
+                    system = AircraftSeatingSystem.from_state(state)
+                    if self.journal is not None:
+                        self.journal.append({'flight': flight_id, 'state': state})
+                elif flight_id in self.recovered:
+                    system = self._rebuild(*self.recovered.pop(flight_id))
+                elif os.path.exists(path):
+                    with open(path) as f:
+                        system = AircraftSeatingSystem.from_state(json.load(f))
+                    os.remove(path)
+                else:
+                    system = self.factory()
+                    if self.journal is not None:
+                        self.journal.append({'flight': flight_id, 'state': system.to_state()})
+                if self.journal is not None:
+                    system.on_commit = functools.partial(self._journal_delta, flight_id)
+                self.flights[flight_id] = system
+        
+            # Re-estimate on every access, bookings change a flight's size
+            size = int(system.estimated_size() * self.size_scale)
+            self.resident_bytes += size - self.sizes.get(flight_id, 0)
+            self.sizes[flight_id] = size
+            if hold:
+                self.in_use[flight_id] = self.in_use.get(flight_id, 0) + 1
+            victims = self._enforce_budget()
+            self.accesses += 1
+            sample = self.accesses % SIZE_SAMPLE_ACCESSES == 0
+        self._spill(victims)
+        if sample:
+            self._calibrate({flight_id: system}, {flight_id: system.memory_usage()['total']})
+        return system
+
+    def _release(self, flight_id: str):
+        """End a hold taken by _get"""
+        with self.lock:
+            count = self.in_use[flight_id] - 1
+            if count:
+                self.in_use[flight_id] = count
+            else:
+                del self.in_use[flight_id]
+
+    def _publish_new(self, flight_id: str):
+        """First access by any worker: create the flight unless another worker wins the race"""
+        if self.store.version(flight_id) is not None:
+            return
+        system = self.factory()
+        with self.store.transaction():
+            if self.store.version(flight_id) is None:
+                self.store.save(flight_id, system.to_state())
+
+    def _sync(self, flight_id: str, system: Optional[AircraftSeatingSystem],
+              sync: Optional[bool] = None) -> AircraftSeatingSystem:
+        """Bring a cached flight up to the shared store's version (registry lock held).
+
+        With `sync` None the cached copy is left alone while this worker's
+        writers use it, their commit reloads it if it is stale; True reloads
+        a stale copy anyway (the caller closed the gate), False never does.
+        """
+        if system is not None:
+            if sync is False:
+                return system
+            gate = self.gates.get(flight_id)
+            if sync is None and gate is not None:
+                with gate.cond:
+                    if gate.busy:
+                        return system
+        version = self.store.version(flight_id)
+        if system is None and self.handoff is not None and flight_id in self.handoff:
+            # Handed over by a retiring worker: decode it unless it changed since
+            if self.handoff.versions.get(flight_id) == version:
+                system = AircraftSeatingSystem.from_state(self.handoff.load(flight_id))
+                self._label(flight_id, system, version)
+            del self.handoff.index[flight_id]
+        if system is None or version != self.versions.get(flight_id):
+            version, state = self.store.load(flight_id)
+            if system is None:
+                system = AircraftSeatingSystem.from_state(state)
+            else:
+                system.load_state(state)
+            self._label(flight_id, system, version)
+        return system
+
+    def _label(self, flight_id: str, system: AircraftSeatingSystem, version: int):
+        """Record the store version a cached flight is at, and label its seat
+        map with it so every worker serves the same ETags"""
+        self.versions[flight_id] = version
+        system.label_layout(f"{self.store.id}-{flight_id}", version)
+
+    @staticmethod
+    def _rebuild(state: Dict, deltas: List[Dict]) -> AircraftSeatingSystem:
+        system = AircraftSeatingSystem.from_state(state)
+        for delta in deltas:
+            system.apply_delta(delta)
+        return system
+
+    def _journal_delta(self, flight_id: str, delta: Dict):
+        self.journal.append({'flight': flight_id, 'delta': delta})
+
+    def checkpoint(self) -> int:
+        """Compact the journal into a snapshot of every flight"""
+        return self.journal.checkpoint(self.collect_states)
+
+    def collect_states(self) -> Dict[str, Dict]:
+        """State of every flight, wherever it currently lives.
+
+        Where each flight lives is read under the registry lock, so none
+        moves between memory, spill files and the recovered set meanwhile.
+        The states of flight objects are taken after the lock is released:
+        a flight busy with a long batch delays this call, not access to
+        other flights. A change committed meanwhile may be missing, the
+        journal has it in a later segment.
+        """
+        with self.lock:
+            states = {}
+            if self.handoff is not None:
+                for flight_id in self.handoff.index:
+                    states[flight_id] = self.handoff.load(flight_id)
+            recovered = list(self.recovered.items())
+            if os.path.isdir(self.spill_dir):
+                for name in os.listdir(self.spill_dir):
+                    if name.endswith('.json'):
+                        with open(os.path.join(self.spill_dir, name)) as f:
+                            states[name[:-len('.json')]] = json.load(f)
+            systems = list(self.spilling.values()) + list(self.flights.items())
+        
+        for flight_id, (state, deltas) in recovered:
+            states[flight_id] = self._rebuild(state, deltas).to_state() if deltas else state
+        states.update((flight_id, system.to_state()) for flight_id, system in systems)
+        return states
+
+    def hand_off(self, directory: str) -> str:
+        """Write every flight to a state file for the worker replacing this one
+        and return its path.
+
+        With a shared store only the cached flights are written, each with
+        the store version it was read at: the replacement warms its cache
+        from the file and only reads the store for flights changed since.
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"handoff-{os.getpid()}.bin")
+        if self.store is None:
+            FlightStateFile.write(path, self.collect_states())
+            return path
+        
+        with self.lock:
+            cached = []
+            for flight_id, system in self.flights.items():
+                gate = self.gates.get(flight_id)
+                if gate is not None:
+                    with gate.cond:
+                        if gate.busy:
+                            continue  # May hold changes that are not committed
+                cached.append((flight_id, system, self.versions[flight_id]))
+        FlightStateFile.write(path, {flight_id: system.to_state() for flight_id, system, _ in cached},
+                              {flight_id: version for flight_id, _, version in cached})
+        return path
+
+    def take_over(self, directory: str) -> bool:
+        """Serve flights from the oldest unclaimed hand-off file, if there is one.
+
+        The file is claimed by renaming it, so two new workers never take
+        the same hand-off. Flights in it replace whatever this process built
+        before (e.g. the default flight created before the fork) and are
+        decoded from the mapping on first access; with a shared store, only
+        while the store still has the version they were handed over at.
+        """
+        if not os.path.isdir(directory):
+            return False
+        candidates = sorted((os.path.join(directory, name) for name in os.listdir(directory)
+                             if name.startswith('handoff-') and name.endswith('.bin')), key=os.path.getmtime)
+        for path in candidates:
+            claimed = os.path.join(directory, f"claimed-{os.getpid()}.bin")
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # Another worker was faster
+            handoff = FlightStateFile(claimed)
+            os.remove(claimed)  # The mapping stays valid
+            with self.lock:
+                for flight_id in handoff.index:
+                    self._forget(flight_id)
+                    self.recovered.pop(flight_id, None)
+                self.handoff = handoff
+            return True
+        return False
+
+    def mutate(self, flight_id: str, change: Callable[[AircraftSeatingSystem], object]):
+        """Call `change` with a flight, publish what it changed and return its result.
+
+        Without a store, `change` runs once on the resident flight, followed
+        by waiting for the journal's group commit when there is a journal.
+        With one, it runs on the cached copy without holding the database
+        lock and is committed with the other writers of this worker that
+        finished meanwhile. If another worker committed first, `change` runs
+        again on the reloaded flight, so it must only act on the flight. If
+        it raises, nothing it did is saved.
+        """
+        if self.store is None:
+            system = self._get(flight_id, hold=True)
+            try:
+                result = change(system)
+            finally:
+                self._release(flight_id)
+            if self.journal is not None:
+                self.journal.sync()
+                if self.journal.needs_checkpoint and self._checkpoint_lock.acquire(blocking=False):
+                    try:
+                        self.checkpoint()
+                    finally:
+                        self._checkpoint_lock.release()
+            return result
+        
+        self._spill_path(flight_id)  # Validate the ID
+        with self.lock:
+            gate = self.gates.setdefault(flight_id, CommitGate())
+        while True:
+            with gate.cond:
+                while gate.closed:
+                    gate.cond.wait()
+                # The first writer brings the cache up to date, the others join it
+                first = not gate.busy
+                if first:
+                    gate.closed = True
+                else:
+                    gate.running += 1
+            try:
+                system = self._get(flight_id, hold=True, sync=first)
+            except BaseException:
+                with gate.cond:
+                    if first:
+                        gate.closed = False
+                    else:
+                        gate.running -= 1
+                    gate.cond.notify_all()
+                raise
+            if first:
+                with gate.cond:
+                    gate.closed = False
+                    gate.running += 1
+                    gate.cond.notify_all()
+            
+            try:
+                try:
+                    result = change(system)
+                except BaseException:
+                    self._finish(flight_id, gate, system, failed=True)
+                    raise
+                if self._finish(flight_id, gate, system):
+                    return result
+            finally:
+                self._release(flight_id)
+
+    def _finish(self, flight_id: str, gate: CommitGate, system: AircraftSeatingSystem, failed: bool = False) -> bool:
+        """End a writer: True once a commit saved its change, False when the
+        cache was reloaded without it (after a conflict, or because it failed)"""
+        cell = [None]
+        with gate.cond:
+            gate.running -= 1
+            if failed:
+                gate.dirty = True
+            else:
+                gate.waiting.append(cell)
+            gate.cond.notify_all()
+        
+        while True:
+            with gate.cond:
+                while True:
+                    if cell[0] is not None:
+                        return cell[0]
+                    if failed and not gate.dirty:
+                        return False  # Another writer reloaded the cache
+                    if not gate.closed:
+                        break
+                    gate.cond.wait()
+                # Lead a commit: no new writers, wait for the running ones
+                gate.closed = True
+                while gate.running:
+                    gate.cond.wait()
+                cells, gate.waiting = gate.waiting, []
+                discard, gate.dirty = gate.dirty, False
+            
+            saved = False
+            try:
+                if not discard:
+                    version = self.store.compare_and_save(flight_id, self.versions.get(flight_id), system.to_state())
+                    saved = version is not None
+                with self.lock:
+                    if not saved:
+                        version, state = self.store.load(flight_id)
+                        system.load_state(state)
+                    self._label(flight_id, system, version)
+            except BaseException:
+                with gate.cond:
+                    gate.dirty = True
+                raise
+            finally:
+                with gate.cond:
+                    for waiter in cells:
+                        waiter[0] = saved
+                    gate.closed = False
+                    gate.cond.notify_all()
+
+    def _forget(self, flight_id: str) -> Optional[AircraftSeatingSystem]:
+        """Drop a flight from memory without saving it"""
+        self.resident_bytes -= self.sizes.pop(flight_id, 0)
+        self.versions.pop(flight_id, None)
+        return self.flights.pop(flight_id, None)
+
+    def evict(self, flight_id: str) -> bool:
+        """Write a resident flight to disk and drop it from memory, unless it is in use"""
+        with self.lock:
+            if not self._evictable(flight_id):
+                return False
+            victims = self._evict(flight_id)
+        self._spill(victims)
+        return True
+
+    def _evictable(self, flight_id: str) -> bool:
+        system = self.flights.get(flight_id)
+        if (system is None or flight_id in self.pinned or self.in_use.get(flight_id)
+                or system.events.subscribers):
+            return False
+        # A flight in the middle of a batch is in use too, and spilling it would wait for the batch
+        if not system.lock.acquire(blocking=False):
+            return False
+        system.lock.release()
+        return True
+
+    def _evict(self, flight_id: str) -> List[Tuple[str, AircraftSeatingSystem]]:
+        """Drop a flight from memory (registry lock held) and return what
+        _spill must write once the lock is released"""
+        system = self._forget(flight_id)
+        if self.store is not None:
+            return []  # The shared store already holds the flight
+        entry = self.spilling[flight_id] = (flight_id, system)
+        return [entry]
+
+    def _spill(self, victims: List[Tuple[str, AircraftSeatingSystem]]):
+        """Write evicted flights to their spill files (registry lock not held)"""
+        for entry in victims:
+            flight_id, system = entry
+            path = self._spill_path(flight_id)
+            with self._spill_lock:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                with open(path + '.tmp', 'w') as f:
+                    json.dump(system.to_state(), f)
+                os.replace(path + '.tmp', path)
+                with self.lock:
+                    if self.spilling.get(flight_id) is entry:
+                        del self.spilling[flight_id]
+                    elif flight_id not in self.spilling:
+                        # Taken back while the file was written, the resident flight is newer
+                        os.remove(path)
+
+    def _enforce_budget(self) -> List[Tuple[str, AircraftSeatingSystem]]:
+        """Evict least recently used flights until the budget is met; returns
+        the spill files to write"""
+        victims = []
+        if self.resident_bytes <= self.memory_budget:
+            return victims
+        # The most recently used flight is never evicted by its own access
+        for flight_id in list(self.flights)[:-1]:
+            if self.resident_bytes <= self.memory_budget:
+                break
+            if self._evictable(flight_id):
+                victims.extend(self._evict(flight_id))
+        return victims
+
+    def memory_usage(self, flight_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+        """Bytes per structure of the resident flights (or the given ones
+        that are resident), plus the registry's own bookkeeping. The measured
+        totals also calibrate the registry's size estimates"""
+        flights = list(self.flights.items())
+        if flight_ids is not None:
+            wanted = set(flight_ids)
+            flights = [(flight_id, flight) for flight_id, flight in flights if flight_id in wanted]
+        usage = {flight_id: flight.memory_usage() for flight_id, flight in flights}
+        self._calibrate(dict(flights), {flight_id: usage[flight_id]['total'] for flight_id, _ in flights})
+        usage['(registry)'] = structure_sizes({
+            'recovered': self.recovered,
+            'versions': self.versions,
+            'gates': self.gates,
+            'sizes': self.sizes,
+        })
+        return usage
+
+    def _calibrate(self, flights: Dict[str, AircraftSeatingSystem], measured: Dict[str, int]):
+        """Feed measured flight sizes into the budget: they replace the
+        estimates of the measured flights, and their ratio to the estimates
+        scales every later estimate"""
+        estimated = sum(flight.estimated_size() for flight in flights.values())
+        with self.lock:
+            if estimated:
+                self.size_scale = sum(measured.values()) / estimated
+            for flight_id, flight in flights.items():
+                if self.flights.get(flight_id) is flight:
+                    self.resident_bytes += measured[flight_id] - self.sizes[flight_id]
+                    self.sizes[flight_id] = measured[flight_id]
+            victims = self._enforce_budget()
+        self._spill(victims)
+
+    def exists(self, flight_id: str) -> bool:
+        """Whether a flight was ever created, checked without creating or loading it"""
+        if not FLIGHT_ID_PATTERN.fullmatch(flight_id):
+            return False
+        with self.lock:
+            if (flight_id in self.flights or flight_id in self.spilling or flight_id in self.recovered
+                    or (self.handoff is not None and flight_id in self.handoff)):
+                return True
+            if self.store is None:
+                return os.path.exists(self._spill_path(flight_id))
+        return self.store.version(flight_id) is not None
+
+    def snapshots(self, flight_ids: Iterable[str]) -> Iterator[Tuple[str, FlightSnapshot]]:
+        """Latest snapshot of each flight, fetched only when the consumer gets to it"""
+        for flight_id in flight_ids:
+            yield flight_id, self.get(flight_id).snapshot
+
+    def __contains__(self, flight_id) -> bool:
+        return flight_id in self.flights
+
+    def __len__(self) -> int:
+        return len(self.flights)
+
+def export_manifest(flights: Iterable[Tuple[str, FlightSnapshot]], fields: Optional[Iterable[str]] = None,
+                    body_format: str = 'ndjson', compress: bool = False) -> Iterator[bytes]:
+    """Stream the passengers of several flights as NDJSON or CSV.
+
+    ``flights`` yields (flight_id, snapshot) pairs, e.g. from
+    ``FlightRegistry.snapshots``, and is consumed one flight at a time, so
+    memory stays bounded by one flight and one output chunk however many
+    flights are exported. ``fields`` picks and orders the columns (default
+    EXPORT_FIELDS). With ``compress`` the output is one gzip stream.
+    Arguments are checked before the first chunk is produced.
+    """
+    fields = tuple(fields or EXPORT_FIELDS)
+    unknown = [name for name in fields if name not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+    if body_format not in ('ndjson', 'csv'):
+        raise ValueError(f"Unknown export format: {body_format}")
+    return _manifest_chunks(flights, fields, body_format, compress)
+
+def _manifest_chunks(flights, fields: Tuple[str, ...], body_format: str, compress: bool) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip header
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if body_format == 'csv':
+        writer.writerow(fields)
+    
+    def take() -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor is not None:
+            # Sync flush: every chunk can be decompressed as soon as it arrives
+            data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data
+    
+    for flight_id, snapshot in flights:
+        for info in snapshot.passengers.values():
+            if body_format == 'csv':
+                seat = info['assigned_seat']
+                values = {'flight_id': flight_id, **info, 'assigned_seat': f"{seat[0]}{seat[1]}" if seat else None}
+                writer.writerow([values[name] for name in fields])
+            else:
+                values = {'flight_id': flight_id, **info}
+                buffer.write(json.dumps({name: values[name] for name in fields}, separators=(',', ':')))
+                buffer.write('\n')
+            if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                yield take()
+    
+    data = take()
+    if compressor is not None:
+        data += compressor.flush()
+    if data:
+        yield data
+
+class FlightIdConverter(BaseConverter):
+    """URL converter restricting flight IDs to safe file names"""
+    regex = FLIGHT_ID_PATTERN.pattern
+
+app.url_map.converters['flight'] = FlightIdConverter
+
+def create_flight() -> AircraftSeatingSystem:
+    """Create a new flight with the deployment's configured backend and layout"""
+    return AircraftSeatingSystem(seat_backend=os.environ.get('SEATING_SEAT_BACKEND', 'dict'),
+                                 layout=os.environ.get('SEATING_LAYOUT', 'default'))
+
+# Global flight registry, the default flight backs the unprefixed /api routes
+flight_registry = FlightRegistry(
+    factory=create_flight,
+    memory_budget=int(os.environ.get('SEATING_MEMORY_BUDGET_MB', 256)) * 1024 * 1024,
+    spill_dir=os.environ.get('SEATING_SPILL_DIR'),
+    pinned=(DEFAULT_FLIGHT_ID,),
+    store=SharedFlightStore(os.environ['SEATING_SHARED_STATE']) if os.environ.get('SEATING_SHARED_STATE') else None,
+    journal=Journal(os.environ['SEATING_JOURNAL_DIR']) if os.environ.get('SEATING_JOURNAL_DIR') else None
+)
+seating_system = flight_registry.get(DEFAULT_FLIGHT_ID)
+
+# Read at scrape time from the published snapshots of the flights in memory
+Gauge('seating_flights_resident', 'Flights held in memory by this worker', lambda: len(flight_registry))
+Gauge('seating_waiting_list_size', 'Passengers on the waiting lists of the flights in memory',
+      lambda: sum(len(flight.snapshot.waiting_list) for flight in list(flight_registry.flights.values())))
+
+# Open event streams of this worker, across all flights
+event_streams = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+# Armed through /api/admin/profile or SIGUSR2 (see gunicorn_config.py)
+profiler = Profiler(os.environ.get('SEATING_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'seating-profiles')))
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profile = profiler.request_started()
+
+@app.teardown_request
+def _finish_request_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.request_finished(profile)
+
+@app.after_request
+def _record_request_time(response):
+    start = g.get('request_start')
+    if start is not None:
+        # The route pattern, not the path, keeps one series per endpoint
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - start, (request.method, route, str(response.status_code)))
+    return response
+
+@app.route('/health')
+def health():
+    # Answered without touching any flight, so a busy flight never fails the check
+    return jsonify({'status': 'ok'})
+
+@app.route('/metrics')
+def metrics():
+    return app.response_class(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+def _admin_authorized() -> bool:
+    """Whether the request carries the admin token; admin routes are off without one configured"""
+    token = os.environ.get('SEATING_ADMIN_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+memory_tracker = MemoryTracker()
+
+@app.route('/api/admin/memory')
+def admin_memory():
+    if not _admin_authorized():
+        return jsonify({'success': False, 'error': 'Admin token required'}), 403
+    try:
+        flight_ids = [f.strip() for f in request.args['flights'].split(',')] if request.args.get('flights') else None
+        usage = flight_registry.memory_usage(flight_ids)
+        return jsonify(memory_tracker.report(usage, diff=_flag(request.args.get('diff', False))))
+    except Exception as e:
+        print(f"Error in admin_memory: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/memory/baseline', methods=['POST', 'DELETE'])
+def admin_memory_baseline():
+    if not _admin_authorized():
+        return jsonify({'success': False, 'error': 'Admin token required'}), 403
+    try:
+        if request.method == 'DELETE':
+            memory_tracker.clear_baseline()
+        else:
+            # Also starts tracemalloc, which slows allocations down until the baseline is deleted
+            memory_tracker.set_baseline(flight_registry.memory_usage())
+        return jsonify({'success': True})
+    except Exception as e:
+        print(f"Error in admin_memory_baseline: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    if not _admin_authorized():
+        return jsonify({'success': False, 'error': 'Admin token required'}), 403
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            try:
+                capture = profiler.start(mode=data.get('mode', 'sample'),
+                                         seconds=float(data['seconds']) if data.get('seconds') is not None else None,
+                                         requests=int(data['requests']) if data.get('requests') is not None else None)
+            except (ValueError, TypeError) as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            except RuntimeError as e:
+                return jsonify({'success': False, 'error': str(e)}), 409
+            return jsonify({'success': True, 'capture': capture.describe()}), 202
+        if request.method == 'DELETE':
+            return jsonify({'success': True, 'path': profiler.stop()})
+        capture = profiler.capture
+        return jsonify({'capture': capture.describe() if capture is not None else None,
+                        'last_path': profiler.last_path})
+    except Exception as e:
+        print(f"Error in admin_profile: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/', defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/flights/<flight:flight_id>')
+def index(flight_id):
+    api_base = '/api' if flight_id == DEFAULT_FLIGHT_ID else f'/api/flights/{flight_id}'
+    return render_template('index.html', api_base=api_base)
+
+@app.route('/api/aircraft-layout', defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/aircraft-layout')
+def get_aircraft_layout(flight_id):
+    try:
+        seating_system = flight_registry.get(flight_id)
+        return jsonify(seating_system.layout.describe())
+    except Exception as e:
+        print(f"Error in get_aircraft_layout: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/seating-layout', defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/seating-layout')
+def get_seating_layout(flight_id):
     try:
-        layout = seating_system.get_seating_layout()
-        return jsonify(layout)
+        # The latest published snapshot, readers never wait for writers
+        snapshot = flight_registry.get(flight_id).snapshot
+        compact = request.args.get('format') == 'compact'
+        etag = f"{snapshot.layout_etag}-compact" if compact else snapshot.layout_etag
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            body = snapshot.occupancy_json if compact else snapshot.seating_layout_json
+            response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         print(f"Error in get_seating_layout: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/passenger-list')
-def get_passenger_list():
+@app.route('/api/seating-layout/changes', defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/seating-layout/changes')
+def get_seating_layout_changes(flight_id):
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            since = -1
+        if since < 0:
+            return jsonify({'error': 'Invalid since version'}), 400
+        seating_system = flight_registry.get(flight_id)
+        return jsonify(seating_system.layout_changes_since(since, request.args.get('epoch')))
+    except Exception as e:
+        print(f"Error in get_seating_layout_changes: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _passenger_query(args) -> Dict:
+    """Validated pagination, projection, filter and sort arguments of /passenger-list"""
+    sort = args.get('sort', 'id')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in PassengerIndex.SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+    
+    try:
+        limit = int(args.get('limit', PASSENGER_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= PASSENGER_PAGE_MAX:
+        raise ValueError(f"limit must be between 1 and {PASSENGER_PAGE_MAX}")
+    
+    fields = [name.strip() for name in args['fields'].split(',')] if args.get('fields') else None
+    unknown = [name for name in fields or () if name not in PASSENGER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    filters = []
+    if 'status' in args:
+        if args['status'] not in ('assigned', 'unassigned', 'waitlisted'):
+            raise ValueError(f"Unknown status: {args['status']}")
+        filters.append(('status', args['status']))
+    if 'group_id' in args:
+        filters.append(('group_id', args['group_id']))
+    if 'vip' in args:
+        filters.append(('vip', _flag(args['vip'])))
+    
+    after = None
+    if args.get('cursor'):
+        try:
+            cursor_sort, cursor_descending, key = json.loads(base64.urlsafe_b64decode(args['cursor']))
+            after = tuple(key)
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+        if (cursor_sort, cursor_descending) != (sort, descending):
+            raise ValueError('Cursor belongs to another sort order')
+    return {'sort': sort, 'descending': descending, 'limit': limit, 'fields': fields,
+            'filters': filters, 'after': after}
+
+def _passenger_cursor(query: Dict, key: Tuple) -> str:
+    """Opaque cursor: the sort order and the sort key of the last passenger returned"""
+    return base64.urlsafe_b64encode(json.dumps([query['sort'], query['descending'], key]).encode()).decode()
+
+@app.route('/api/passenger-list', defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/passenger-list')
+def get_passenger_list(flight_id):
     try:
+        snapshot = flight_registry.get(flight_id).snapshot
+        if not PASSENGER_QUERY_ARGS & request.args.keys():
+            return jsonify({
+                'passengers': snapshot.passenger_list(),
+                'waiting_list': list(snapshot.waiting_list)
+            })
+        try:
+            query = _passenger_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        index = snapshot.passenger_index
+        try:
+            # From the cursor's own key, even if that passenger sorts elsewhere now or was cancelled
+            ids, more = index.page(query['sort'], query['filters'], query['limit'], query['after'],
+                                   query['descending'])
+        except TypeError:
+            # A cursor key that does not compare with this sort's keys
+            return jsonify({'error': 'Invalid cursor'}), 400
+        fields = query['fields']
+        passengers = [index.passengers[pid] for pid in ids]
         return jsonify({
-            'passengers': seating_system.get_passenger_list(),
-            'waiting_list': seating_system.waiting_list
+            'passengers': [{name: info[name] for name in fields} for info in passengers] if fields else passengers,
+            'total': index.count(query['filters']),
+            'next_cursor': _passenger_cursor(query, index.key(query['sort'], ids[-1])) if more else None
         })
     except Exception as e:
         print(f"Error in get_passenger_list: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/add-solo-passenger', methods=['POST'])
-def add_solo_passenger():
+def _reset_event(channel: EventChannel, sequence: int, snapshot: FlightSnapshot) -> bytes:
+    """Full state for a subscriber that cannot resume from its last event"""
+    return channel.format('reset', {
+        'epoch': snapshot.layout_epoch,
+        'version': snapshot.layout_version,
+        'layout': snapshot.seating_layout,
+        'passengers': snapshot.passenger_list(),
+        'waiting_list': snapshot.waiting_list
+    }, sequence)
+
+@app.route('/api/events', defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/events')
+def stream_events(flight_id):
+    try:
+        channel = flight_registry.get(flight_id).events
+        # EventSource sends the ID of the last event it saw when it reconnects
+        epoch, _, sequence = request.headers.get('Last-Event-ID', '').partition('-')
+        after = int(sequence) if epoch == channel.epoch and sequence.isdigit() else None
+        # Workers sharing a store only see each other's commits when they sync
+        timeout = 1.0 if flight_registry.store is not None else SSE_KEEPALIVE_SECONDS
+    except Exception as e:
+        print(f"Error in stream_events: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    if not event_streams.acquire(blocking=False):
+        # Keep threads free for other requests, the page polls meanwhile
+        response = app.response_class(f"retry: {SSE_RETRY_SECONDS * 1000}\n\n", status=503,
+                                      mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(SSE_RETRY_SECONDS)
+        return response
+
+    def stream(after):
+        deadline = time.monotonic() + SSE_STREAM_SECONDS
+        while True:
+            if after is None:
+                # Events after this sequence may already be in the snapshot, applying them twice is harmless
+                after = channel.sequence
+                yield _reset_event(channel, after, flight_registry.get(flight_id).snapshot)
+            try:
+                for payload in channel.subscribe(after, timeout, max(deadline - time.monotonic(), 0)):
+                    if payload is None:
+                        flight_registry.get(flight_id)
+                        payload = b': keepalive\n\n'
+                    yield payload
+                return
+            except LookupError:
+                after = None
+
+    response = app.response_class(stream(after), mimetype='text/event-stream')
+    response.call_on_close(event_streams.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+    return response
+
+@app.route('/api/add-solo-passenger', methods=['POST'], defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/add-solo-passenger', methods=['POST'])
+def add_solo_passenger(flight_id):
     try:
         data = request.json
         if not data:
             return jsonify({'success': False, 'error': 'Invalid request data'}), 400
-            
-        success = seating_system.add_solo_passenger(
+        
+        success = flight_registry.mutate(flight_id, lambda seating_system: seating_system.add_solo_passenger(
             name=data.get('name', ''),
             age=data.get('age', 0),
             has_accessibility_needs=data.get('accessibility', False),
             is_vip=data.get('vip', False),
             is_senior=data.get('senior', False)
-        )
+        ))
         return jsonify({'success': success})
     except Exception as e:
         print(f"Error in add_solo_passenger: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/add-group', methods=['POST'])
-def add_group():
+@app.route('/api/add-group', methods=['POST'], defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/add-group', methods=['POST'])
+def add_group(flight_id):
     try:
         data = request.json
         if not data:
             return jsonify({'success': False, 'error': 'Invalid request data'}), 400
-            
-        success = seating_system.add_group(
+        
+        success = flight_registry.mutate(flight_id, lambda seating_system: seating_system.add_group(
             name=data.get('name', ''),
             size=data.get('size', 0),
             has_children=data.get('children', False),
             has_accessibility_needs=data.get('accessibility', False),
             is_vip=data.get('vip', False),
             has_senior_members=data.get('senior', False)
-        )
+        ))
         return jsonify({'success': success})
     except Exception as e:
         print(f"Error in add_group: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/assign-seats', methods=['POST'])
-def assign_seats():
+@app.route('/api/manifest', defaults={'flight_id': None})
+@app.route('/api/flights/<flight:flight_id>/manifest')
+def get_manifest(flight_id):
     try:
-        success = seating_system.assign_seats()
-        return jsonify({'success': success})
+        if flight_id is None:
+            # ?flights=AB100,AB200 exports several flights in one stream
+            flight_ids = [f.strip() for f in request.args.get('flights', DEFAULT_FLIGHT_ID).split(',') if f.strip()]
+        else:
+            flight_ids = [flight_id]
+        invalid = [f for f in flight_ids if not FLIGHT_ID_PATTERN.fullmatch(f)]
+        if invalid:
+            return jsonify({'error': f"Invalid flight ID: {invalid[0]}"}), 400
+        # Exporting must not create the flights it names
+        unknown = [f for f in flight_ids if not flight_registry.exists(f)]
+        if unknown:
+            return jsonify({'error': f"Unknown flight: {unknown[0]}"}), 404
+        body_format = request.args.get('format', 'ndjson')
+        fields = [f.strip() for f in request.args['fields'].split(',')] if request.args.get('fields') else None
+        compress = request.accept_encodings['gzip'] > 0
+        try:
+            chunks = export_manifest(flight_registry.snapshots(flight_ids), fields, body_format, compress)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response = app.response_class(chunks, mimetype='text/csv' if body_format == 'csv' else 'application/x-ndjson')
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Content-Disposition'] = f'attachment; filename=manifest.{body_format}'
+        return response
+    except Exception as e:
+        print(f"Error in get_manifest: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _read_import_records(stream, body_format: str):
+    """Records of an import body, parsed one line at a time.
+
+    Malformed NDJSON lines and lines that are not UTF-8 come out as None,
+    so the import reports them instead of failing as a whole.
+    """
+    # Lines that do not decode, taken out before the CSV reader sees them
+    undecodable = []
+
+    def lines():
+        # Not io.TextIOWrapper: under gunicorn the stream is its own body reader,
+        # which has readline but not the rest of the io interface
+        for line in iter(stream.readline, b''):
+            try:
+                yield line.decode('utf-8')
+            except UnicodeDecodeError:
+                undecodable.append(line)
+                if body_format != 'csv':
+                    yield None
+
+    if body_format == 'csv':
+        for row in csv.DictReader(lines()):
+            # Rejected lines are reported in their place, before the row that followed them
+            yield from (None for _ in range(len(undecodable)))
+            undecodable.clear()
+            yield {key.strip().lower(): value.strip() for key, value in row.items()
+                   if key is not None and value is not None}
+        yield from (None for _ in undecodable)
+        return
+    for line in lines():
+        if line is None:
+            yield None
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+@app.route('/api/import-passengers', methods=['POST'], defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/import-passengers', methods=['POST'])
+def import_passengers(flight_id):
+    try:
+        body_format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+        if body_format not in ('csv', 'ndjson'):
+            return jsonify({'success': False, 'error': f'Unknown import format: {body_format}'}), 400
+        assign = _flag(request.args.get('assign', False))
+        
+        # Read before mutating: a conflicting commit by another worker runs the import again.
+        # One record past the limit is kept so the import reports it
+        records = list(itertools.islice(_read_import_records(request.stream, body_format), IMPORT_MAX_RECORDS + 1))
+        report = flight_registry.mutate(flight_id, lambda seating_system: seating_system.import_passengers(
+            records, assign=assign))
+        return jsonify({'success': True, **report})
+    except Exception as e:
+        print(f"Error in import_passengers: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/assign-seats', methods=['POST'], defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/assign-seats', methods=['POST'])
+def assign_seats(flight_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        time_budget = data.get('time_budget')
+        if time_budget is not None and (isinstance(time_budget, bool) or not isinstance(time_budget, (int, float))
+                                        or not 0 <= time_budget < float('inf')):
+            return jsonify({'success': False, 'error': 'time_budget must be a non-negative number of seconds'}), 400
+        
+        summary = flight_registry.mutate(flight_id, lambda seating_system: seating_system.assign_seats(
+            full=bool(data.get('full', False)),
+            optimize=bool(data.get('optimize', False)),
+            time_budget=time_budget
+        ))
+        return jsonify({'success': bool(summary), 'summary': summary.to_dict()})
     except Exception as e:
         print(f"Error in assign_seats: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/admin-override', methods=['POST'])
-def admin_override():
+@app.route('/api/admin-override', methods=['POST'], defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/admin-override', methods=['POST'])
+def admin_override(flight_id):
     try:
         data = request.json
         if not data:
             return jsonify({'success': False, 'error': 'Invalid request data'}), 400
-            
-        success = seating_system.admin_override(
+        
+        success = flight_registry.mutate(flight_id, lambda seating_system: seating_system.admin_override(
             passenger_id=data.get('passenger_id', ''),
             row=data.get('row', 0),
             seat_letter=data.get('seat_letter', '')
-        )
+        ))
         return jsonify({'success': success})
     except Exception as e:
         print(f"Error in admin_override: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/cancel-booking', methods=['POST'])
-def cancel_booking():
+@app.route('/api/cancel-booking', methods=['POST'], defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/cancel-booking', methods=['POST'])
+def cancel_booking(flight_id):
     try:
         data = request.json
         if not data:
             return jsonify({'success': False, 'error': 'Invalid request data'}), 400
-            
-        success = seating_system.cancel_booking(data.get('passenger_id', ''))
+        
+        success = flight_registry.mutate(flight_id, lambda seating_system: seating_system.cancel_booking(
+            data.get('passenger_id', '')))
         return jsonify({'success': success})
     except Exception as e:
         print(f"Error in cancel_booking: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/reset-system', methods=['POST'])
-def reset_system():
+@app.route('/api/reset-system', methods=['POST'], defaults={'flight_id': DEFAULT_FLIGHT_ID})
+@app.route('/api/flights/<flight:flight_id>/reset-system', methods=['POST'])
+def reset_system(flight_id):
     try:
-        seating_system.reset_system()
+        flight_registry.mutate(flight_id, lambda seating_system: seating_system.reset_system())
         return jsonify({'success': True})
     except Exception as e:
         print(f"Error in reset_system: {e}")
@@ -0,0 +1,332 @@
+"""Benchmarks for the seating engine.
+
+Run with ``python benchmarks.py``; results are printed as JSON. Every
+scenario runs on flights and manifests built from ``--seed``, so two runs
+with the same seed do the same work. ``--output`` also writes the results
+to a file, and ``--baseline`` compares them with an earlier results file:
+each timing gets its ratio to the baseline and is listed as a regression
+when it is more than ``--threshold`` slower (exit status 1).
+``--backends`` adds the dict/compact seat backend comparison.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional
+
+from dataclasses import replace
+
+from app import AircraftSeatingSystem, CompactSeatStore, SEAT_BACKENDS, app
+
+DEFAULT_SEED = 1234
+# Timings within this fraction of the baseline are noise, not regressions
+DEFAULT_THRESHOLD = 0.10
+
+
+def _load_manifest(system: AircraftSeatingSystem):
+    """Fill a flight with a fixed mix of solo passengers and groups"""
+    for i in range(60):
+        system.add_solo_passenger(f"Solo {i}", 20 + i % 50, is_vip=(i % 10 == 0),
+                                  has_accessibility_needs=(i % 15 == 0))
+    for i in range(20):
+        system.add_group(f"Group {i}", 2 + i % 4, has_children=(i % 3 == 0))
+
+
+def measure_seat_backend(seat_backend: str, flights: int = 500, repeats: int = 20) -> Dict[str, float]:
+    """Measure memory per flight and engine latency for one seat backend"""
+    AircraftSeatingSystem(seat_backend=seat_backend)  # Warm shared layout caches
+
+    template = AircraftSeatingSystem().layout
+    if seat_backend == 'compact':
+        build_store = lambda: CompactSeatStore(template)
+    else:
+        build_store = template.new_seats
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    systems = [AircraftSeatingSystem(seat_backend=seat_backend) for _ in range(flights)]
+    after = tracemalloc.get_traced_memory()[0]
+    stores = [build_store() for _ in range(flights)]
+    after_stores = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del systems, stores
+
+    assign_total = 0.0
+    layout_total = 0.0
+    for _ in range(repeats):
+        system = AircraftSeatingSystem(seat_backend=seat_backend)
+        _load_manifest(system)
+
+        start = time.perf_counter()
+        system.assign_seats()
+        assign_total += time.perf_counter() - start
+
+        start = time.perf_counter()
+        system.get_seating_layout()
+        layout_total += time.perf_counter() - start
+
+    return {
+        'bytes_per_flight': (after - before) / flights,
+        'seat_store_bytes_per_flight': (after_stores - after) / flights,
+        'seat_store_bytes_per_seat': (after_stores - after) / flights / len(template.keys),
+        'assign_seats_ms': assign_total / repeats * 1000,
+        'get_seating_layout_ms': layout_total / repeats * 1000,
+    }
+
+
+def compare_seat_backends(flights: int = 500, repeats: int = 20) -> Dict[str, Dict[str, float]]:
+    """Compare the dict and compact seat backends"""
+    return {backend: measure_seat_backend(backend, flights, repeats) for backend in SEAT_BACKENDS}
+
+
+def generate_manifest(rng: random.Random, seats: int, load_factor: float = 1.0, group_ratio: float = 0.3,
+                      vip_ratio: float = 0.1, accessibility_ratio: float = 0.05, child_ratio: float = 0.3,
+                      senior_ratio: float = 0.15) -> List[Dict]:
+    """Bookings for about ``seats * load_factor`` seats, as import records.
+
+    ``group_ratio`` is the share of bookings that are groups (2-7 people);
+    ``child_ratio`` is the share of groups travelling with children, the
+    other ratios apply to every booking. The records have the fields of
+    ``import_passengers``, so a manifest can also be posted to
+    /api/import-passengers.
+    """
+    records = []
+    booked = 0
+    while booked < seats * load_factor:
+        number = len(records) + 1
+        flags = {'vip': rng.random() < vip_ratio, 'accessibility': rng.random() < accessibility_ratio,
+                 'senior': rng.random() < senior_ratio}
+        if rng.random() < group_ratio:
+            size = rng.randint(2, 7)
+            records.append({'type': 'group', 'name': f"Group {number}", 'size': size,
+                            'children': rng.random() < child_ratio, **flags})
+            booked += size
+        else:
+            age = rng.randint(65, 90) if flags['senior'] else rng.randint(18, 64)
+            records.append({'type': 'solo', 'name': f"Passenger {number}", 'age': age, **flags})
+            booked += 1
+    return records
+
+
+def book(system: AircraftSeatingSystem, record: Dict) -> bool:
+    """Add one manifest record through the public booking methods"""
+    if record['type'] == 'solo':
+        return system.add_solo_passenger(record['name'], record['age'], record['accessibility'],
+                                         record['vip'], record['senior'])
+    return system.add_group(record['name'], record['size'], record['children'], record['accessibility'],
+                            record['vip'], record['senior'])
+
+
+def _flight(seed: int, seat_backend: str, **manifest_options):
+    """A seeded flight and its manifest, nothing booked yet"""
+    rng = random.Random(seed)
+    system = AircraftSeatingSystem(seat_backend=seat_backend, rng=rng)
+    seats = sum(1 for seat in system.seats.values() if seat.is_available)
+    return system, rng, generate_manifest(rng, seats, **manifest_options)
+
+
+def _loaded_flight(seed: int, seat_backend: str, **manifest_options):
+    system, rng, manifest = _flight(seed, seat_backend, **manifest_options)
+    for record in manifest:
+        book(system, record)
+    system.assign_seats()
+    return system, rng
+
+
+def _seated(system: AircraftSeatingSystem) -> List[str]:
+    return [passenger_id for passenger_id, passenger in system.passengers.items()
+            if passenger.assigned_seat is not None]
+
+
+def scenario_assign_full_load(seed: int, seat_backend: str, **manifest_options) -> Iterator[int]:
+    """One assign_seats pass over a fully booked flight"""
+    system, _, manifest = _flight(seed, seat_backend, **manifest_options)
+    for record in manifest:
+        book(system, record)
+    yield 1
+    system.assign_seats()
+
+
+def scenario_assign_incremental(seed: int, seat_backend: str, **manifest_options) -> Iterator[int]:
+    """Book the manifest one record at a time, assigning seats after each booking"""
+    system, _, manifest = _flight(seed, seat_backend, **manifest_options)
+    yield len(manifest)
+    for record in manifest:
+        book(system, record)
+        system.assign_seats()
+
+
+def scenario_cancellation_storm(seed: int, seat_backend: str, cancel_ratio: float = 0.5,
+                                **manifest_options) -> Iterator[int]:
+    """Cancel a share of the seated passengers of a full flight; waitlisted
+    passengers are backfilled into the freed seats"""
+    system, rng = _loaded_flight(seed, seat_backend, **manifest_options)
+    seated = _seated(system)
+    cancelled = rng.sample(seated, int(len(seated) * cancel_ratio))
+    yield len(cancelled)
+    for passenger_id in cancelled:
+        system.cancel_booking(passenger_id)
+
+
+def scenario_override_churn(seed: int, seat_backend: str, overrides: int = 200,
+                            **manifest_options) -> Iterator[int]:
+    """Move random seated passengers to random seats with admin_override,
+    displacing whoever sits there"""
+    system, rng = _loaded_flight(seed, seat_backend, **manifest_options)
+    seated = _seated(system)
+    seats = [key for key, seat in system.seats.items() if seat.is_available]
+    moves = [(rng.choice(seated), rng.choice(seats)) for _ in range(overrides)]
+    yield len(moves)
+    for passenger_id, (row, letter) in moves:
+        system.admin_override(passenger_id, row, letter)
+
+
+def _fresh_snapshots(system: AircraftSeatingSystem, calls: int) -> List:
+    """Copies of a flight's snapshot without its cached serializations, as
+    the first request after each commit finds them"""
+    return [replace(system.snapshot) for _ in range(calls)]
+
+
+def scenario_serialize_layout(seed: int, seat_backend: str, calls: int = 200,
+                              **manifest_options) -> Iterator[int]:
+    """Body of /seating-layout for a full flight: the seat map assembled from
+    the snapshot's serialized rows"""
+    system, _ = _loaded_flight(seed, seat_backend, **manifest_options)
+    snapshots = _fresh_snapshots(system, calls)
+    yield calls
+    for snapshot in snapshots:
+        snapshot.seating_layout_json
+
+
+def scenario_serialize_occupancy(seed: int, seat_backend: str, calls: int = 200,
+                                 **manifest_options) -> Iterator[int]:
+    """Body of /seating-layout?format=compact for a full flight"""
+    system, _ = _loaded_flight(seed, seat_backend, **manifest_options)
+    snapshots = _fresh_snapshots(system, calls)
+    yield calls
+    for snapshot in snapshots:
+        snapshot.occupancy_json
+
+
+def scenario_serialize_passengers(seed: int, seat_backend: str, calls: int = 20,
+                                  **manifest_options) -> Iterator[int]:
+    """Response of /passenger-list (unpaged) for a full flight, through jsonify"""
+    system, _ = _loaded_flight(seed, seat_backend, **manifest_options)
+    snapshot = system.snapshot
+    with app.app_context():
+        yield calls
+        for _ in range(calls):
+            app.json.response({'passengers': snapshot.passenger_list(),
+                               'waiting_list': list(snapshot.waiting_list)})
+
+
+SCENARIOS = {
+    'assign_full_load': scenario_assign_full_load,
+    'assign_incremental': scenario_assign_incremental,
+    'cancellation_storm': scenario_cancellation_storm,
+    'override_churn': scenario_override_churn,
+    'serialize_layout': scenario_serialize_layout,
+    'serialize_occupancy': scenario_serialize_occupancy,
+    'serialize_passengers': scenario_serialize_passengers,
+}
+
+
+def run_scenario(scenario, seed: int, repeats: int, seat_backend: str = 'dict',
+                 **manifest_options) -> Dict[str, float]:
+    """Time a scenario over `repeats` flights seeded seed, seed + 1, ...
+
+    A scenario is a generator: everything before its first ``yield`` is
+    setup and is not timed, the yielded value is the number of operations
+    the timed part performs.
+    """
+    totals = []
+    operations = 0
+    for repeat in range(repeats):
+        run = scenario(seed + repeat, seat_backend, **manifest_options)
+        operations = next(run)
+        start = time.perf_counter()
+        for _ in run:
+            pass
+        totals.append(time.perf_counter() - start)
+    median = statistics.median(totals)
+    return {
+        'operations': operations,
+        'median_ms': median * 1000,
+        'min_ms': min(totals) * 1000,
+        'max_ms': max(totals) * 1000,
+        'per_operation_us': median / max(operations, 1) * 1e6,
+    }
+
+
+def run_suite(seed: int = DEFAULT_SEED, repeats: int = 5, seat_backend: str = 'dict',
+              scenarios: Optional[List[str]] = None, **manifest_options) -> Dict:
+    """Run the scenarios and return the results with the settings that produced them"""
+    names = scenarios or list(SCENARIOS)
+    unknown = set(names) - SCENARIOS.keys()
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return {
+        'settings': {'seed': seed, 'repeats': repeats, 'seat_backend': seat_backend,
+                     'manifest': manifest_options, 'python': platform.python_version()},
+        'scenarios': {name: run_scenario(SCENARIOS[name], seed, repeats, seat_backend, **manifest_options)
+                      for name in names},
+    }
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> Dict:
+    """Ratio of each scenario's median to the baseline's; scenarios more than
+    `threshold` slower are listed as regressions"""
+    comparison = {'threshold': threshold, 'scenarios': {}, 'regressions': []}
+    if baseline.get('settings', {}).get('seed') != results['settings']['seed']:
+        comparison['warning'] = 'The baseline was run with a different seed'
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        ratio = current['median_ms'] / previous['median_ms'] if previous['median_ms'] else float('inf')
+        comparison['scenarios'][name] = {
+            'baseline_ms': previous['median_ms'],
+            'current_ms': current['median_ms'],
+            'ratio': ratio,
+            'change_percent': (ratio - 1) * 100,
+        }
+        if ratio > 1 + threshold:
+            comparison['regressions'].append(name)
+    return comparison
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seat-backend', choices=SEAT_BACKENDS, default='dict')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help='Run only this scenario (repeatable)')
+    parser.add_argument('--load-factor', type=float, default=1.0,
+                        help='Seats booked per available seat')
+    parser.add_argument('--output', help='Also write the results to this file')
+    parser.add_argument('--baseline', help='Results file to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--backends', action='store_true', help='Also compare the seat backends')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.seed, args.repeats, args.seat_backend, args.scenario,
+                        load_factor=args.load_factor)
+    if args.backends:
+        results['seat_backends'] = compare_seat_backends()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            results['baseline'] = compare_to_baseline(results, json.load(f), args.threshold)
+    print(json.dumps(results, indent=2))
+    return 1 if results.get('baseline', {}).get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,20 @@
 # Gunicorn configuration for Render deployment
 import os
+import signal
+import tempfile
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
 backlog = 2048
 
 # Worker processes
-workers = 2
-worker_class = 'sync'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Threaded workers absorb read-heavy polling, the engine locks per flight and cabin.
+# Every open /events stream holds a thread (mostly asleep), so keep plenty of them
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# At most half of them serve event streams, further ones get a 503 and the page polls
+os.environ.setdefault('SEATING_SSE_MAX_STREAMS', str(max(threads // 2, 1)))
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -16,9 +23,32 @@ keepalive = 2
 max_requests = 1000
 max_requests_jitter = 50
 
+# Retiring workers hand their flights to their replacement, which decodes them instead of
+# reading the shared store (unless they changed since)
+handoff_dir = os.environ.get('SEATING_HANDOFF_DIR', os.path.join(tempfile.gettempdir(), 'seating-handoff'))
+
+def worker_exit(server, worker):
+    from app import flight_registry
+    path = flight_registry.hand_off(handoff_dir)
+    if path:
+        server.log.info(f"Worker {worker.pid} handed off its flights to {path}")
+
+def post_fork(server, worker):
+    from app import flight_registry
+    if flight_registry.take_over(handoff_dir):
+        server.log.info(f"Worker {worker.pid} took over {len(flight_registry.handoff)} flights")
+
+def post_worker_init(worker):
+    # After the worker reset its signal handlers: `kill -USR2 <worker pid>` samples it for 30s
+    from app import profiler
+    profiler.install_signal_handler(signal.SIGUSR2)
+
 # Load application code before the worker processes are forked
 preload_app = True
 
+# All workers share one authoritative seat map
+os.environ.setdefault('SEATING_SHARED_STATE', os.path.join(tempfile.gettempdir(), 'seating-state.db'))
+
 # Logging
 accesslog = '-'
 access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
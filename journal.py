@@ -0,0 +1,168 @@
+"""Append-only write-ahead journal with group commit and snapshots.
+
+Records are JSON objects written one per line to numbered segment files.
+A background thread writes whatever accumulated since its last write in one
+batch and fsyncs it (group commit), so concurrent writers share each fsync.
+``checkpoint`` starts a new segment, stores a binary snapshot of the caller's
+state and deletes the segments the snapshot covers; ``recover`` returns the
+latest snapshot and the records written after it.
+"""
+import glob
+import json
+import os
+import pickle
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class Journal:
+    """Journal stored in ``directory``.
+
+    ``append`` only queues a record and returns its sequence number; call
+    ``sync`` to wait until everything appended so far is on disk. A journal
+    belongs to one process: after a fork the child reopens its files and
+    starts its own writer thread.
+    """
+
+    def __init__(self, directory: str, checkpoint_every: int = 10000):
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self._cond = threading.Condition()
+        self._buffer: List[str] = []
+        self._appended = 0
+        self._durable = 0
+        self._pid = None
+        self._closed = False
+        self.segment = 0
+        self.records_since_checkpoint = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, kind: str, number: int) -> str:
+        return os.path.join(self.directory, f"{kind}-{number:08d}.{'bin' if kind == 'snapshot' else 'log'}")
+
+    def _numbers(self, kind: str) -> List[int]:
+        paths = glob.glob(os.path.join(self.directory, f"{kind}-*.{'bin' if kind == 'snapshot' else 'log'}"))
+        return sorted(int(os.path.basename(path).split('-')[1].split('.')[0]) for path in paths)
+
+    def _start(self):
+        """Open a new segment and start the writer thread in this process"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._buffer, self._appended, self._durable = [], 0, 0
+        # Never append after a possibly torn last line of an earlier run
+        self.segment = max(self._numbers('journal') + self._numbers('snapshot') + [0]) + 1
+        self._file = open(self._path('journal', self.segment), 'a')
+        self._writer = threading.Thread(target=self._write_batches, name='journal-writer', daemon=True)
+        self._writer.start()
+
+    def _write_batches(self):
+        """Writer thread: write and fsync everything queued since the last batch"""
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if not self._buffer:
+                    return
+                batch, self._buffer = self._buffer, []
+                upto = self._appended
+                self._file.write(''.join(batch))
+                self._file.flush()
+                file = self._file
+            # fsync outside the lock, writers keep queueing the next batch meanwhile
+            os.fsync(file.fileno())
+            with self._cond:
+                self._durable = max(self._durable, upto)
+                self.records_since_checkpoint += len(batch)
+                self._cond.notify_all()
+
+    def append(self, record: Dict) -> int:
+        """Queue a record and return its sequence number"""
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._cond:
+            self._start()
+            self._buffer.append(line)
+            self._appended += 1
+            self._cond.notify_all()
+            return self._appended
+
+    def sync(self, sequence: Optional[int] = None):
+        """Wait until a record (default: every record appended so far) is durable"""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            target = self._appended if sequence is None else sequence
+            while self._durable < target:
+                self._cond.wait()
+
+    @property
+    def needs_checkpoint(self) -> bool:
+        return self.records_since_checkpoint >= self.checkpoint_every
+
+    def checkpoint(self, collect_state) -> int:
+        """Replace the journal so far with a snapshot of ``collect_state()``.
+
+        A new segment is started before the state is collected, so every
+        change missing from the snapshot is in a later segment. Records for
+        changes that are already in the snapshot may appear there too; they
+        must be safe to replay.
+        """
+        with self._cond:
+            self._start()
+            # Move to a new segment once everything queued is durable in the current one
+            while self._durable < self._appended:
+                self._cond.wait()
+            self._file.close()
+            self.segment += 1
+            self._file = open(self._path('journal', self.segment), 'a')
+            self.records_since_checkpoint = 0
+            segment = self.segment
+
+        state = collect_state()
+        path = self._path('snapshot', segment)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+        for number in self._numbers('journal'):
+            if number < segment:
+                os.remove(self._path('journal', number))
+        for number in self._numbers('snapshot'):
+            if number < segment:
+                os.remove(self._path('snapshot', number))
+        return segment
+
+    def recover(self) -> Tuple[Optional[object], Iterator[Dict]]:
+        """Return the latest snapshot (None if there is none) and the records written after it"""
+        snapshots = self._numbers('snapshot')
+        state = None
+        first_segment = 0
+        if snapshots:
+            first_segment = snapshots[-1]
+            with open(self._path('snapshot', first_segment), 'rb') as f:
+                state = pickle.load(f)
+        return state, self._records_from(first_segment)
+
+    def _records_from(self, first_segment: int) -> Iterator[Dict]:
+        for number in self._numbers('journal'):
+            if number < first_segment:
+                continue
+            with open(self._path('journal', number)) as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # Torn write from a crash, nothing after it was acknowledged
+                    yield json.loads(line)
+
+    def close(self):
+        """Flush queued records and stop the writer thread"""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+        self._pid = None
+        self._closed = False
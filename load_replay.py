@@ -0,0 +1,345 @@
+"""Load test the HTTP API with generated or recorded traffic.
+
+Run with ``python load_replay.py``; results are printed as JSON. Requests
+go through Flask's test client by default, to ``--url`` if given, or to a
+local gunicorn started with ``gunicorn_config.py`` and the ``--workers``,
+``--worker-class`` and ``--threads`` settings (``--gunicorn``). The test
+client measures the app and engine without the network, in this process;
+use gunicorn to compare server settings.
+
+Each run resets ``--flights`` flights and books them to ``--preload`` of
+their seats from a manifest seeded with ``--seed``, then sends the traffic
+from ``--concurrency`` threads. The default mix is mostly seat map and
+passenger list polls with interleaved bookings, assignment passes,
+overrides and cancellations; change it with ``--mix route=weight``. The
+generated traffic can be saved with ``--record`` and sent again with
+``--replay`` (use the same ``--seed``, ``--flights`` and ``--preload``, so
+the recorded passenger IDs exist). The report has the throughput, p50/p95/
+p99 latency and error rate of every route.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app import DEFAULT_LAYOUT, get_layout_template
+from benchmarks import DEFAULT_SEED, generate_manifest
+
+DEFAULT_MIX = {
+    'seating-layout': 45,
+    'passenger-list': 30,
+    'add-solo-passenger': 7,
+    'add-group': 3,
+    'assign-seats': 6,
+    'admin-override': 5,
+    'cancel-booking': 4,
+}
+PERCENTILES = (50, 95, 99)
+
+
+class TestClientTarget:
+    """Sends requests through Flask's test client, one client per thread"""
+
+    def __init__(self, flask_app=None):
+        if flask_app is None:
+            from app import app as flask_app
+        self.app = flask_app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def send(method: str, path: str, body=None, data: Optional[bytes] = None,
+                 content_type: Optional[str] = None) -> Tuple[int, bytes]:
+            if data is None:
+                response = client.open(path, method=method, json=body)
+            else:
+                response = client.open(path, method=method, data=data, content_type=content_type)
+            return response.status_code, response.get_data()
+        return send
+
+
+class HTTPTarget:
+    """Sends requests to a running server, one keep-alive connection per thread"""
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+
+    def session(self):
+        connection = None
+
+        def send(method: str, path: str, body=None, data: Optional[bytes] = None,
+                 content_type: Optional[str] = None) -> Tuple[int, bytes]:
+            nonlocal connection
+            if data is None and body is not None:
+                data, content_type = json.dumps(body).encode(), 'application/json'
+            headers = {} if data is None else {'Content-Type': content_type}
+            for attempt in range(2):
+                if connection is None:
+                    connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                try:
+                    connection.request(method, self.prefix + path, body=data, headers=headers)
+                    response = connection.getresponse()
+                    return response.status, response.read()
+                except (ConnectionError, http.client.HTTPException):
+                    # The server closed the kept-alive connection (e.g. a worker restarted), retry once
+                    connection.close()
+                    connection = None
+                    if attempt:
+                        raise
+        return send
+
+
+@contextmanager
+def start_gunicorn(port: int = 10050, workers: int = 2, worker_class: str = 'gthread', threads: int = 32,
+                   config: str = 'gunicorn_config.py', startup_timeout: float = 30.0) -> Iterator[str]:
+    """Run the app under gunicorn with fresh shared state and yield its URL"""
+    state_dir = tempfile.mkdtemp(prefix='seating-load-')
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_THREADS=str(threads),
+               SEATING_SHARED_STATE=os.path.join(state_dir, 'seating-state.db'),
+               SEATING_HANDOFF_DIR=os.path.join(state_dir, 'handoff'))
+    directory = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', config, '--access-logfile', os.devnull,
+                               'app:app'], cwd=directory, env=env, stdout=sys.stderr)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+            try:
+                if HTTPTarget(url, timeout=1.0).session()('GET', '/health')[0] == 200:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError('gunicorn did not come up in time')
+            time.sleep(0.2)
+        yield url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _flight_path(flight_id: str, route: str) -> str:
+    return f"/api/flights/{flight_id}/{route}"
+
+
+def prepare_flights(target, flight_ids: List[str], seed: int = DEFAULT_SEED,
+                    preload: float = 0.5) -> Dict[str, List[str]]:
+    """Reset the flights, book and seat a seeded manifest on each, and return
+    their passenger IDs"""
+    send = target.session()
+    seats = len(get_layout_template(DEFAULT_LAYOUT).keys)
+    passenger_ids = {}
+    for number, flight_id in enumerate(flight_ids):
+        send('POST', _flight_path(flight_id, 'reset-system'), {})
+        if preload > 0:
+            manifest = generate_manifest(random.Random(seed + number), seats, load_factor=preload)
+            body = ''.join(json.dumps(record) + '\n' for record in manifest).encode()
+            send('POST', _flight_path(flight_id, 'import-passengers') + '?assign=1',
+                 data=body, content_type='application/x-ndjson')
+        _, data = send('GET', _flight_path(flight_id, 'passenger-list'))
+        passenger_ids[flight_id] = [passenger['id'] for passenger in json.loads(data)['passengers']]
+    return passenger_ids
+
+
+def generate_traffic(rng: random.Random, passenger_ids: Dict[str, List[str]], count: int,
+                     mix: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """`count` requests spread over the flights of `passenger_ids`, drawn from `mix`.
+
+    Each request is a dict with ``route`` (the key of the mix), ``method``,
+    ``path`` and an optional ``json`` body. Overrides and cancellations pick
+    from the preloaded passengers; each one is cancelled at most once.
+    """
+    mix = mix or DEFAULT_MIX
+    unknown = set(mix) - DEFAULT_MIX.keys()
+    if unknown:
+        raise ValueError(f"Unknown routes in mix: {', '.join(sorted(unknown))}")
+    routes = [route for route, weight in mix.items() if weight > 0]
+    weights = [mix[route] for route in routes]
+    seats = get_layout_template(DEFAULT_LAYOUT).keys
+    flights = sorted(passenger_ids)
+    remaining = {flight_id: list(ids) for flight_id, ids in passenger_ids.items()}
+    for ids in remaining.values():
+        rng.shuffle(ids)
+
+    requests = []
+    for number, route in enumerate(rng.choices(routes, weights, k=count), 1):
+        flight_id = rng.choice(flights)
+        body = None
+        if route == 'add-solo-passenger':
+            body = {'name': f"Load Passenger {number}", 'age': rng.randint(18, 80),
+                    'vip': rng.random() < 0.1, 'senior': rng.random() < 0.15}
+        elif route == 'add-group':
+            body = {'name': f"Load Group {number}", 'size': rng.randint(2, 5), 'children': rng.random() < 0.3}
+        elif route == 'assign-seats':
+            body = {}
+        elif route == 'admin-override':
+            row, letter = rng.choice(seats)
+            body = {'passenger_id': rng.choice(passenger_ids[flight_id] or ['unknown']),
+                    'row': row, 'seat_letter': letter}
+        elif route == 'cancel-booking':
+            ids = remaining[flight_id]
+            body = {'passenger_id': ids.pop() if ids else 'unknown'}
+        request = {'route': route, 'method': 'GET' if body is None else 'POST',
+                   'path': _flight_path(flight_id, route)}
+        if body is not None:
+            request['json'] = body
+        requests.append(request)
+    return requests
+
+
+def replay(target, requests: List[Dict], concurrency: int = 8) -> Dict:
+    """Send the requests from `concurrency` threads, in order, and report per route"""
+    counter = itertools.count()
+    samples: List[List[Tuple[str, float, object]]] = []
+
+    def worker():
+        send = target.session()
+        results = []
+        samples.append(results)
+        for index in counter:
+            if index >= len(requests):
+                break
+            request = requests[index]
+            start = time.perf_counter()
+            try:
+                status, _ = send(request['method'], request['path'], request.get('json'))
+            except Exception as e:
+                status = type(e).__name__
+            results.append((request['route'], time.perf_counter() - start, status))
+
+    threads = [threading.Thread(target=worker, name=f"load-{i}") for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return summarize([sample for results in samples for sample in results], elapsed)
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)]
+
+
+def _route_stats(samples: List[Tuple[str, float, object]], elapsed: float) -> Dict:
+    latencies = sorted(seconds for _, seconds, _ in samples)
+    # A status is the HTTP status code, or the name of the exception the request raised
+    errors = sum(1 for _, _, status in samples if not isinstance(status, int) or status >= 400)
+    statuses: Dict[str, int] = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    stats = {'requests': len(samples), 'throughput_rps': len(samples) / elapsed if elapsed else 0.0}
+    stats.update({f"p{p}_ms": percentile(latencies, p) * 1000 for p in PERCENTILES})
+    stats.update({
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'statuses': statuses,
+    })
+    return stats
+
+
+def summarize(samples: List[Tuple[str, float, object]], elapsed: float) -> Dict:
+    """Throughput, latency percentiles and errors per route and overall"""
+    by_route: Dict[str, List] = {}
+    for sample in samples:
+        by_route.setdefault(sample[0], []).append(sample)
+    return {
+        'elapsed_seconds': elapsed,
+        'routes': {route: _route_stats(by_route[route], elapsed) for route in sorted(by_route)},
+        'total': _route_stats(samples, elapsed),
+    }
+
+
+def _parse_mix(entries: List[str]) -> Dict[str, float]:
+    mix = dict(DEFAULT_MIX)
+    for entry in entries:
+        route, _, weight = entry.partition('=')
+        if route not in DEFAULT_MIX:
+            raise ValueError(f"Unknown route in mix: {route}")
+        mix[route] = float(weight)
+    return mix
+
+
+@contextmanager
+def _server(args) -> Iterator[Optional[str]]:
+    """URL of the server to load, None for the test client"""
+    if args.gunicorn:
+        with start_gunicorn(args.port, args.workers, args.worker_class, args.threads) as url:
+            yield url
+    else:
+        yield args.url
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument('--url', help='Send requests to this running server')
+    server.add_argument('--gunicorn', action='store_true', help='Start a local gunicorn for the run')
+    parser.add_argument('--port', type=int, default=10050)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--flights', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--preload', type=float, default=0.5, help='Share of seats booked before the run')
+    parser.add_argument('--mix', action='append', default=[], metavar='ROUTE=WEIGHT',
+                        help='Change the weight of a route in the traffic mix (repeatable)')
+    parser.add_argument('--record', help='Write the generated requests to this NDJSON file')
+    parser.add_argument('--replay', help='Send the requests of this NDJSON file instead of generating them')
+    parser.add_argument('--output', help='Also write the report to this file')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = _parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    settings = {key: value for key, value in vars(args).items() if key not in ('record', 'output')}
+    settings['mix'] = mix
+    flight_ids = [f"load-{number + 1}" for number in range(args.flights)]
+
+    with _server(args) as url:
+        target = HTTPTarget(url) if url else TestClientTarget()
+        passenger_ids = prepare_flights(target, flight_ids, args.seed, args.preload)
+        if args.replay:
+            with open(args.replay) as f:
+                requests = [json.loads(line) for line in f if line.strip()]
+        else:
+            requests = generate_traffic(random.Random(args.seed), passenger_ids, args.requests, mix)
+        if args.record:
+            with open(args.record, 'w') as f:
+                f.writelines(json.dumps(request) + '\n' for request in requests)
+        report = {'settings': settings, **replay(target, requests, args.concurrency)}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
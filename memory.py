@@ -0,0 +1,148 @@
+"""Memory accounting for long-lived in-process structures.
+
+``deep_sizeof`` adds up ``sys.getsizeof`` over everything reachable from an
+object, counting each object once; objects reachable from ``shared`` roots
+(e.g. the layout templates every flight references) are left out, as are
+classes, functions, modules and enum members. ``MemoryTracker`` combines
+such per-structure reports with ``tracemalloc`` statistics and keeps one
+baseline to diff against, to catch structures that keep growing.
+"""
+import sys
+import threading
+import tracemalloc
+import types
+from collections import deque
+from enum import Enum
+from typing import Dict, Iterable, Optional
+
+# Frames kept per tracemalloc trace, enough to tell the engine's call sites apart
+TRACE_FRAMES = 5
+
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+           Enum, threading.local)
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Bytes of `obj` and everything it references that is not in `seen`.
+
+    IDs of the counted objects are added to `seen`, so passing the same set
+    through several calls attributes a shared object to the first one only.
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or obj is None or isinstance(obj, (bool, *_OPAQUE)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, bytearray, int, float, memoryview)):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(vars(obj))
+            for cls in type(obj).__mro__:
+                for name in getattr(cls, '__slots__', ()):
+                    if hasattr(obj, name):
+                        stack.append(getattr(obj, name))
+    return total
+
+
+def shared_ids(roots: Iterable) -> set:
+    """IDs of everything reachable from `roots`, to exclude from per-owner counts"""
+    seen = set()
+    for root in roots:
+        deep_sizeof(root, seen)
+    return seen
+
+
+def structure_sizes(structures: Dict[str, object], shared: Iterable[int] = ()) -> Dict[str, int]:
+    """Bytes per named structure, in order: an object reachable from several
+    structures is counted in the first one"""
+    seen = set(shared)
+    sizes = {name: deep_sizeof(structure, seen) for name, structure in structures.items()}
+    sizes['total'] = sum(sizes.values())
+    return sizes
+
+
+class MemoryTracker:
+    """Reports per-owner structure sizes and tracemalloc statistics, and
+    differences to a recorded baseline"""
+
+    def __init__(self, top: int = 20):
+        self.top = top
+        self.lock = threading.Lock()
+        self.baseline: Optional[Dict] = None
+        self._started_tracing = False
+
+    def set_baseline(self, sizes: Dict[str, Dict[str, int]]):
+        """Record the current sizes, starting tracemalloc if it is not tracing yet.
+
+        Only allocations made after tracing starts are seen by tracemalloc, so
+        start the baseline before the period under investigation.
+        """
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACE_FRAMES)
+                self._started_tracing = True
+            self.baseline = {'sizes': sizes, 'snapshot': self._snapshot()}
+
+    def clear_baseline(self):
+        """Forget the baseline and stop tracemalloc if it was started for it"""
+        with self.lock:
+            self.baseline = None
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        # Leave out tracemalloc's own bookkeeping
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+    def report(self, sizes: Dict[str, Dict[str, int]], diff: bool = False) -> Dict:
+        """`sizes` (owner -> structure -> bytes) with tracemalloc statistics,
+        plus the changes since the baseline when `diff` is set"""
+        report = {'owners': sizes, 'total': sum(owner['total'] for owner in sizes.values()),
+                  'tracemalloc': {'tracing': tracemalloc.is_tracing()}}
+        snapshot = None
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = self._snapshot()
+            report['tracemalloc'].update({
+                'traced_bytes': current,
+                'peak_bytes': peak,
+                'top': [self._stat(stat) for stat in snapshot.statistics('lineno')[:self.top]]
+            })
+
+        with self.lock:
+            baseline = self.baseline
+        if diff and baseline is not None:
+            report['diff'] = {
+                'owners': {owner: {name: size - baseline['sizes'].get(owner, {}).get(name, 0)
+                                   for name, size in structures.items()}
+                           for owner, structures in sizes.items()},
+                'removed_owners': sorted(baseline['sizes'].keys() - sizes.keys())
+            }
+            if snapshot is not None:
+                report['diff']['tracemalloc'] = [self._stat(stat, diff=True) for stat in
+                                                 snapshot.compare_to(baseline['snapshot'], 'lineno')[:self.top]]
+        return report
+
+    @staticmethod
+    def _stat(stat, diff: bool = False) -> Dict:
+        frame = stat.traceback[0]
+        entry = {'location': f"{frame.filename}:{frame.lineno}", 'bytes': stat.size, 'count': stat.count}
+        if diff:
+            entry.update({'bytes_diff': stat.size_diff, 'count_diff': stat.count_diff})
+        return entry
@@ -0,0 +1,214 @@
+"""Lock-free counters, gauges and histograms with Prometheus text output.
+
+Every thread updates its own shard of a metric, so recording a value never
+takes a lock or contends with other threads; ``render`` adds the shards up
+when the metrics are scraped. The shard of a thread that exits is folded
+into its metric's retired totals, so threads coming and going do not
+accumulate shards. Values are per process: with several worker processes
+each one reports its own.
+"""
+import abc
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+# Request latencies from half a millisecond to ten seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    """The metrics rendered together on one /metrics page"""
+
+    def __init__(self):
+        self.metrics: List['Metric'] = []
+
+    def register(self, metric: 'Metric'):
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(abc.ABC):
+    """Base class: a named metric whose samples are keyed by label values"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        if registry is not None:
+            registry.register(self)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """Lines of this metric in the Prometheus text format"""
+
+
+class _ShardHolder:
+    """A thread's shard of one metric, kept in the thread's local storage.
+    Dropped with that storage when the thread exits."""
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self):
+        self.shard: Dict = {}
+
+
+class ShardedMetric(Metric):
+    """A metric recorded into per-thread shards"""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self._local = threading.local()
+        # Guards the shard list and the retired totals, never taken to record a value
+        self._lock = threading.RLock()
+        # Shards of live threads by id, equal contents must not make shards interchangeable
+        self._shards: Dict[int, Dict] = {}
+        self._retired: Dict = {}
+
+    def _shard(self) -> Dict:
+        """This thread's values, only ever written by this thread"""
+        try:
+            return self._local.holder.shard
+        except AttributeError:
+            holder = self._local.holder = _ShardHolder()
+            with self._lock:
+                self._shards[id(holder.shard)] = holder.shard
+            weakref.finalize(holder, self._retire, holder.shard)
+            return holder.shard
+
+    def _retire(self, shard: Dict):
+        """Fold the shard of an exited thread into the retired totals"""
+        with self._lock:
+            self._fold(self._retired, shard)
+            del self._shards[id(shard)]
+
+    def _merged(self) -> Dict:
+        """Totals over the retired values and every live shard"""
+        with self._lock:
+            totals = dict(self._retired)
+            shards = list(self._shards.values())
+        for shard in shards:
+            self._fold(totals, dict(shard))
+        return totals
+
+    @abc.abstractmethod
+    def _fold(self, totals: Dict, shard: Dict):
+        """Add the values of a shard to `totals`, without changing the shard's values"""
+
+
+class Counter(ShardedMetric):
+    """A total that only goes up"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, labels: Tuple = ()):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def value(self, labels: Tuple = ()) -> float:
+        return self._merged().get(labels, 0)
+
+    def _fold(self, totals: Dict[Tuple, float], shard: Dict[Tuple, float]):
+        for labels, value in shard.items():
+            totals[labels] = totals.get(labels, 0) + value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(self._merged().items())]
+
+
+class Gauge(Metric):
+    """A value read when the metrics are scraped.
+
+    ``read`` returns either a number or a dict from label values to numbers.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, read: Callable[[], Union[float, Dict[Tuple, float]]],
+                 labelnames: Iterable[str] = (), registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(values.items())]
+
+
+class Histogram(ShardedMetric):
+    """Distribution of observed values over fixed buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Tuple = ()):
+        shard = self._shard()
+        # One count per bucket (the last one is +Inf), then the sum
+        counts = shard.get(labels)
+        if counts is None:
+            counts = shard[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, labels: Tuple = ()):
+        """Observe the duration of a block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labels)
+
+    def count(self, labels: Tuple = ()) -> int:
+        counts = self._merged().get(labels)
+        return sum(counts[:-1]) if counts else 0
+
+    def _fold(self, totals: Dict[Tuple, List[float]], shard: Dict[Tuple, List[float]]):
+        for labels, counts in shard.items():
+            counts = list(counts)
+            total = totals.get(labels)
+            totals[labels] = counts if total is None else [a + b for a, b in zip(total, counts)]
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, counts in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
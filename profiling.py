@@ -0,0 +1,176 @@
+"""On-demand profiling of a running worker.
+
+A ``Profiler`` is idle until ``start`` arms it for a number of seconds or
+requests, then writes one file to its directory and disarms itself:
+
+* ``sample`` mode runs a background thread that records the stacks of all
+  other threads every few milliseconds and writes them as collapsed stacks
+  (``profile-<pid>-<time>.folded``, one ``frame;frame;frame count`` line per
+  stack, the input format of flamegraph tools). Request threads run
+  untouched.
+* ``cprofile`` mode runs each request under its own ``cProfile.Profile``
+  and writes the merged statistics as a pstats file
+  (``profile-<pid>-<time>.pstats``, load it with ``pstats.Stats``).
+
+While idle the only cost is the ``request_started`` check of one attribute.
+"""
+import cProfile
+import math
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+MODES = ('sample', 'cprofile')
+SAMPLE_INTERVAL = 0.005
+# Captures never outlive this many seconds, whatever was asked for
+MAX_SECONDS = 300.0
+
+
+class ProfileCapture:
+    """One armed profiling run"""
+
+    def __init__(self, mode: str, path: str, seconds: Optional[float], requests: Optional[int]):
+        self.mode = mode
+        self.path = path
+        self.deadline = time.monotonic() + min(seconds if seconds is not None else MAX_SECONDS, MAX_SECONDS)
+        self.requests_left = requests
+        self.stats: Optional[pstats.Stats] = None
+        self.samples: Dict[str, int] = {}
+
+    def describe(self) -> Dict:
+        return {'mode': self.mode, 'path': self.path,
+                'seconds_left': max(self.deadline - time.monotonic(), 0.0),
+                'requests_left': self.requests_left}
+
+
+class Profiler:
+    """Arms and disarms profiling captures of this process"""
+
+    def __init__(self, directory: str, interval: float = SAMPLE_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.capture: Optional[ProfileCapture] = None
+        self.last_path: Optional[str] = None
+
+    def start(self, mode: str = 'sample', seconds: Optional[float] = None,
+              requests: Optional[int] = None) -> ProfileCapture:
+        """Arm a capture that ends after `seconds` or, in cprofile mode,
+        `requests` requests, whichever comes first (default 30 seconds)"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        if mode == 'sample' and requests is not None:
+            raise ValueError('Sampling captures are limited by seconds, not requests')
+        if seconds is not None and not (math.isfinite(seconds) and seconds > 0):
+            raise ValueError('Seconds must be a positive number')
+        if requests is not None and requests < 1:
+            raise ValueError('Requests must be at least 1')
+        if seconds is None and requests is None:
+            seconds = 30.0
+
+        with self.lock:
+            if self.capture is not None:
+                raise RuntimeError('A profile is already being captured')
+            os.makedirs(self.directory, exist_ok=True)
+            extension = 'folded' if mode == 'sample' else 'pstats'
+            path = os.path.join(self.directory, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+            capture = self.capture = ProfileCapture(mode, path, seconds, requests)
+
+        if mode == 'sample':
+            threading.Thread(target=self._sample, args=(capture,), name='profile-sampler', daemon=True).start()
+        else:
+            timer = threading.Timer(capture.deadline - time.monotonic(), self._finish, args=(capture,))
+            timer.daemon = True
+            timer.start()
+        return capture
+
+    def request_started(self) -> Optional[cProfile.Profile]:
+        """Start profiling the current request if a cprofile capture is armed"""
+        capture = self.capture
+        if capture is None or capture.mode != 'cprofile':
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler is active in this thread
+            return None
+        return profile
+
+    def request_finished(self, profile: cProfile.Profile):
+        """Add a finished request's profile to the capture"""
+        profile.disable()
+        with self.lock:
+            capture = self.capture
+            if capture is None or capture.mode != 'cprofile':
+                return  # Finished meanwhile
+            if capture.stats is None:
+                capture.stats = pstats.Stats(profile)
+            else:
+                capture.stats.add(profile)
+            if capture.requests_left is not None:
+                capture.requests_left -= 1
+                if capture.requests_left <= 0:
+                    self._write(capture)
+
+    def _sample(self, capture: ProfileCapture):
+        """Sampler thread: count the stacks of every other thread until the deadline"""
+        own = threading.get_ident()
+        samples = capture.samples
+        while self.capture is capture and time.monotonic() < capture.deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                samples[key] = samples.get(key, 0) + 1
+            time.sleep(self.interval)
+        self._finish(capture)
+
+    def _finish(self, capture: ProfileCapture):
+        with self.lock:
+            if self.capture is capture:
+                self._write(capture)
+
+    def _write(self, capture: ProfileCapture):
+        """Write the capture's file and disarm (lock held)"""
+        self.capture = None
+        if capture.mode == 'sample':
+            with open(capture.path, 'w') as f:
+                # A copy: after stop() the sampler may still be adding its last sample
+                for stack, count in sorted(dict(capture.samples).items()):
+                    f.write(f"{stack} {count}\n")
+        elif capture.stats is not None:
+            capture.stats.dump_stats(capture.path)
+        else:
+            return  # No request was profiled, there is nothing to write
+        self.last_path = capture.path
+
+    def stop(self) -> Optional[str]:
+        """End the armed capture early and return the path written, if any"""
+        with self.lock:
+            capture = self.capture
+            if capture is None:
+                return None
+            self._write(capture)
+            return self.last_path if self.last_path == capture.path else None
+
+    def install_signal_handler(self, signum: int, seconds: float = 30.0):
+        """Start a sampling capture when the process receives `signum` (main thread only)"""
+        def start():
+            try:
+                self.start('sample', seconds=seconds)
+            except RuntimeError:
+                pass  # Already capturing
+
+        def handler(received, frame):
+            # The interrupted code may hold self.lock, start from another thread
+            threading.Thread(target=start, name='profile-signal', daemon=True).start()
+        signal.signal(signum, handler)
@@ -2,11 +2,30 @@
 import unittest
 import sys
 import os
+import gc
+import gzip
+import io
+import json
+import pstats
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
 
 # Add the parent directory to the path to import the app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import AircraftSeatingSystem, Passenger, Group, SeatType, SeatClass, PassengerType
+import benchmarks
+import load_replay
+from app import (AircraftSeatingSystem, Passenger, Group, SeatType, SeatClass, PassengerType,
+                 CabinSpec, DEFAULT_LAYOUT, LayoutSpec, compile_layout, EventChannel, FlightRegistry, FlightStateFile, PassengerIndex,
+                 SharedFlightStore, app,
+                 export_manifest, flight_registry, SEATS_ASSIGNED, SSE_MAX_STREAMS, SSE_RETRY_SECONDS)
+from journal import Journal
+from memory import deep_sizeof, shared_ids, structure_sizes
+from metrics import Counter, Gauge, Histogram, Metric, Registry
+from profiling import Profiler
 
 
 class TestAircraftSeatingSystem(unittest.TestCase):
@@ -571,6 +590,1993 @@ class TestAircraftSeatingSystem(unittest.TestCase):
         # Should use reasonable number of rows
         self.assertLessEqual(len(rows_used), 3, "Group unnecessarily scattered")
 
+    # ====================================
+    # TDD CYCLE 12: AVAILABILITY INDEX
+    # ====================================
+
+    def assertIndexMatchesSeats(self):
+        """Helper: the bitset index must mirror a full scan of the seats"""
+        index = self.seating_system.index
+        for (row, letter), seat in self.seating_system.seats.items():
+            bit = 1 << index.ordinals[(row, letter)]
+            is_free = seat.is_available and seat.passenger_id is None
+            self.assertEqual(bool(index.free & bit), is_free, f"Free bit stale for {row}{letter}")
+            self.assertEqual(bool(index.occupied & bit), seat.passenger_id is not None,
+                             f"Occupied bit stale for {row}{letter}")
+
+    def test_index_tracks_seat_changes(self):
+        """
+        TDD Test 21: Availability index stays in sync with every seat mutation
+        GREEN: Verify assign, override, cancel and reset keep the bitsets current
+        """
+        # Arrange
+        for i in range(10):
+            self.seating_system.add_solo_passenger(f"Passenger {i}", 30, is_vip=(i % 3 == 0))
+        self.seating_system.add_group("Index Family", 4)
+
+        # Act & Assert
+        self.seating_system.assign_seats()
+        self.assertIndexMatchesSeats()
+
+        passengers = list(self.seating_system.passengers.values())
+        target_row, target_letter = passengers[1].assigned_seat
+        self.seating_system.admin_override(passengers[0].id, target_row, target_letter)
+        self.assertIndexMatchesSeats()
+
+        self.seating_system.cancel_booking(passengers[2].id)
+        self.assertIndexMatchesSeats()
+
+        self.seating_system.reset_system()
+        self.assertIndexMatchesSeats()
+
+    def test_index_lowest_bit_matches_scan_order(self):
+        """
+        TDD Test 22: Lowest set bit selects the same seat as a dict scan
+        GREEN: Verify bitset selection preserves first-fit ordering
+        """
+        index = self.seating_system.index
+        expected = next((row, letter) for (row, letter), seat in self.seating_system.seats.items()
+                        if seat.is_available and seat.passenger_id is None and not seat.is_vip_zone)
+
+        self.assertEqual(index.first(index.free & ~index.vip_zone), expected)
+        self.assertIsNone(index.first(0))
+
+    # ====================================
+    # TDD CYCLE 13: CONTIGUOUS GROUP RUNS
+    # ====================================
+
+    def test_group_seats_are_contiguous(self):
+        """
+        TDD Test 23: Group members sit in side-by-side seats
+        GREEN: Verify runs never skip an occupied or missing seat
+        """
+        # Arrange - Break up the first non-VIP economy rows
+        self.seating_system.add_solo_passenger("Blocker", 30)
+        blocker = list(self.seating_system.passengers.values())[0]
+        self.seating_system.admin_override(blocker.id, 7, 'C')
+        self.seating_system.add_group("Contiguous Family", 4)
+
+        # Act
+        self.seating_system.assign_seats()
+
+        # Assert
+        group = list(self.seating_system.groups.values())[0]
+        seats = sorted(member.assigned_seat for member in group.members)
+        self.assertEqual(len({row for row, _ in seats}), 1)
+        letter_positions = [ord(letter) for _, letter in seats]
+        self.assertEqual(letter_positions, list(range(letter_positions[0], letter_positions[0] + 4)),
+                         "Group seats are not contiguous")
+
+    def _add_blocker(self):
+        """Helper: add a passenger used to occupy a chosen seat"""
+        self.seating_system.add_solo_passenger("Blocker", 30)
+        return list(self.seating_system.passengers)[-1]
+
+    def test_run_index_prefers_smallest_fitting_run(self):
+        """
+        TDD Test 24: Best-fit lookup picks the shortest run that fits
+        GREEN: Verify the run index answers best-fit queries
+        """
+        run_index = self.seating_system.run_index
+        self.seating_system.admin_override(self._add_blocker(), 20, 'D')
+
+        # Brute force: shortest run of at least three seats, lowest row first
+        length, row, start = min((length, row, start)
+                                 for row, runs in run_index.row_runs.items()
+                                 for start, length, _, _ in runs if length >= 3)
+        self.assertEqual(run_index.best_fit(3), list(run_index.row_keys[row][start:start + 3]))
+
+        # Non-VIP groups never get VIP seats, children never get quiet seats
+        for key in run_index.best_fit(3, allow_vip=False, allow_quiet=False):
+            seat = self.seating_system.seats[key]
+            self.assertFalse(seat.is_vip_zone)
+            self.assertFalse(seat.is_quiet_zone)
+
+        self.assertIsNone(run_index.best_fit(run_index.max_length + 1))
+
+    # ====================================
+    # TDD CYCLE 14: INCREMENTAL ASSIGNMENT
+    # ====================================
+
+    def test_assign_only_processes_pending_passengers(self):
+        """
+        TDD Test 28: Repeated assign calls only touch new bookings
+        GREEN: Verify dirty tracking and the assignment summary
+        """
+        # Arrange
+        self.seating_system.add_solo_passenger("Early", 30)
+        self.seating_system.add_group("Early Family", 3)
+        first = self.seating_system.assign_seats()
+
+        # Act
+        idle = self.seating_system.assign_seats()
+        self.seating_system.add_solo_passenger("Late", 40)
+        late = self.seating_system.assign_seats()
+
+        # Assert
+        self.assertEqual(first.processed, 4)
+        self.assertEqual(len(first.assigned), 4)
+        self.assertTrue(idle)
+        self.assertEqual(idle.processed, 0)
+        self.assertEqual(late.processed, 1)
+        late_passenger = next(p for p in self.seating_system.passengers.values() if p.name == "Late")
+        self.assertEqual(list(late.assigned), [late_passenger.id])
+
+    def test_displaced_passenger_reassigned_incrementally(self):
+        """
+        TDD Test 29: Override displacements are picked up by the next pass
+        GREEN: Verify displaced passengers are marked pending
+        """
+        # Arrange
+        self.seating_system.add_solo_passenger("Mover", 30)
+        self.seating_system.add_solo_passenger("Displaced", 25)
+        self.seating_system.assign_seats()
+        mover, displaced = list(self.seating_system.passengers.values())
+        target_row, target_letter = displaced.assigned_seat
+
+        # Act
+        self.seating_system.admin_override(mover.id, target_row, target_letter)
+        summary = self.seating_system.assign_seats()
+
+        # Assert
+        self.assertIn(displaced.id, summary.assigned)
+        self.assertIsNotNone(displaced.assigned_seat)
+        self.assertNotIn(displaced.id, self.seating_system.waiting_list)
+
+    # ====================================
+    # TDD CYCLE 15: PRIORITY WAITING LIST
+    # ====================================
+
+    def test_waiting_list_priority_order(self):
+        """
+        TDD Test 30: Waiting list orders VIP, accessibility, senior, then arrival
+        GREEN: Verify priority queue ordering
+        """
+        # Arrange
+        waiting_list = self.seating_system.waiting_list
+        regular = Passenger("p1", "Regular", 30, PassengerType.SOLO)
+        senior = Passenger("p2", "Senior", 70, PassengerType.SOLO, is_senior=True)
+        accessible = Passenger("p3", "Accessible", 40, PassengerType.SOLO, has_accessibility_needs=True)
+        vip = Passenger("p4", "VIP", 50, PassengerType.SOLO, is_vip=True)
+
+        # Act
+        for passenger in (regular, senior, accessible, vip, regular):
+            waiting_list.add(passenger)
+        waiting_list.remove("p2")
+
+        # Assert
+        self.assertEqual(list(waiting_list), ["p4", "p3", "p1"])
+        self.assertEqual(len(waiting_list), 3)
+        self.assertEqual(waiting_list.peek(), "p4")
+        self.assertEqual(waiting_list.peek(vip_only=True), "p4")
+
+    def test_cancellation_backfills_eligible_passenger(self):
+        """
+        TDD Test 31: A freed seat goes only to a waitlisted passenger allowed to take it
+        GREEN: Verify targeted backfill on cancellation
+        """
+        # Arrange - Fill every seat a regular passenger may use
+        for i in range(200):
+            self.seating_system.add_solo_passenger(f"Passenger {i}", 30)
+        self.seating_system.add_solo_passenger("VIP Guest", 45, is_vip=True)
+        self.seating_system.assign_seats()
+
+        vip = next(p for p in self.seating_system.passengers.values() if p.is_vip)
+        regular = next(p for p in self.seating_system.passengers.values()
+                       if not p.is_vip and p.assigned_seat)
+        waiting_before = len(self.seating_system.waiting_list)
+        freed_seat = regular.assigned_seat
+
+        # Act - Free a VIP zone seat, then a regular seat
+        self.seating_system.cancel_booking(vip.id)
+        self.assertEqual(len(self.seating_system.waiting_list), waiting_before)
+        self.seating_system.cancel_booking(regular.id)
+
+        # Assert
+        self.assertEqual(len(self.seating_system.waiting_list), waiting_before - 1)
+        backfilled = self.seating_system.seats[freed_seat]
+        self.assertIsNotNone(backfilled.passenger_id)
+
+    # ====================================
+    # TDD CYCLE 16: COMPILED AIRCRAFT LAYOUTS
+    # ====================================
+
+    def test_layout_template_compiled_once(self):
+        """
+        TDD Test 32: Flights share one compiled layout template
+        GREEN: Verify templates are cached per spec
+        """
+        other = AircraftSeatingSystem()
+
+        self.assertIs(self.seating_system.layout, other.layout)
+        self.assertIs(compile_layout(DEFAULT_LAYOUT), other.layout)
+        self.assertEqual(len(self.seating_system.seats), len(other.layout.keys))
+
+    def test_aisle_breaks_seat_adjacency(self):
+        """
+        TDD Test 33: Seats across an aisle are not neighbours
+        GREEN: Verify split checks read the compiled neighbour tables
+        """
+        # Arrange - Occupy 10B and 10D around aisle seat 10C, and 10D/10F around 10E
+        for letter in ('B', 'D', 'F'):
+            self.seating_system.admin_override(self._add_blocker(), 10, letter)
+
+        # Assert
+        self.assertFalse(self.seating_system._would_split_group(10, 'C'))
+        self.assertTrue(self.seating_system._would_split_group(10, 'E'))
+
+    def test_alternative_fleet_layout(self):
+        """
+        TDD Test 34: Other fleet types instantiate from their own template
+        GREEN: Verify named layouts and rejection of unknown ones
+        """
+        regional = AircraftSeatingSystem(layout='regional')
+        regional.add_group("Regional Family", 3)
+        regional.add_solo_passenger("Regional Solo", 30)
+        regional.assign_seats()
+
+        self.assertEqual(regional.layout.name, 'regional')
+        self.assertTrue(all(p.assigned_seat for p in regional.passengers.values()))
+        self.assertNotIn((1, 'B'), regional.seats)
+        with self.assertRaises(ValueError):
+            AircraftSeatingSystem(layout='concorde')
+
+    def test_groups_keep_to_one_side_of_the_aisle(self):
+        """
+        TDD Test 101: Unless the layout allows it, groups are not seated across an aisle
+        GREEN: Verify a family of four takes the centre block of a 3-4-3 row
+        """
+        widebody = LayoutSpec(name='widebody', cabins=(
+            CabinSpec(SeatClass.ECONOMY, rows=range(10, 30), letters='ABCDEFGHJK', aisles_after='CG'),
+        ))
+        system = AircraftSeatingSystem(layout=widebody, seat_backend=self.seating_system.seat_backend)
+        system.add_group("Widebody Family", 4)
+
+        system.assign_seats()
+
+        group, = system.groups.values()
+        seats = sorted(member.assigned_seat for member in group.members)
+        self.assertFalse(widebody.groups_span_aisle)
+        self.assertTrue(DEFAULT_LAYOUT.groups_span_aisle)
+        self.assertEqual(len({row for row, _ in seats}), 1)
+        self.assertEqual([letter for _, letter in seats], ['D', 'E', 'F', 'G'])
+
+    # ====================================
+    # TDD CYCLE 17: COST-BASED OPTIMIZER
+    # ====================================
+
+    def test_optimizer_respects_constraints(self):
+        """
+        TDD Test 39: Optimized assignment honours zones and preferences
+        GREEN: Verify the min-cost assignment mode
+        """
+        # Arrange
+        for i in range(30):
+            self.seating_system.add_solo_passenger(f"Passenger {i}", 8 if i % 5 == 0 else 35,
+                                                   is_vip=(i % 10 == 1),
+                                                   has_accessibility_needs=(i % 10 == 2))
+
+        # Act
+        summary = self.seating_system.assign_seats(optimize=True)
+
+        # Assert
+        self.assertEqual(len(summary.assigned), 30)
+        for passenger in self.seating_system.passengers.values():
+            seat = self.seating_system.seats[passenger.assigned_seat]
+            self.assertEqual(seat.is_vip_zone, passenger.is_vip, f"{passenger.name} in wrong zone")
+            self.assertNotEqual(seat.seat_type, SeatType.MIDDLE, f"{passenger.name} in middle seat")
+            if passenger.has_accessibility_needs:
+                self.assertTrue(seat.is_accessible)
+            if passenger.age < 12:
+                self.assertFalse(seat.is_quiet_zone)
+
+    def test_optimizer_prioritises_when_over_capacity(self):
+        """
+        TDD Test 40: When seats run out, priority passengers are seated first
+        GREEN: Verify waitlisting follows the unseated cost
+        """
+        # Arrange - Regular passengers booked first, seniors last
+        for i in range(200):
+            self.seating_system.add_solo_passenger(f"Passenger {i}", 30)
+        for i in range(5):
+            self.seating_system.add_solo_passenger(f"Senior {i}", 75, is_senior=True)
+
+        # Act
+        self.seating_system.assign_seats(optimize=True)
+
+        # Assert
+        seniors = [p for p in self.seating_system.passengers.values() if p.is_senior]
+        self.assertTrue(all(p.assigned_seat for p in seniors))
+        self.assertGreater(len(self.seating_system.waiting_list), 0)
+
+    def test_optimizer_falls_back_when_out_of_time(self):
+        """
+        TDD Test 41: An exhausted time budget still seats everyone first-fit
+        GREEN: Verify the time budget fallback
+        """
+        for i in range(10):
+            self.seating_system.add_solo_passenger(f"Passenger {i}", 30)
+
+        summary = self.seating_system.assign_seats(optimize=True, time_budget=0)
+
+        self.assertEqual(len(summary.assigned), 10)
+
+    def test_assign_route_validates_time_budget(self):
+        """
+        TDD Test 85: The assign route rejects a time budget that is not a non-negative number
+        """
+        client = app.test_client()
+        client.post('/api/flights/TB100/reset-system', json={})
+        client.post('/api/flights/TB100/add-solo-passenger', json={'name': 'Budgeted', 'age': 30})
+
+        for budget in ('soon', -1, True, [1]):
+            response = client.post('/api/flights/TB100/assign-seats', json={'optimize': True, 'time_budget': budget})
+            self.assertEqual(response.status_code, 400, budget)
+            self.assertFalse(response.get_json()['success'])
+
+        response = client.post('/api/flights/TB100/assign-seats', json={'optimize': True, 'time_budget': 0.5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['summary']['assigned']), 1)
+
+    # ====================================
+    # TDD CYCLE 18: GROUP PACKING ACROSS ROWS
+    # ====================================
+
+    def test_group_split_across_adjacent_rows(self):
+        """
+        TDD Test 42: A group with no single-row run sits in adjacent rows
+        GREEN: Verify the DP split keeps the group in consecutive rows
+        """
+        # Arrange - Break every non-VIP row into runs shorter than five
+        for row in (7, 8):
+            self.seating_system.admin_override(self._add_blocker(), row, 'C')
+        for row in range(9, 31):
+            self.seating_system.admin_override(self._add_blocker(), row, 'D')
+        self.seating_system.add_group("Split Family", 5)
+
+        # Act
+        self.seating_system.assign_seats()
+
+        # Assert
+        group, = self.seating_system.groups.values()
+        seats = [member.assigned_seat for member in group.members]
+        self.assertTrue(all(seats), "Every member should be seated")
+        rows = sorted({row for row, _ in seats})
+        self.assertEqual(len(rows), 2, "Group should use exactly two rows")
+        self.assertEqual(rows[1] - rows[0], 1, "Rows should be adjacent")
+        self.assertEqual(self.seating_system.layout.row_cabins[rows[0]],
+                         self.seating_system.layout.row_cabins[rows[1]])
+
+    def test_batch_packing_never_double_books(self):
+        """
+        TDD Test 43: Packing many groups fills the cabin without conflicts
+        GREEN: Verify best-fit decreasing batch packing
+        """
+        for i in range(40):
+            self.seating_system.add_group(f"Group {i}", 2 + i % 5)
+
+        self.seating_system.assign_seats()
+
+        members = [m for g in self.seating_system.groups.values() for m in g.members]
+        seated = [m.assigned_seat for m in members if m.assigned_seat]
+        self.assertEqual(len(seated), len(set(seated)), "No seat may be booked twice")
+        self.assertEqual(len(seated) + len(self.seating_system.waiting_list), len(members))
+        for seat_id in seated:
+            self.assertFalse(self.seating_system.seats[seat_id].is_vip_zone)
+
+    # ====================================
+    # TDD CYCLE 19: THREAD SAFETY
+    # ====================================
+
+    def test_cabins_lock_independently(self):
+        """
+        TDD Test 47: A booking in one cabin does not wait for another cabin
+        GREEN: Verify per-cabin locking
+        """
+        self.seating_system.add_solo_passenger("First Class", 40, is_vip=True)
+        passenger_id = list(self.seating_system.passengers)[-1]
+        free_first = next(key for key, seat in self.seating_system.seats.items()
+                          if seat.seat_class == SeatClass.FIRST and seat.is_available)
+        economy = self.seating_system.layout.row_cabins[20]
+
+        # Another thread holds the economy cabin
+        held, release = threading.Event(), threading.Event()
+        def hold_economy():
+            with self.seating_system.cabin_locks[economy]:
+                held.set()
+                release.wait(5)
+        holder = threading.Thread(target=hold_economy)
+        holder.start()
+        held.wait(5)
+        try:
+            done = threading.Event()
+            worker = threading.Thread(
+                target=lambda: done.set() if self.seating_system.admin_override(passenger_id, *free_first) else None)
+            worker.start()
+            self.assertTrue(done.wait(2), "First class override blocked by the economy lock")
+        finally:
+            release.set()
+            holder.join()
+            worker.join()
+
+    def test_stale_seat_version_rejected(self):
+        """
+        TDD Test 48: An assignment based on an outdated view of a seat fails
+        GREEN: Verify the optimistic per-seat version check
+        """
+        self.seating_system.add_solo_passenger("Late", 30)
+        late = self.seating_system.passengers[list(self.seating_system.passengers)[-1]]
+        # Some seats start out unavailable at random, use two that are free
+        (row, letter), (other_row, other_letter) = [seat_id for seat_id, seat in self.seating_system.seats.items()
+                                                    if seat.is_available and seat_id[0] >= 20][:2]
+        ordinal = self.seating_system.layout.ordinals[(row, letter)]
+        version = self.seating_system.seat_versions[ordinal]
+
+        # The seat is taken and released again by someone else
+        blocker = self._add_blocker()
+        self.seating_system.admin_override(blocker, row, letter)
+        self.seating_system.admin_override(blocker, other_row, other_letter)
+
+        self.assertFalse(self.seating_system._assign_seat_to_passenger(late, row, letter, expected_version=version))
+        self.assertTrue(self.seating_system._assign_seat_to_passenger(
+            late, row, letter, expected_version=self.seating_system.seat_versions[ordinal]))
+
+    def test_concurrent_bookings_stay_consistent(self):
+        """
+        TDD Test 49: Concurrent overrides and cancellations never double book
+        GREEN: Verify seats, passengers and indexes agree after a threaded run
+        """
+        # Arrange
+        for i in range(120):
+            self.seating_system.add_solo_passenger(f"Passenger {i}", 30, is_vip=(i % 6 == 0))
+        self.seating_system.assign_seats()
+        passenger_ids = list(self.seating_system.passengers)
+        seat_keys = list(self.seating_system.seats)
+
+        def book(worker):
+            rng = random.Random(worker)
+            for _ in range(150):
+                passenger_id = rng.choice(passenger_ids)
+                if rng.random() < 0.1:
+                    self.seating_system.cancel_booking(passenger_id)
+                else:
+                    self.seating_system.admin_override(passenger_id, *rng.choice(seat_keys))
+
+        # Act
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            workers = [threading.Thread(target=book, args=(i,)) for i in range(6)]
+            for worker in workers:
+                worker.start()
+            self.seating_system.assign_seats(full=True)
+            for worker in workers:
+                worker.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        # Assert
+        for passenger in self.seating_system.passengers.values():
+            if passenger.assigned_seat:
+                self.assertEqual(self.seating_system.seats[passenger.assigned_seat].passenger_id, passenger.id)
+        for key, seat in self.seating_system.seats.items():
+            if seat.passenger_id:
+                self.assertEqual(self.seating_system.passengers[seat.passenger_id].assigned_seat, key)
+        self.assertIndexMatchesSeats()
+
+    # ====================================
+    # TDD CYCLE 20: MVCC READ SNAPSHOTS
+    # ====================================
+
+    def test_snapshot_published_on_commit(self):
+        """
+        TDD Test 50: Every committed mutation publishes a matching snapshot
+        GREEN: Verify snapshots mirror the live state
+        """
+        version = self.seating_system.snapshot.version
+
+        self.seating_system.add_solo_passenger("Snapshot", 30)
+        self.seating_system.add_group("Snapshot Family", 3)
+        self.seating_system.assign_seats()
+
+        snapshot = self.seating_system.snapshot
+        self.assertEqual(snapshot.version, version + 3)
+        self.assertEqual(snapshot.seating_layout, self.seating_system.get_seating_layout())
+        self.assertEqual(snapshot.passenger_list(), self.seating_system.get_passenger_list())
+        self.assertEqual(list(snapshot.waiting_list), list(self.seating_system.waiting_list))
+
+    def test_snapshots_share_unchanged_rows(self):
+        """
+        TDD Test 51: A new snapshot only rebuilds what changed
+        GREEN: Verify structural sharing and immutability of old snapshots
+        """
+        self.seating_system.add_solo_passenger("Mover", 30)
+        self.seating_system.add_solo_passenger("Stayer", 30)
+        self.seating_system.assign_seats()
+        mover, stayer = list(self.seating_system.passengers)
+        before = self.seating_system.snapshot
+        old_row = before.passengers[mover]['assigned_seat'][0]
+
+        self.seating_system.admin_override(mover, 20, 'A')
+
+        after = self.seating_system.snapshot
+        for row, seats in after.seating_layout.items():
+            if row in (20, old_row):
+                self.assertIsNot(seats, before.seating_layout[row])
+            else:
+                self.assertIs(seats, before.seating_layout[row])
+        self.assertIs(after.passengers[stayer], before.passengers[stayer])
+        self.assertIsNone(before.seating_layout[20]['A']['passenger_id'])
+        self.assertEqual(after.seating_layout[20]['A']['passenger_id'], mover)
+
+    def test_readers_do_not_wait_for_writers(self):
+        """
+        TDD Test 52: Layout polling is served while a long batch holds the flight
+        GREEN: Verify GET routes read the published snapshot without locks
+        """
+        client = app.test_client()
+        client.post('/api/flights/MV100/add-solo-passenger', json={'name': 'Reader', 'age': 30})
+        flight = flight_registry.get('MV100')
+
+        held, release = threading.Event(), threading.Event()
+        def long_batch():
+            with flight._exclusive():
+                held.set()
+                release.wait(5)
+        writer = threading.Thread(target=long_batch)
+        writer.start()
+        held.wait(5)
+        try:
+            responses = []
+            reader = threading.Thread(target=lambda: responses.extend([
+                client.get('/api/flights/MV100/seating-layout'),
+                client.get('/api/flights/MV100/passenger-list')]))
+            reader.start()
+            reader.join(2)
+            self.assertFalse(reader.is_alive(), "Readers blocked by a writer")
+            self.assertEqual([r.status_code for r in responses], [200, 200])
+            self.assertEqual(responses[1].get_json()['passengers'][0]['name'], 'Reader')
+        finally:
+            release.set()
+            writer.join()
+
+    # ====================================
+    # TDD CYCLE 21: VERSIONED SEAT MAP
+    # ====================================
+
+    def test_layout_version_tracks_seat_changes_only(self):
+        """
+        TDD Test 58: The layout version moves only when a seat changes
+        GREEN: Verify passenger-only commits keep the version
+        """
+        version = self.seating_system.snapshot.layout_version
+
+        self.seating_system.add_solo_passenger("Versioned", 30)
+        self.assertEqual(self.seating_system.snapshot.layout_version, version)
+
+        self.seating_system.assign_seats()
+        self.assertEqual(self.seating_system.snapshot.layout_version, version + 1)
+
+    def test_layout_changes_rebuild_seat_map(self):
+        """
+        TDD Test 59: Merged changes turn an old seat map into the current one
+        GREEN: Verify the change history and its fallbacks
+        """
+        base = self.seating_system.snapshot
+        old_layout = {row: dict(seats) for row, seats in base.seating_layout.items()}
+        for i in range(10):
+            self.seating_system.add_solo_passenger(f"Passenger {i}", 30)
+        self.seating_system.assign_seats()
+        self.seating_system.admin_override("solo_1", 20, 'C')
+
+        update = self.seating_system.layout_changes_since(base.layout_version, base.layout_epoch)
+        self.assertFalse(update['full'])
+        self.assertEqual(sum(len(seats) for seats in update['changes'].values()), 11)
+        for row, seats in update['changes'].items():
+            old_layout[row].update(seats)
+        self.assertEqual(old_layout, self.seating_system.get_seating_layout())
+
+        current = self.seating_system.snapshot.layout_version
+        self.assertEqual(self.seating_system.layout_changes_since(current)['changes'], {})
+        self.assertTrue(self.seating_system.layout_changes_since(current + 1)['full'])
+        self.assertTrue(self.seating_system.layout_changes_since(0, epoch='other')['full'])
+
+    def test_layout_change_history_is_bounded(self):
+        """
+        TDD Test 60: Versions older than the ring buffer get the full seat map
+        """
+        self.seating_system.add_solo_passenger("Mover", 30)
+        history = self.seating_system.layout_changes.maxlen
+        for i in range(history + 5):
+            self.seating_system.admin_override("solo_1", 20 + i % 2, 'C')
+
+        self.assertEqual(len(self.seating_system.layout_changes), history)
+        self.assertTrue(self.seating_system.layout_changes_since(1)['full'])
+
+    def test_seating_layout_etag(self):
+        """
+        TDD Test 61: Unchanged seat maps are answered with 304 Not Modified
+        """
+        client = app.test_client()
+        first = client.get('/api/flights/ET100/seating-layout')
+        etag = first.headers['ETag']
+
+        unchanged = client.get('/api/flights/ET100/seating-layout', headers={'If-None-Match': etag})
+        client.post('/api/flights/ET100/add-solo-passenger', json={'name': 'Tagged', 'age': 30})
+        still_unchanged = client.get('/api/flights/ET100/seating-layout', headers={'If-None-Match': etag})
+        client.post('/api/flights/ET100/assign-seats', json={})
+        changed = client.get('/api/flights/ET100/seating-layout', headers={'If-None-Match': etag})
+
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.data, b'')
+        self.assertEqual(still_unchanged.status_code, 304)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+        changes = client.get('/api/flights/ET100/seating-layout/changes?since=abc')
+        self.assertEqual(changes.status_code, 400)
+
+    # ====================================
+    # TDD CYCLE 22: LIVE EVENT STREAM
+    # ====================================
+
+    def test_event_channel_fans_out_serialized_events(self):
+        """
+        TDD Test 62: Every subscriber gets the same serialized event
+        GREEN: Verify fan-out, keep-alives and subscribers that fell behind
+        """
+        channel = EventChannel(history=3)
+        streams = [channel.subscribe(0, timeout=0.01) for _ in range(3)]
+
+        channel.publish('seats', {'row': 1})
+        payloads = [next(stream) for stream in streams]
+
+        self.assertTrue(all(payload is payloads[0] for payload in payloads))
+        self.assertEqual(payloads[0], f'id: {channel.epoch}-1\nevent: seats\ndata: {{"row":1}}\n\n'.encode())
+        self.assertIsNone(next(streams[0]))
+        self.assertEqual(channel.subscribers, 3)
+
+        for i in range(5):
+            channel.publish('seats', {'row': i})
+        with self.assertRaises(LookupError):
+            next(streams[1])
+        for stream in streams:
+            stream.close()
+        self.assertEqual(channel.subscribers, 0)
+
+    def test_commits_publish_seat_and_passenger_events(self):
+        """
+        TDD Test 63: Commits push only what changed to subscribers
+        """
+        events = self.seating_system.events
+        stream = events.subscribe(events.sequence, timeout=0.01)
+        self.assertIsNone(next(stream))  # Subscribed
+
+        self.seating_system.add_solo_passenger("Streamed", 30)
+        self.seating_system.assign_seats()
+        received = [next(stream) for _ in range(3)]
+        stream.close()
+
+        kinds = [payload.split(b'\n')[1] for payload in received]
+        self.assertEqual(kinds, [b'event: passengers', b'event: seats', b'event: passengers'])
+        seats = json.loads(received[1].split(b'data: ')[1])
+        row, letter = self.seating_system.passengers['solo_1'].assigned_seat
+        self.assertEqual(seats['version'], self.seating_system.snapshot.layout_version)
+        self.assertEqual(seats['changes'], {str(row): {letter: self.seating_system.get_seating_layout()[row][letter]}})
+        passengers = json.loads(received[2].split(b'data: ')[1])
+        self.assertEqual([p['assigned_seat'] for p in passengers['updated']], [[row, letter]])
+        self.assertEqual(passengers['removed'], [])
+
+    def test_event_stream_resets_then_resumes(self):
+        """
+        TDD Test 64: New subscribers get the full state, reconnecting ones resume
+        """
+        client = app.test_client()
+        client.post('/api/flights/EV100/reset-system', json={})
+        client.post('/api/flights/EV100/add-solo-passenger', json={'name': 'Live', 'age': 30})
+
+        response = client.get('/api/flights/EV100/events')
+        first = next(iter(response.response))
+        response.close()
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertIn(b'event: reset', first)
+        reset = json.loads(first.split(b'data: ')[1])
+        self.assertEqual([p['name'] for p in reset['passengers']], ['Live'])
+        self.assertEqual(reset['layout'], json.loads(json.dumps(flight_registry.get('EV100').get_seating_layout())))
+
+        # Another page stays connected, so the events are logged while this one is away
+        events = flight_registry.get('EV100').events
+        listener = events.subscribe(events.sequence, timeout=0.01)
+        next(listener)
+        flight_registry.get('EV100').add_solo_passenger("Later", 30)
+        last_id = first.split(b'\n')[0][len(b'id: '):].decode()
+        response = client.get('/api/flights/EV100/events', headers={'Last-Event-ID': last_id})
+        resumed = next(iter(response.response))
+        response.close()
+        listener.close()
+        self.assertIn(b'event: passengers', resumed)
+        self.assertIn(b'"Later"', resumed)
+
+    def test_event_streams_are_capped_per_worker(self):
+        """
+        TDD Test 90: Streams beyond the per-worker limit are turned away with a retry delay
+        """
+        client = app.test_client()
+        streams = [client.get('/api/flights/EV200/events') for _ in range(SSE_MAX_STREAMS)]
+        self.assertTrue(all(response.status_code == 200 for response in streams))
+
+        refused = client.get('/api/flights/EV200/events')
+        self.assertEqual(refused.status_code, 503)
+        self.assertEqual(refused.headers['Retry-After'], str(SSE_RETRY_SECONDS))
+        self.assertIn(b'retry: ', refused.data)
+
+        streams.pop().close()
+        response = client.get('/api/flights/EV200/events')
+        self.assertEqual(response.status_code, 200)
+        for response in streams + [response]:
+            response.close()
+
+    # ====================================
+    # TDD CYCLE 23: PRE-SERIALIZED SEAT MAP
+    # ====================================
+
+    def test_serialized_rows_follow_seat_changes(self):
+        """
+        TDD Test 65: Cached row JSON matches the seat map and is only rebuilt for changed rows
+        """
+        self.seating_system.add_solo_passenger("Serialized", 30)
+        before = self.seating_system.snapshot
+        self.seating_system.admin_override("solo_1", 20, 'C')
+        after = self.seating_system.snapshot
+
+        expected = json.loads(json.dumps(self.seating_system.get_seating_layout()))
+        self.assertEqual(json.loads(after.seating_layout_json), expected)
+        self.assertIsNot(after.row_json[20], before.row_json[20])
+        self.assertIs(after.row_json[21], before.row_json[21])
+        self.assertIs(after.row_occupancy[21], before.row_occupancy[21])
+
+    def test_compact_seat_map_format(self):
+        """
+        TDD Test 66: The compact format sends occupancy only, static attributes come once
+        """
+        client = app.test_client()
+        client.post('/api/flights/CP100/reset-system', json={})
+        client.post('/api/flights/CP100/add-solo-passenger', json={'name': 'Compact', 'age': 30})
+        client.post('/api/flights/CP100/assign-seats', json={})
+
+        seats = client.get('/api/flights/CP100/aircraft-layout').get_json()['seats']
+        full = client.get('/api/flights/CP100/seating-layout')
+        compact = client.get('/api/flights/CP100/seating-layout?format=compact')
+        occupancy = compact.get_json()['seats']
+
+        self.assertEqual(len(occupancy), len(seats))
+        layout = full.get_json()
+        for (row, letter, seat_class, *_), item in zip(seats, occupancy):
+            info = layout[str(row)][letter]
+            self.assertEqual(info['seat_class'], seat_class)
+            if info['passenger_id']:
+                self.assertEqual(item, [info['passenger_id'], info['passenger_name']])
+            else:
+                self.assertEqual(item, 0 if info['is_available'] else 1)
+        self.assertIn([12, 'B', 'economy', 'middle', False, False, False], seats)
+        booked, = client.get('/api/flights/CP100/passenger-list?fields=id').get_json()['passengers']
+        self.assertIn([booked['id'], 'Compact'], occupancy)
+        self.assertNotEqual(compact.headers['ETag'], full.headers['ETag'])
+        self.assertLess(len(compact.data), len(full.data) // 5)
+
+    # ====================================
+    # TDD CYCLE 24: BULK IMPORT
+    # ====================================
+
+    def test_import_validates_records_and_commits_once(self):
+        """
+        TDD Test 67: A bulk import applies the add_* rules and publishes one snapshot
+        """
+        version = self.seating_system.snapshot.version
+        records = iter([
+            {'name': 'Imported', 'age': 40, 'vip': True},
+            {'type': 'group', 'name': 'Imported Family', 'size': 3, 'children': True},
+            {'name': 'Too Old', 'age': 130},
+            {'name': 'Too Big', 'size': 9},
+            None,
+            {'type': 'crew', 'name': 'Pilot'},
+        ])
+
+        report = self.seating_system.import_passengers(records, assign=True)
+
+        self.assertEqual(report['imported'], 2)
+        self.assertEqual([r['success'] for r in report['results']], [True, True, False, False, False, False])
+        self.assertEqual(report['results'][2]['error'], self.seating_system.solo_passenger_error('Too Old', 130))
+        self.assertEqual(report['results'][3]['error'], 'Group size must be between 2 and 7')
+        self.assertEqual(len(report['summary']['assigned']), 4)
+        self.assertTrue(self.seating_system.passengers[report['results'][0]['id']].is_vip)
+        self.assertTrue(self.seating_system.groups[report['results'][1]['id']].has_children)
+        self.assertEqual(self.seating_system.snapshot.version, version + 1)
+
+        limited = self.seating_system.import_passengers([{'name': 'Extra', 'age': 20}] * 3, max_records=2)
+        self.assertEqual((limited['imported'], limited['rejected']), (2, 1))
+
+    def test_import_is_invisible_to_concurrent_writers(self):
+        """
+        TDD Test 91: A snapshot published by another writer mid-import shows none of the import
+        """
+        seen = []
+
+        def records():
+            yield {'name': 'First Imported', 'age': 40}
+            # Another request commits while the body is still being read
+            writer = threading.Thread(target=self.seating_system.add_solo_passenger, args=("Concurrent", 30))
+            writer.start()
+            writer.join()
+            seen.append([p['name'] for p in self.seating_system.snapshot.passenger_list()])
+            yield {'name': 'Second Imported', 'age': 41}
+
+        self.seating_system.import_passengers(records())
+
+        self.assertEqual(seen, [["Concurrent"]])
+        self.assertEqual(len(self.seating_system.snapshot.passengers), 3)
+
+    def test_import_route_streams_ndjson_and_csv(self):
+        """
+        TDD Test 68: The import route reads NDJSON and CSV bodies
+        """
+        client = app.test_client()
+        client.post('/api/flights/IM100/reset-system', json={})
+        ndjson = b'{"name": "Line One", "age": 30}\n{broken\n\n{"name": "Line Four", "size": 2}\n'
+        csv_body = b'type,name,age,size,vip\nsolo,Csv Solo,55,,yes\ngroup,Csv Group,,4,no\nsolo,,20,,\n'
+
+        first = client.post('/api/flights/IM100/import-passengers', data=ndjson,
+                            content_type='application/x-ndjson').get_json()
+        second = client.post('/api/flights/IM100/import-passengers?assign=1', data=csv_body,
+                             content_type='text/csv').get_json()
+
+        self.assertEqual([r['success'] for r in first['results']], [True, False, True])
+        self.assertEqual(first['results'][1]['error'], 'Record is not an object')
+        self.assertEqual([r['success'] for r in second['results']], [True, True, False])
+        self.assertEqual(second['results'][2]['error'], 'Name is required')
+        self.assertEqual(len(second['summary']['assigned']), 8)
+        passengers = client.get('/api/flights/IM100/passenger-list').get_json()['passengers']
+        self.assertEqual(len(passengers), 8)
+        self.assertTrue(next(p for p in passengers if p['name'] == 'Csv Solo')['is_vip'])
+        self.assertEqual(client.post('/api/flights/IM100/import-passengers?format=xml').status_code, 400)
+
+        class ReadlineOnly:
+            # Like gunicorn's body reader, passed through as is for terminated input
+            def __init__(self, data):
+                self.lines = iter(io.BytesIO(data).readlines())
+
+            def readline(self, size=-1):
+                return next(self.lines, b'')
+
+        third = client.post('/api/flights/IM100/import-passengers', content_type='application/x-ndjson',
+                            environ_overrides={'wsgi.input': ReadlineOnly(ndjson), 'wsgi.input_terminated': True})
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.get_json()['imported'], 2)
+
+    def test_import_route_rejects_undecodable_lines(self):
+        """
+        TDD Test 99: A line that is not UTF-8 is a rejected record, not a failed import
+        """
+        client = app.test_client()
+        client.post('/api/flights/IM200/reset-system', json={})
+        ndjson = b'{"name": "Line One", "age": 30}\n{"name": "Bad \xff\xfe", "age": 30}\n{"name": "Line Three", "age": 40}\n'
+        csv_body = b'name,age\nCsv One,30\nCsv \xc3(,31\nCsv Three,32\n'
+
+        first = client.post('/api/flights/IM200/import-passengers', data=ndjson,
+                            content_type='application/x-ndjson')
+        second = client.post('/api/flights/IM200/import-passengers', data=csv_body, content_type='text/csv')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([r['success'] for r in first.get_json()['results']], [True, False, True])
+        self.assertEqual(first.get_json()['results'][1]['error'], 'Record is not an object')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual([r['success'] for r in second.get_json()['results']], [True, False, True])
+        passengers = client.get('/api/flights/IM200/passenger-list').get_json()['passengers']
+        self.assertEqual(sorted(p['name'] for p in passengers), ['Csv One', 'Csv Three', 'Line One', 'Line Three'])
+
+    # ====================================
+    # TDD CYCLE 25: MANIFEST EXPORT
+    # ====================================
+
+    def test_manifest_export_formats(self):
+        """
+        TDD Test 69: Manifests stream as NDJSON or CSV, with chosen fields and optional gzip
+        """
+        self.seating_system.add_solo_passenger("Exported", 30, is_vip=True)
+        self.seating_system.add_group("Exported Family", 2)
+        self.seating_system.assign_seats()
+        other = AircraftSeatingSystem()
+        other.add_solo_passenger("Other Flight", 50)
+        flights = [('EX100', self.seating_system.snapshot), ('EX200', other.snapshot)]
+
+        ndjson = b''.join(export_manifest(iter(flights)))
+        records = [json.loads(line) for line in ndjson.splitlines()]
+        self.assertEqual([(r['flight_id'], r['name']) for r in records],
+                         [('EX100', 'Exported'), ('EX100', 'Exported Family Member 1'),
+                          ('EX100', 'Exported Family Member 2'), ('EX200', 'Other Flight')])
+        self.assertEqual(records[0], {'flight_id': 'EX100', **self.seating_system.get_passenger_list()[0],
+                                      'assigned_seat': list(self.seating_system.passengers['solo_1'].assigned_seat)})
+
+        compressed = b''.join(export_manifest(flights, fields=['name', 'assigned_seat', 'is_vip'],
+                                              body_format='csv', compress=True))
+        lines = gzip.decompress(compressed).decode().splitlines()
+        row, letter = self.seating_system.passengers['solo_1'].assigned_seat
+        self.assertEqual(lines[0], 'name,assigned_seat,is_vip')
+        self.assertEqual(lines[1], f'Exported,{row}{letter},True')
+        self.assertEqual(lines[4], 'Other Flight,,False')
+
+        with self.assertRaises(ValueError):
+            export_manifest(flights, fields=['name', 'password'])
+
+    def test_manifest_route(self):
+        """
+        TDD Test 70: The manifest route exports one or several flights
+        """
+        client = app.test_client()
+        for flight_id in ('MF100', 'MF200'):
+            client.post(f'/api/flights/{flight_id}/reset-system', json={})
+            client.post(f'/api/flights/{flight_id}/add-solo-passenger', json={'name': f'{flight_id} Solo', 'age': 30})
+
+        single = client.get('/api/flights/MF100/manifest?format=csv&fields=flight_id,name')
+        several = client.get('/api/manifest?flights=MF100,MF200&fields=name', headers={'Accept-Encoding': 'gzip'})
+        refused = client.get('/api/manifest?flights=MF100&fields=name', headers={'Accept-Encoding': 'gzip;q=0, br'})
+
+        self.assertEqual(single.mimetype, 'text/csv')
+        self.assertEqual(single.data.decode().splitlines(), ['flight_id,name', 'MF100,MF100 Solo'])
+        self.assertEqual(several.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(several.data).splitlines(), [b'{"name":"MF100 Solo"}', b'{"name":"MF200 Solo"}'])
+        self.assertNotIn('Content-Encoding', refused.headers)
+        self.assertEqual(refused.data, b'{"name":"MF100 Solo"}\n')
+        self.assertEqual(client.get('/api/manifest?fields=secret').status_code, 400)
+        self.assertEqual(client.get('/api/manifest?flights=../x').status_code, 400)
+
+    def test_manifest_of_unknown_flight_is_not_found(self):
+        """
+        TDD Test 92: Exporting a flight that was never created is a 404 and does not create it
+        """
+        client = app.test_client()
+        client.post('/api/flights/MF300/reset-system', json={})
+
+        self.assertEqual(client.get('/api/flights/NOSUCH1/manifest').status_code, 404)
+        response = client.get('/api/manifest?flights=MF300,NOSUCH2')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('NOSUCH2', response.get_json()['error'])
+        self.assertFalse(flight_registry.exists('NOSUCH1'))
+        self.assertNotIn('NOSUCH2', flight_registry)
+        self.assertEqual(client.get('/api/flights/MF300/manifest').status_code, 200)
+
+    # ====================================
+    # TDD CYCLE 26: PAGINATED PASSENGER LIST
+    # ====================================
+
+    def test_passenger_index_pages_filters_and_sorts(self):
+        """
+        TDD Test 71: Pages come from the snapshot's indexes in a stable order
+        """
+        for i in range(7):
+            self.seating_system.add_solo_passenger(f"Passenger {6 - i}", 20 + i, is_vip=i % 3 == 0)
+        self.seating_system.add_group("Indexed Family", 3)
+        self.seating_system.assign_seats()
+        index = self.seating_system.snapshot.passenger_index
+        self.assertIs(self.seating_system.snapshot.passenger_index, index)
+
+        collected, after, more = [], None, True
+        while more:
+            ids, more = index.page('name', [], 3, after)
+            collected += ids
+            after = index.key('name', ids[-1])
+        names = [index.passengers[pid]['name'] for pid in collected]
+        self.assertEqual(names, sorted(names, key=str.lower))
+        self.assertEqual(len(collected), 10)
+
+        vip, _ = index.page('age', [('vip', True), ('status', 'assigned')], 10, descending=True)
+        self.assertEqual([index.passengers[pid]['age'] for pid in vip], [26, 23, 20])
+        group_id, = self.seating_system.groups
+        group, _ = index.page('id', [('group_id', group_id)], 10)
+        self.assertEqual(group, [f'{group_id}_member_{i}' for i in (1, 2, 3)])
+        self.assertEqual(index.count([('vip', False), ('status', 'unassigned')]), 0)
+
+    def test_passenger_list_route_pagination(self):
+        """
+        TDD Test 72: /passenger-list pages with cursors, projects fields and keeps the legacy form
+        """
+        client = app.test_client()
+        client.post('/api/flights/PG100/reset-system', json={})
+        for i in range(5):
+            client.post('/api/flights/PG100/add-solo-passenger', json={'name': f'Paged {i}', 'age': 30 + i})
+
+        first = client.get('/api/flights/PG100/passenger-list?limit=2&fields=id,name&sort=-age').get_json()
+        # A passenger booked between pages does not shift the next page
+        client.post('/api/flights/PG100/add-solo-passenger', json={'name': 'Late', 'age': 99})
+        second = client.get(f"/api/flights/PG100/passenger-list?limit=2&fields=id,name&sort=-age"
+                            f"&cursor={first['next_cursor']}").get_json()
+        legacy = client.get('/api/flights/PG100/passenger-list').get_json()
+
+        ids = {p['name']: p['id'] for p in legacy['passengers']}
+        self.assertEqual(first['passengers'], [{'id': ids['Paged 4'], 'name': 'Paged 4'},
+                                               {'id': ids['Paged 3'], 'name': 'Paged 3'}])
+        self.assertEqual(first['total'], 5)
+        self.assertEqual([p['name'] for p in second['passengers']], ['Paged 2', 'Paged 1'])
+        self.assertEqual(set(legacy), {'passengers', 'waiting_list'})
+        self.assertEqual(len(legacy['passengers']), 6)
+        for query in ('limit=0', 'fields=secret', 'sort=height', 'status=lost', 'cursor=%%%',
+                      f"sort=name&cursor={first['next_cursor']}"):
+            self.assertEqual(client.get(f'/api/flights/PG100/passenger-list?{query}').status_code, 400, query)
+
+    def test_pagination_survives_cancellations(self):
+        """
+        TDD Test 93: Cancelling passengers between pages neither repeats nor skips anyone
+        """
+        client = app.test_client()
+        client.post('/api/flights/PG200/reset-system', json={})
+        for i in range(8):
+            client.post('/api/flights/PG200/add-solo-passenger', json={'name': f'Paged {i}', 'age': 30 + i})
+        passengers = client.get('/api/flights/PG200/passenger-list').get_json()['passengers']
+        ids = {p['name']: p['id'] for p in passengers}
+        booked = [ids[f'Paged {i}'] for i in range(8)]
+
+        seen = []
+        cursor = None
+        while True:
+            query = '?limit=3&fields=id' + (f'&cursor={cursor}' if cursor else '')
+            page = client.get(f'/api/flights/PG200/passenger-list{query}').get_json()
+            seen.extend(p['id'] for p in page['passengers'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+            if len(seen) == 3:
+                # Before the cursor, at it, and ahead of it
+                for passenger_id in (booked[0], booked[2], booked[4]):
+                    client.post('/api/flights/PG200/cancel-booking', json={'passenger_id': passenger_id})
+
+        self.assertEqual(seen, [booked[i] for i in (0, 1, 2, 3, 5, 6, 7)])
+
+    def test_passenger_index_updates_match_rebuilds(self):
+        """
+        TDD Test 94: An index derived from the previous version's equals one built from scratch
+        """
+        for i in range(12):
+            self.seating_system.add_solo_passenger(f"Indexed {i}", 20 + i, is_vip=(i % 3 == 0))
+        self.seating_system.add_group("Indexed Family", 3)
+        base = self.seating_system.snapshot.passenger_index
+        for sort in PassengerIndex.SORTS:
+            base.page(sort, [], 5)
+            base.page(sort, [('vip', True)], 5)
+
+        self.seating_system.cancel_booking("solo_4")
+        self.seating_system.admin_override("solo_7", 20, 'C')
+        snapshot = self.seating_system.snapshot
+        derived = snapshot.passenger_index
+        rebuilt = PassengerIndex(snapshot.passengers, snapshot.waiting_list, snapshot.bookings)
+
+        self.assertIsNone(snapshot.index_base)
+        self.assertEqual(derived.sets, rebuilt.sets)
+        for sort in PassengerIndex.SORTS:
+            for filters in ([], [('vip', True)], [('status', 'assigned')]):
+                self.assertEqual(derived.page(sort, filters, 50), rebuilt.page(sort, filters, 50))
+
+    def test_passenger_index_cache_is_bounded(self):
+        """
+        TDD Test 97: Client filter values cannot grow the sorted-list cache, across versions either
+        """
+        for i in range(6):
+            self.seating_system.add_solo_passenger(f"Cached {i}", 20 + i, is_vip=(i % 2 == 0))
+        self.seating_system.add_group("Cached Family", 3)
+        group_id, = self.seating_system.groups
+        index = self.seating_system.snapshot.passenger_index
+
+        for i in range(200):
+            self.assertEqual(index.page('id', [('group_id', f'nonexistent{i}')], 10), ([], False))
+        self.assertEqual(len(index._sorted), 0)
+        for sort in PassengerIndex.SORTS:
+            for condition in (('vip', True), ('vip', False), ('group_id', group_id), ('status', 'unassigned')):
+                index.page(sort, [condition], 10)
+        self.assertEqual(len(index._sorted), PassengerIndex.SORTED_CACHE)
+
+        self.seating_system.add_solo_passenger("Later", 50)
+        derived = self.seating_system.snapshot.passenger_index
+        self.assertLessEqual(len(derived._sorted), PassengerIndex.SORTED_CACHE)
+        self.seating_system.add_solo_passenger("Even Later", 51)
+        self.assertEqual(len(self.seating_system.snapshot.passenger_index._sorted), 0,
+                         "Lists nobody read from the previous version are not carried over")
+
+    def test_ids_are_not_reused_after_cancellation(self):
+        """
+        TDD Test 98: Booking after a cancellation never takes an existing passenger's ID
+        """
+        self.seating_system.add_solo_passenger("First", 30)
+        self.seating_system.add_solo_passenger("Second", 31)
+        self.seating_system.add_group("First Family", 2)
+        self.seating_system.add_group("Second Family", 2)
+        first, second = list(self.seating_system.passengers)[:2]
+        first_group, second_group = self.seating_system.groups
+
+        self.seating_system.cancel_booking(first)
+        self.seating_system.cancel_booking(f"{first_group}_member_1")
+        self.seating_system.cancel_booking(f"{first_group}_member_2")
+        self.seating_system.add_solo_passenger("Third", 32)
+        self.seating_system.add_group("Third Family", 2)
+
+        names = {p.name for p in self.seating_system.passengers.values()}
+        self.assertEqual(self.seating_system.passengers[second].name, "Second")
+        self.assertEqual(self.seating_system.groups[second_group].name, "Second Family")
+        self.assertEqual(len(self.seating_system.groups), 2)
+        self.assertEqual(len(self.seating_system.passengers), 6)
+        self.assertTrue({"Second", "Third", "Second Family Member 1", "Third Family Member 2"} <= names)
+
+
+class TestAircraftSeatingSystemCompactStore(TestAircraftSeatingSystem):
+    """
+    Re-run the full TDD suite against the structure-of-arrays seat store
+    """
+
+    def setUp(self):
+        """Set up a system backed by the compact seat store."""
+        self.seating_system = AircraftSeatingSystem(seat_backend='compact')
+        self.seating_system.reset_system()
+
+    def test_compact_store_shares_static_columns(self):
+        """
+        TDD Test 25: Compact stores share one immutable layout
+        GREEN: Verify only occupancy columns are per flight
+        """
+        other = AircraftSeatingSystem(seat_backend='compact')
+
+        self.assertIs(self.seating_system.seats.layout, other.seats.layout)
+        self.assertIsNot(self.seating_system.seats.available, other.seats.available)
+
+    def test_compact_view_writes_through(self):
+        """
+        TDD Test 26: Seat views write into the backing arrays
+        GREEN: Verify the view API matches the Seat dataclass
+        """
+        seat = self.seating_system.seats[(10, 'A')]
+        seat.passenger_id = "solo_99"
+        seat.passenger_name = "View Writer"
+
+        again = self.seating_system.seats[(10, 'A')]
+        self.assertEqual(again.passenger_id, "solo_99")
+        self.assertEqual(again.passenger_name, "View Writer")
+        self.assertEqual(again.seat_class, SeatClass.ECONOMY)
+        self.assertEqual(again.seat_type, SeatType.WINDOW)
+
+    def test_unknown_backend_rejected(self):
+        """
+        TDD Test 27: Unknown seat backends fail fast
+        RED: Write failing configuration test
+        """
+        with self.assertRaises(ValueError):
+            AircraftSeatingSystem(seat_backend='sqlite')
+
+class TestFlightRegistry(unittest.TestCase):
+    """
+    Multi-flight registry: lazy creation, LRU eviction and reload
+    """
+
+    def setUp(self):
+        self.spill_dir = tempfile.TemporaryDirectory()
+        flight_size = AircraftSeatingSystem().estimated_size()
+        # Room for two empty flights
+        self.registry = FlightRegistry(memory_budget=flight_size * 2 + flight_size // 2,
+                                       spill_dir=self.spill_dir.name, pinned=('pinned',))
+
+    def tearDown(self):
+        self.spill_dir.cleanup()
+
+    def test_flights_created_lazily(self):
+        """
+        TDD Test 35: Flights are created on first access and reused afterwards
+        """
+        self.assertNotIn('AB100', self.registry)
+        flight = self.registry.get('AB100')
+
+        self.assertIn('AB100', self.registry)
+        self.assertIs(self.registry.get('AB100'), flight)
+
+    def test_cold_flights_evicted_and_reloaded(self):
+        """
+        TDD Test 36: Cold flights spill to disk and come back with their bookings
+        """
+        # Arrange
+        flight = self.registry.get('AB100')
+        flight.add_solo_passenger("Spilled", 30)
+        flight.add_group("Spilled Family", 3)
+        flight.assign_seats()
+        expected_layout = flight.get_seating_layout()
+        expected_passengers = flight.get_passenger_list()
+
+        # Act - Touch enough other flights to push AB100 out
+        self.registry.get('pinned')
+        self.registry.get('AB200')
+        self.registry.get('AB300')
+
+        # Assert
+        self.assertNotIn('AB100', self.registry)
+        self.assertIn('pinned', self.registry)
+        self.assertTrue(self.registry.exists('AB100'))
+        self.assertFalse(self.registry.exists('AB999'))
+        reloaded = self.registry.get('AB100')
+        self.assertIsNot(reloaded, flight)
+        self.assertEqual(reloaded.get_seating_layout(), expected_layout)
+        self.assertEqual(reloaded.get_passenger_list(), expected_passengers)
+
+    def test_measured_sizes_drive_eviction(self):
+        """
+        TDD Test 103: Measured flight sizes replace and calibrate estimates that are too low
+        """
+        class Underestimated(AircraftSeatingSystem):
+            def estimated_size(self):
+                return super().estimated_size() // 10
+        registry = FlightRegistry(factory=Underestimated, memory_budget=self.registry.memory_budget,
+                                  spill_dir=self.spill_dir.name)
+        for flight_id in ('AB100', 'AB200', 'AB300', 'AB400'):
+            registry.get(flight_id)
+        self.assertEqual(len(registry.flights), 4, "Underestimated flights all fit the budget")
+
+        usage = registry.memory_usage()
+
+        self.assertLessEqual(registry.resident_bytes, registry.memory_budget)
+        self.assertLess(len(registry.flights), 4)
+        self.assertIn('AB400', registry)
+        self.assertEqual(registry.sizes['AB400'], usage['AB400']['total'])
+        self.assertGreater(registry.size_scale, 5)
+        registry.get('AB500')
+        self.assertGreater(registry.sizes['AB500'], Underestimated().estimated_size() * 5)
+
+    def test_flights_in_use_are_not_evicted(self):
+        """
+        TDD Test 83: A flight held by a mutate block survives the budget, its changes are kept
+        """
+        def change(flight):
+            for flight_id in ('AB200', 'AB300', 'AB400'):
+                self.registry.get(flight_id)
+            flight.add_solo_passenger("Held", 30)
+            self.assertIn('AB100', self.registry)
+        self.registry.mutate('AB100', change)
+        
+        for flight_id in ('AB200', 'AB300'):
+            self.registry.get(flight_id)
+        self.assertNotIn('AB100', self.registry)
+        self.assertEqual([p['name'] for p in self.registry.get('AB100').get_passenger_list()], ['Held'])
+
+    def test_busy_flight_does_not_block_other_flights(self):
+        """
+        TDD Test 84: A flight busy with a batch blocks neither access to other flights nor eviction
+        """
+        busy = self.registry.get('AB100')
+        busy.add_solo_passenger("Busy", 30)
+        holding, release = threading.Event(), threading.Event()
+
+        def batch():
+            with busy.lock:
+                holding.set()
+                release.wait(10)
+        threading.Thread(target=batch).start()
+        holding.wait(10)
+        try:
+            collected = {}
+            collector = threading.Thread(target=lambda: collected.update(self.registry.collect_states()))
+            collector.start()
+            accessed = []
+            reader = threading.Thread(target=lambda: accessed.extend(
+                self.registry.get(flight_id) for flight_id in ('AB200', 'AB300', 'AB400')))
+            reader.start()
+            reader.join(5)
+            self.assertEqual(len(accessed), 3)
+            self.assertIn('AB100', self.registry)
+            self.assertNotIn('AB200', self.registry)
+        finally:
+            release.set()
+        collector.join(5)
+        self.assertEqual([p[1] for p in collected['AB100']['passengers']], ['Busy'])
+
+    def test_invalid_flight_id_rejected(self):
+        """
+        TDD Test 37: Flight IDs are validated before touching the disk
+        """
+        with self.assertRaises(ValueError):
+            self.registry.get('../etc/passwd')
+
+    def test_flight_routes(self):
+        """
+        TDD Test 38: Flight-scoped API routes address their own flight
+        """
+        client = app.test_client()
+
+        response = client.post('/api/flights/ZZ900/add-solo-passenger',
+                               json={'name': 'Routed', 'age': 30})
+        passengers = client.get('/api/flights/ZZ900/passenger-list').get_json()['passengers']
+
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual([p['name'] for p in passengers], ['Routed'])
+        self.assertEqual(client.get('/api/flights/bad.id/seating-layout').status_code, 404)
+
+
+class TestSharedFlightStore(unittest.TestCase):
+    """
+    Cross-worker state: registries sharing one SQLite store see one seat map
+    """
+
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.state_dir.name, 'state.db')
+        # Two registries stand in for two gunicorn workers
+        self.worker_a = FlightRegistry(store=SharedFlightStore(path))
+        self.worker_b = FlightRegistry(store=SharedFlightStore(path))
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def test_workers_share_one_seat_map(self):
+        """
+        TDD Test 44: A booking made by one worker is visible to the other
+        """
+        # Unavailable seats are chosen once, by whichever worker creates the flight
+        self.assertEqual(self.worker_a.get('AB100').get_seating_layout(),
+                         self.worker_b.get('AB100').get_seating_layout())
+
+        def change(flight):
+            flight.add_solo_passenger("Shared", 30)
+            flight.assign_seats()
+        self.worker_a.mutate('AB100', change)
+
+        flight_b = self.worker_b.get('AB100')
+        self.assertEqual([p['name'] for p in flight_b.get_passenger_list()], ["Shared"])
+        self.assertEqual(flight_b.get_seating_layout(), self.worker_a.get('AB100').get_seating_layout())
+
+    def test_interleaved_mutations_are_not_lost(self):
+        """
+        TDD Test 45: Each mutation starts from the latest shared state
+        """
+        self.worker_a.get('AB100')
+        self.worker_b.get('AB100')  # Both workers now cache version 1
+
+        self.worker_a.mutate('AB100', lambda flight: flight.add_solo_passenger("From A", 30))
+        self.worker_b.mutate('AB100', lambda flight: flight.add_solo_passenger("From B", 40))
+
+        names = [p['name'] for p in self.worker_a.get('AB100').get_passenger_list()]
+        self.assertEqual(names, ["From A", "From B"])
+
+    def test_failed_mutation_is_rolled_back(self):
+        """
+        TDD Test 46: A mutation that raises publishes nothing
+        """
+        def change(flight):
+            flight.add_solo_passenger("Half Done", 30)
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            self.worker_a.mutate('AB100', change)
+
+        self.assertEqual(self.worker_a.get('AB100').get_passenger_list(), [])
+        self.assertEqual(self.worker_b.get('AB100').get_passenger_list(), [])
+
+    def test_conflicting_mutation_runs_again(self):
+        """
+        TDD Test 86: A worker that commits on a stale copy reruns its change on the latest state
+        """
+        calls = []
+        self.worker_b.get('AB100')  # Cache version 1
+
+        def change(flight):
+            calls.append(len(flight.passengers))
+            if len(calls) == 1:
+                # Another worker commits while this change runs
+                self.worker_a.mutate('AB100', lambda other: other.add_solo_passenger("From A", 30))
+            flight.add_solo_passenger("From B", 40)
+        self.worker_b.mutate('AB100', change)
+
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual(self.worker_b.versions['AB100'], self.worker_b.store.version('AB100'))
+        names = [p['name'] for p in self.worker_a.get('AB100').get_passenger_list()]
+        self.assertEqual(names, ["From A", "From B"])
+
+    def test_concurrent_writers_lose_no_updates(self):
+        """
+        TDD Test 87: Writers on both workers at once all end up in the shared state
+        """
+        def book(worker, prefix):
+            for i in range(10):
+                worker.mutate('AB100', lambda flight, name=f"{prefix} {i}": flight.add_solo_passenger(name, 30))
+
+        threads = [threading.Thread(target=book, args=(worker, f"{name} {t}"))
+                   for name, worker in (("A", self.worker_a), ("B", self.worker_b)) for t in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for worker in (self.worker_a, self.worker_b):
+            names = [p['name'] for p in worker.get('AB100').get_passenger_list()]
+            self.assertEqual(len(names), 60)
+            self.assertEqual(len(set(names)), 60)
+
+    def test_workers_agree_on_layout_versions(self):
+        """
+        TDD Test 89: Workers holding the same stored state serve the same ETags and change versions
+        """
+        before = self.worker_b.get('AB100').snapshot
+        self.assertEqual(self.worker_a.get('AB100').snapshot.layout_etag, before.layout_etag)
+
+        def change(flight):
+            flight.add_group("Shared Family", 3)
+            flight.assign_seats()
+        self.worker_a.mutate('AB100', change)
+        snapshot_a = self.worker_a.get('AB100').snapshot
+        snapshot_b = self.worker_b.get('AB100').snapshot
+
+        self.assertEqual(snapshot_a.layout_etag, snapshot_b.layout_etag)
+        self.assertNotEqual(snapshot_b.layout_etag, before.layout_etag)
+        self.assertEqual(snapshot_a.occupancy_json, snapshot_b.occupancy_json)
+        # A client of either worker catches up on the other
+        update = self.worker_a.get('AB100').layout_changes_since(before.layout_version, before.layout_epoch)
+        self.assertFalse(update['full'])
+        self.assertEqual(sum(len(seats) for seats in update['changes'].values()), 3)
+
+
+class TestJournal(unittest.TestCase):
+    """
+    Crash recovery: journaled commits and snapshots rebuild every flight
+    """
+
+    def setUp(self):
+        self.journal_dir = tempfile.TemporaryDirectory()
+        self.spill_dir = tempfile.TemporaryDirectory()
+        self.registry = self._restart()
+
+    def tearDown(self):
+        self.registry.journal.close()
+        self.journal_dir.cleanup()
+        self.spill_dir.cleanup()
+
+    def _restart(self, checkpoint_every=10000):
+        """Helper: a fresh registry over the same journal, as after a crash"""
+        return FlightRegistry(journal=Journal(self.journal_dir.name, checkpoint_every=checkpoint_every),
+                              spill_dir=self.spill_dir.name)
+
+    def _book(self, registry):
+        """Helper: exercise every kind of mutation on two flights"""
+        def rearrange(flight):
+            flight.cancel_booking("solo_3")
+            flight.admin_override("solo_5", 20, 'C')
+
+        for flight_id in ('AB100', 'CD200'):
+            def book(flight, flight_id=flight_id):
+                for i in range(12):
+                    flight.add_solo_passenger(f"{flight_id} Passenger {i}", 30 + i, is_vip=(i % 4 == 0))
+                flight.add_group(f"{flight_id} Family", 4, has_children=True)
+            registry.mutate(flight_id, book)
+            registry.mutate(flight_id, lambda flight: flight.assign_seats())
+            registry.mutate(flight_id, rearrange)
+
+    def test_journal_records_survive_restart(self):
+        """
+        TDD Test 53: Durable records are recovered, a torn last line is ignored
+        """
+        journal = self.registry.journal
+        for i in range(5):
+            journal.append({'n': i})
+        journal.sync()
+        journal.close()
+        path = max(os.path.join(self.journal_dir.name, name) for name in os.listdir(self.journal_dir.name))
+        with open(path, 'a') as f:
+            f.write('{"n": 5')  # Crash in the middle of a write
+
+        state, records = Journal(self.journal_dir.name).recover()
+
+        self.assertIsNone(state)
+        self.assertEqual([record['n'] for record in records], [0, 1, 2, 3, 4])
+
+    def test_flights_recovered_after_crash(self):
+        """
+        TDD Test 54: A restarted registry rebuilds flights from the journal
+        """
+        self._book(self.registry)
+        expected = {flight_id: self.registry.get(flight_id).to_state() for flight_id in ('AB100', 'CD200')}
+
+        recovered = self._restart()
+        self.assertNotIn('AB100', recovered, "Flights are rebuilt lazily")
+        for flight_id, state in expected.items():
+            self.assertEqual(recovered.get(flight_id).to_state(), state)
+        recovered.journal.close()
+
+    def test_checkpoint_compacts_journal(self):
+        """
+        TDD Test 55: Snapshots replace the journal they cover
+        """
+        self.registry.journal.close()
+        self.registry = self._restart(checkpoint_every=3)
+        self._book(self.registry)
+        self.registry.checkpoint()
+        self.registry.mutate('AB100', lambda flight: flight.add_solo_passenger("After Snapshot", 50))
+        expected = self.registry.get('AB100').to_state()
+
+        files = sorted(os.listdir(self.journal_dir.name))
+        self.assertEqual(len([name for name in files if name.startswith('snapshot')]), 1)
+
+        recovered = self._restart()
+        self.assertEqual(recovered.get('AB100').to_state(), expected)
+        self.assertIn('CD200', recovered.recovered)
+        recovered.journal.close()
+
+
+class TestWarmRestart(unittest.TestCase):
+    """
+    Worker recycling: a retiring worker hands its flights to its replacement
+    """
+
+    def setUp(self):
+        self.handoff_dir = tempfile.TemporaryDirectory()
+        self.spill_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.handoff_dir.cleanup()
+        self.spill_dir.cleanup()
+
+    def test_state_file_decodes_flights_lazily(self):
+        """
+        TDD Test 56: The binary state file indexes flights and decodes one on demand
+        """
+        flight = AircraftSeatingSystem()
+        flight.add_solo_passenger("Mapped", 30)
+        flight.assign_seats()
+        path = os.path.join(self.handoff_dir.name, 'flights.bin')
+
+        FlightStateFile.write(path, {'AB100': flight.to_state(), 'CD200': AircraftSeatingSystem().to_state()})
+        state_file = FlightStateFile(path)
+
+        self.assertEqual(len(state_file), 2)
+        self.assertIn('AB100', state_file)
+        self.assertEqual(state_file.load('AB100'), flight.to_state())
+        state_file.close()
+
+    def test_replacement_worker_serves_handed_off_flights(self):
+        """
+        TDD Test 57: Bookings and unavailable seats survive a worker restart
+        """
+        # Arrange - the retiring worker
+        retiring = FlightRegistry(spill_dir=self.spill_dir.name)
+        flight = retiring.get('AB100')
+        flight.add_group("Handoff Family", 3)
+        flight.assign_seats()
+        expected = flight.to_state()
+        retiring.hand_off(self.handoff_dir.name)
+
+        # Act - the replacement built its own flight before the fork
+        replacement = FlightRegistry(spill_dir=self.spill_dir.name)
+        replacement.get('AB100')
+        self.assertTrue(replacement.take_over(self.handoff_dir.name))
+
+        # Assert
+        self.assertNotIn('AB100', replacement, "Flights are decoded on first access")
+        self.assertEqual(replacement.get('AB100').to_state(), expected)
+        self.assertFalse(FlightRegistry().take_over(self.handoff_dir.name), "A hand-off is claimed once")
+
+    def test_handoff_warms_shared_store_cache(self):
+        """
+        TDD Test 88: With a shared store, handed-off flights are decoded unless they changed since
+        """
+        # Arrange - the retiring worker cached two flights, another worker changes one afterwards
+        path = os.path.join(self.handoff_dir.name, 'state.db')
+        retiring = FlightRegistry(store=SharedFlightStore(path))
+        retiring.mutate('AB100', lambda flight: flight.add_group("Handoff Family", 3))
+        retiring.get('CD200')
+        expected = retiring.get('AB100').to_state()
+        retiring.hand_off(self.handoff_dir.name)
+        FlightRegistry(store=SharedFlightStore(path)).mutate(
+            'CD200', lambda flight: flight.add_solo_passenger("Changed Since", 30))
+
+        # Act
+        replacement = FlightRegistry(store=SharedFlightStore(path))
+        self.assertTrue(replacement.take_over(self.handoff_dir.name))
+        loaded = []
+        load = replacement.store.load
+        replacement.store.load = lambda flight_id: loaded.append(flight_id) or load(flight_id)
+
+        # Assert
+        self.assertEqual(replacement.get('AB100').to_state(), expected)
+        self.assertEqual([p['name'] for p in replacement.get('CD200').get_passenger_list()], ["Changed Since"])
+        self.assertEqual(loaded, ['CD200'], "Only the changed flight is read from the store")
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Observability: lock-free metrics, /metrics and /health
+    """
+
+    def test_metrics_merge_thread_shards(self):
+        """
+        TDD Test 73: Values recorded on many threads add up in the Prometheus output
+        """
+        registry = Registry()
+        counter = Counter('test_events_total', 'Events', ('kind',), registry=registry)
+        histogram = Histogram('test_duration_seconds', 'Durations', buckets=(0.1, 1.0), registry=registry)
+        Gauge('test_queue_size', 'Queue size', lambda: 7, registry=registry)
+
+        def record():
+            for _ in range(1000):
+                counter.inc(labels=('a',))
+            histogram.observe(0.5)
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(2, ('b"c',))
+        histogram.observe(5)
+
+        text = registry.render()
+        self.assertEqual(counter.value(('a',)), 8000)
+        self.assertIn('# TYPE test_events_total counter', text)
+        self.assertIn('test_events_total{kind="a"} 8000', text)
+        self.assertIn('test_events_total{kind="b\\"c"} 2', text)
+        self.assertIn('test_duration_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('test_duration_seconds_bucket{le="1.0"} 8', text)
+        self.assertIn('test_duration_seconds_bucket{le="+Inf"} 9', text)
+        self.assertIn('test_duration_seconds_sum 9', text)
+        self.assertIn('test_queue_size 7', text)
+
+    def test_metrics_fold_shards_of_exited_threads(self):
+        """
+        TDD Test 95: Shards of threads that exited are folded into the totals, not kept
+        """
+        counter = Counter('test_folded_total', 'Events', registry=None)
+        histogram = Histogram('test_folded_seconds', 'Durations', buckets=(1.0,), registry=None)
+
+        def record():
+            counter.inc()
+            histogram.observe(0.5)
+        for _ in range(50):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        gc.collect()
+
+        self.assertEqual(len(counter._shards), 0)
+        self.assertEqual(len(histogram._shards), 0)
+        self.assertEqual(counter.value(), 50)
+        self.assertEqual(histogram.count(), 50)
+        counter.inc()
+        self.assertEqual(counter.value(), 51)
+        with self.assertRaises(TypeError):
+            Metric('test_abstract', 'Not a metric')
+
+    def test_metrics_and_health_routes(self):
+        """
+        TDD Test 74: Request latency and assign_seats phases show up on /metrics
+        """
+        client = app.test_client()
+        client.post('/api/flights/MT100/add-solo-passenger', json={'name': 'Measured', 'age': 30, 'vip': True})
+        client.post('/api/flights/MT100/assign-seats', json={})
+
+        health = client.get('/health')
+        text = client.get('/metrics').get_data(as_text=True)
+
+        self.assertEqual(health.get_json(), {'status': 'ok'})
+        self.assertIn('seating_http_request_duration_seconds_count{method="POST",'
+                      'route="/api/flights/<flight:flight_id>/assign-seats",status="200"}', text)
+        for phase in ('lock_wait', 'vip', 'accessibility', 'vip_groups', 'groups', 'solo', 'total'):
+            self.assertIn(f'seating_assign_phase_duration_seconds_count{{phase="{phase}"}}', text)
+        self.assertGreater(SEATS_ASSIGNED.value(), 0)
+        self.assertIn('seating_waiting_list_size', text)
+
+
+class TestProfiling(unittest.TestCase):
+    """
+    On-demand profiling: armed captures write one file and disarm themselves
+    """
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.profile_dir.cleanup()
+
+    def test_sampling_capture_writes_collapsed_stacks(self):
+        """
+        TDD Test 75: A sampling capture records other threads' stacks, then disarms
+        """
+        profiler = Profiler(self.profile_dir.name, interval=0.001)
+        self.assertIsNone(profiler.request_started(), "Idle profilers do nothing per request")
+        stop = threading.Event()
+
+        def busy_assigning():
+            while not stop.is_set():
+                system = AircraftSeatingSystem()
+                system.add_group("Sampled Family", 4)
+                system.assign_seats()
+        worker = threading.Thread(target=busy_assigning)
+        worker.start()
+        try:
+            capture = profiler.start('sample', seconds=0.3)
+            with self.assertRaises(RuntimeError):
+                profiler.start('sample')
+            while profiler.capture is not None:
+                time.sleep(0.05)
+        finally:
+            stop.set()
+            worker.join()
+
+        with open(capture.path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(profiler.last_path, capture.path)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertTrue(any('busy_assigning' in line for line in lines))
+
+    def test_profile_route_captures_requests(self):
+        """
+        TDD Test 76: The admin route arms a cProfile capture for a number of requests
+        """
+        client = app.test_client()
+        os.environ['SEATING_ADMIN_TOKEN'] = 'secret'
+        try:
+            self.assertEqual(client.post('/api/admin/profile', json={'mode': 'cprofile'}).status_code, 403)
+            headers = {'X-Admin-Token': 'secret'}
+            started = client.post('/api/admin/profile', headers=headers, json={'mode': 'cprofile', 'requests': 2})
+            client.post('/api/flights/PR100/add-group', json={'name': 'Profiled', 'size': 3})
+            client.post('/api/flights/PR100/assign-seats', json={})
+            status = client.get('/api/admin/profile', headers=headers).get_json()
+            bad = client.post('/api/admin/profile', headers=headers, json={'mode': 'strace'})
+        finally:
+            del os.environ['SEATING_ADMIN_TOKEN']
+
+        self.assertEqual(started.status_code, 202)
+        self.assertIsNone(status['capture'])
+        path = started.get_json()['capture']['path']
+        self.assertEqual(status['last_path'], path)
+        stats = pstats.Stats(path)
+        self.assertTrue(any(name == 'assign_seats' for _, _, name in stats.stats))
+        self.assertEqual(bad.status_code, 400)
+        os.remove(path)
+
+    def test_capture_length_is_validated(self):
+        """
+        TDD Test 100: Zero, negative and non-finite lengths are refused instead of arming a long capture
+        """
+        profiler = Profiler(self.profile_dir.name)
+        for seconds in (0, -1.0, float('nan'), float('inf')):
+            with self.assertRaises(ValueError, msg=seconds):
+                profiler.start('cprofile', seconds=seconds)
+        with self.assertRaises(ValueError):
+            profiler.start('cprofile', requests=0)
+        self.assertIsNone(profiler.capture)
+
+        client = app.test_client()
+        os.environ['SEATING_ADMIN_TOKEN'] = 'secret'
+        try:
+            for body in ('{"seconds": 0}', '{"seconds": -5}', '{"seconds": NaN}'):
+                response = client.post('/api/admin/profile', headers={'X-Admin-Token': 'secret'},
+                                       data=body, content_type='application/json')
+                self.assertEqual(response.status_code, 400, body)
+        finally:
+            del os.environ['SEATING_ADMIN_TOKEN']
+
+
+class TestMemoryAccounting(unittest.TestCase):
+    """
+    Memory diagnostics: per-structure sizes and diffs against a baseline
+    """
+
+    def test_structure_sizes_count_shared_objects_once(self):
+        """
+        TDD Test 77: Shared objects count once, towards the first structure that reaches them
+        """
+        shared = ['x' * 1000]
+        self.assertGreater(deep_sizeof(shared), 1000)
+        sizes = structure_sizes({'first': {'a': shared}, 'second': [shared]})
+        self.assertGreater(sizes['first'], 1000)
+        self.assertLess(sizes['second'], 100)
+        self.assertEqual(sizes['total'], sizes['first'] + sizes['second'])
+        self.assertLess(structure_sizes({'excluded': shared}, shared_ids([shared]))['total'], 1)
+
+        flight = AircraftSeatingSystem()
+        before = flight.memory_usage()
+        for i in range(50):
+            flight.add_solo_passenger(f"Measured Passenger {i}", 30)
+        flight.assign_seats()
+        after = flight.memory_usage()
+        self.assertEqual(set(after), set(flight.memory_structures()) | {'total'})
+        self.assertGreater(after['passengers'], before['passengers'] + 50 * 100)
+        self.assertGreater(after['snapshot'], before['snapshot'])
+
+    def test_memory_route_diffs_against_baseline(self):
+        """
+        TDD Test 78: The admin memory API reports growth since a baseline
+        """
+        client = app.test_client()
+        headers = {'X-Admin-Token': 'secret'}
+        client.post('/api/flights/MM100/reset-system', json={})
+        os.environ['SEATING_ADMIN_TOKEN'] = 'secret'
+        try:
+            self.assertEqual(client.get('/api/admin/memory').status_code, 403)
+            client.post('/api/admin/memory/baseline', headers=headers)
+            for i in range(40):
+                client.post('/api/flights/MM100/add-solo-passenger', json={'name': f'Growing {i}', 'age': 30})
+            report = client.get('/api/admin/memory?flights=MM100&diff=1', headers=headers).get_json()
+            client.delete('/api/admin/memory/baseline', headers=headers)
+        finally:
+            del os.environ['SEATING_ADMIN_TOKEN']
+
+        self.assertEqual(set(report['owners']), {'MM100', '(registry)'})
+        self.assertEqual(report['owners']['MM100']['total'], sum(
+            size for name, size in report['owners']['MM100'].items() if name != 'total'))
+        self.assertGreater(report['diff']['owners']['MM100']['passengers'], 40 * 100)
+        self.assertTrue(report['tracemalloc']['tracing'])
+        self.assertTrue(report['diff']['tracemalloc'])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_estimated_size_tracks_measured_size(self):
+        """
+        TDD Test 102: Budget estimates stay close to the measured size, snapshot included
+        """
+        def assert_close(flight, label):
+            measured = flight.memory_usage()['total']
+            self.assertLess(abs(flight.estimated_size() - measured), measured * 0.25, label)
+
+        for backend in ('dict', 'compact'):
+            for layout in ('default', 'regional'):
+                flight = AircraftSeatingSystem(seat_backend=backend, layout=layout)
+                flight.snapshot.passenger_index
+                self.assertEqual(len(flight.layout_changes), 0, "The first seat map is not a change")
+                self.assertTrue(flight.layout_changes_since(0)['full'])
+                assert_close(flight, f"{backend} {layout} empty")
+
+                for i in range(40):
+                    flight.add_solo_passenger(f"Estimated Passenger {i}", 30)
+                for i in range(8):
+                    flight.add_group(f"Estimated Family {i}", 4)
+                flight.assign_seats()
+                flight.snapshot.passenger_index
+                assert_close(flight, f"{backend} {layout} booked")
+
+                mover = next(iter(flight.passengers))
+                for i in range(100):
+                    flight.admin_override(mover, 19 + i % 2, 'C')
+                assert_close(flight, f"{backend} {layout} after churn")
+
+
+class TestBenchmarks(unittest.TestCase):
+    """
+    Seeded benchmark suite: reproducible flights and manifests, baseline comparison
+    """
+
+    def test_seeded_flights_and_manifests_are_reproducible(self):
+        """
+        TDD Test 79: The same seed gives the same unavailable seats and manifest
+        """
+        def unavailable(flight):
+            return sorted(key for key, seat in flight.seats.items() if not seat.is_available)
+
+        first = AircraftSeatingSystem(rng=random.Random(7))
+        second = AircraftSeatingSystem(rng=random.Random(7))
+        self.assertEqual(len(unavailable(first)), 5)
+        self.assertEqual(unavailable(first), unavailable(second))
+        first.reset_system()
+        second.reset_system()
+        self.assertEqual(unavailable(first), unavailable(second))
+
+        manifest = benchmarks.generate_manifest(random.Random(7), 100, group_ratio=0.5)
+        self.assertEqual(manifest, benchmarks.generate_manifest(random.Random(7), 100, group_ratio=0.5))
+        self.assertNotEqual(manifest, benchmarks.generate_manifest(random.Random(8), 100, group_ratio=0.5))
+        booked = sum(record.get('size', 1) for record in manifest)
+        self.assertGreaterEqual(booked, 100)
+        self.assertLess(booked, 107)
+        self.assertEqual({record['type'] for record in manifest}, {'solo', 'group'})
+        report = AircraftSeatingSystem().import_passengers(manifest)
+        self.assertEqual(report['rejected'], 0)
+
+    def test_suite_results_compare_with_baseline(self):
+        """
+        TDD Test 80: Suite results are JSON, and slower scenarios show up as regressions
+        """
+        results = benchmarks.run_suite(seed=3, repeats=1, scenarios=['assign_full_load', 'cancellation_storm'])
+        results = json.loads(json.dumps(results))
+        self.assertEqual(set(results['scenarios']), {'assign_full_load', 'cancellation_storm'})
+        self.assertGreater(results['scenarios']['cancellation_storm']['operations'], 0)
+        self.assertGreater(results['scenarios']['assign_full_load']['median_ms'], 0)
+        with self.assertRaises(ValueError):
+            benchmarks.run_suite(scenarios=['unknown'])
+
+        faster = json.loads(json.dumps(results))
+        faster['scenarios']['assign_full_load']['median_ms'] /= 2
+        comparison = benchmarks.compare_to_baseline(results, faster)
+        self.assertEqual(comparison['regressions'], ['assign_full_load'])
+        self.assertAlmostEqual(comparison['scenarios']['assign_full_load']['ratio'], 2.0)
+        self.assertEqual(benchmarks.compare_to_baseline(results, results)['regressions'], [])
+
+    def test_serialization_scenarios_time_the_route_bodies(self):
+        """
+        TDD Test 96: Serialization scenarios build the route bodies from fresh snapshots
+        """
+        system = AircraftSeatingSystem(rng=random.Random(5))
+        system.add_group("Benchmark Family", 3)
+        system.assign_seats()
+        system.snapshot.seating_layout_json
+
+        fresh = benchmarks._fresh_snapshots(system, 2)
+        self.assertNotIn('seating_layout_json', fresh[0].__dict__)
+        self.assertEqual(fresh[0].seating_layout_json, system.snapshot.seating_layout_json)
+        results = benchmarks.run_suite(seed=3, repeats=1, scenarios=['serialize_layout', 'serialize_occupancy',
+                                                                     'serialize_passengers'])
+        self.assertEqual(results['scenarios']['serialize_layout']['operations'], 200)
+        self.assertGreater(results['scenarios']['serialize_passengers']['median_ms'], 0)
+
+
+
+class TestLoadReplay(unittest.TestCase):
+    """
+    HTTP load harness: generated traffic mixes and per-route latency reports
+    """
+
+    def test_generated_traffic_follows_the_mix(self):
+        """
+        TDD Test 81: Traffic is reproducible, follows the mix and cancels each passenger once
+        """
+        passenger_ids = {'LR100': ['solo_1', 'solo_2', 'solo_3'], 'LR200': ['solo_1']}
+        mix = {'seating-layout': 6, 'cancel-booking': 3, 'add-group': 1, 'admin-override': 0}
+        traffic = load_replay.generate_traffic(random.Random(5), passenger_ids, 400, mix)
+
+        self.assertEqual(traffic, load_replay.generate_traffic(random.Random(5), passenger_ids, 400, mix))
+        routes = [request['route'] for request in traffic]
+        self.assertEqual(set(routes), {'seating-layout', 'cancel-booking', 'add-group'})
+        self.assertGreater(routes.count('seating-layout'), routes.count('cancel-booking'))
+        self.assertGreater(routes.count('cancel-booking'), routes.count('add-group'))
+        for request in traffic:
+            flight_id = request['path'].split('/')[3]
+            self.assertEqual(request['path'], f"/api/flights/{flight_id}/{request['route']}")
+            self.assertEqual(request['method'], 'GET' if request['route'] == 'seating-layout' else 'POST')
+        cancelled = [(request['path'], request['json']['passenger_id']) for request in traffic
+                     if request['route'] == 'cancel-booking' and request['json']['passenger_id'] != 'unknown']
+        self.assertEqual(len(cancelled), 4)
+        self.assertEqual(len(set(cancelled)), 4)
+        with self.assertRaises(ValueError):
+            load_replay.generate_traffic(random.Random(5), passenger_ids, 10, {'delete-flight': 1})
+
+    def test_replay_reports_latency_and_errors_per_route(self):
+        """
+        TDD Test 82: A replay through the test client reports percentiles and error rates per route
+        """
+        target = load_replay.TestClientTarget(app)
+        passenger_ids = load_replay.prepare_flights(target, ['LR300', 'LR400'], seed=9, preload=0.3)
+        self.assertTrue(all(passenger_ids.values()))
+        traffic = load_replay.generate_traffic(random.Random(9), passenger_ids, 120)
+        traffic.append({'route': 'missing', 'method': 'GET', 'path': '/api/flights/LR300/missing'})
+
+        report = load_replay.replay(target, traffic, concurrency=4)
+
+        self.assertEqual(report['total']['requests'], 121)
+        self.assertEqual(report['total']['errors'], 1)
+        self.assertEqual(report['routes']['missing']['statuses'], {'404': 1})
+        self.assertEqual(report['routes']['missing']['error_rate'], 1.0)
+        layout = report['routes']['seating-layout']
+        self.assertEqual((layout['errors'], layout['statuses']), (0, {'200': layout['requests']}))
+        self.assertLessEqual(layout['p50_ms'], layout['p95_ms'])
+        self.assertLessEqual(layout['p95_ms'], layout['p99_ms'])
+        self.assertLessEqual(layout['p99_ms'], layout['max_ms'])
+        self.assertGreater(report['total']['throughput_rps'], 0)
+        self.assertEqual(load_replay.percentile([1.0, 2.0, 3.0, 4.0], 50), 2.0)
+        self.assertEqual(load_replay.percentile([1.0, 2.0, 3.0, 4.0], 99), 4.0)
+
 
 # ====================================
 # TDD HELPER FUNCTIONS